@@ -21,6 +21,10 @@ setup(
         'tabulate',
         'tzlocal'
     ],
+    extras_require={
+        'analytics': ['numpy'],
+        'async': ['aiohttp'],
+    },
     setup_requires=[
         'pytest-runner',
     ],
@@ -1,4 +1,49 @@
-from .credentials import CredentialStore, FileCredentialStore, BasicCredentialStore
-from .gigya import Gigya
-from .kamereon import Kamereon, Vehicle, ChargeState, PlugState
-from .schedule import ChargeSchedule, ScheduledCharge, ChargeMode
+import importlib
+
+
+# Where each public name is defined. Submodules (and their dependencies) are
+# only imported when one of their names is first used, so that importing
+# pyze.api for e.g. ChargeSchedule doesn't load requests, jwt and friends.
+_EXPORTS = {
+    'CredentialStore': 'credentials',
+    'FileCredentialStore': 'credentials',
+    'BasicCredentialStore': 'credentials',
+    'SQLiteCredentialDatabase': 'credentials',
+    'SQLiteCredentialStore': 'credentials',
+    'Gigya': 'gigya',
+    'Kamereon': 'kamereon',
+    'Vehicle': 'kamereon',
+    'ChargeState': 'states',
+    'PlugState': 'states',
+    'ChargeSchedule': 'schedule',
+    'ScheduledCharge': 'schedule',
+    'ChargeMode': 'schedule',
+    'FleetPoller': 'fleet',
+    'FleetResult': 'fleet',
+    'SessionManager': 'sessions',
+    'ResponseCache': 'cache',
+    'MemoryCacheBackend': 'cache',
+    'SQLiteCacheBackend': 'cache',
+    'Budget': 'ratelimit',
+    'RateLimiter': 'ratelimit',
+    'MemoryBucketStore': 'ratelimit',
+    'SQLiteBucketStore': 'ratelimit',
+    'RetryPolicy': 'transport',
+    'Priority': 'scheduler',
+    'RequestScheduler': 'scheduler',
+    'request_priority': 'scheduler'
+}
+
+__all__ = list(_EXPORTS.keys())
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(importlib.import_module('.' + _EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals().keys()) | set(__all__))
@@ -0,0 +1,47 @@
+from pyze.api.singleflight import SingleFlight
+
+import requests
+import simplejson
+
+
+class FakeGigya(object):
+    def get_jwt_token(self):
+        return 'jwt'
+
+
+class FakeKamereon(object):
+    '''
+    Just enough of a Kamereon for a Vehicle whose endpoints are replaced.
+    '''
+    _root_url = 'https://kamereon.example'
+    _cache = None
+
+    def __init__(self):
+        self._gigya = FakeGigya()
+        self._single_flight = SingleFlight()
+
+    def get_account_id(self):
+        return 'account-id'
+
+
+class FakeResponse(object):
+    '''
+    A requests.Response with the given status, headers and JSON body.
+    '''
+
+    def __init__(self, status_code=200, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body
+        self.text = simplejson.dumps(body) if body is not None else ''
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError('{} error'.format(self.status_code), response=self)
+
+    def json(self):
+        return self._body
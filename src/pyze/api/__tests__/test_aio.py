@@ -0,0 +1,132 @@
+from pyze.api.credentials import BasicCredentialStore
+
+import asyncio
+import jwt
+import pytest
+import time
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestServer  # noqa: E402
+from pyze.api.aio import AsyncGigya, AsyncKamereon, AsyncVehicle  # noqa: E402
+
+
+def _credentials():
+    credentials = BasicCredentialStore()
+    credentials['gigya-api-key'] = ('gigya-key', None)
+    credentials['kamereon-api-key'] = ('kamereon-key', None)
+    credentials['gigya'] = ('gigya-token', None)
+    credentials['kamereon-account'] = ('account-id', None)
+    return credentials
+
+
+def _app(calls):
+    async def get_jwt(request):
+        calls.append('jwt')
+        await asyncio.sleep(0.01)
+        token = jwt.encode({'exp': int(time.time()) + 900}, 'secret', algorithm='HS256')
+        return web.json_response({'id_token': token})
+
+    async def battery_status(request):
+        calls.append(request.query['country'])
+        return web.json_response({'data': {'attributes': {'batteryLevel': 42}}})
+
+    app = web.Application()
+    app.router.add_post('/accounts.getJWT', get_jwt)
+    app.router.add_get(
+        '/commerce/v1/accounts/account-id/kamereon/kca/car-adapter/v2/cars/VIN/battery-status',
+        battery_status
+    )
+    return app
+
+
+def test_concurrent_requests_are_coalesced():
+    calls = []
+
+    async def run():
+        async with TestServer(_app(calls)) as server:
+            root_url = str(server.make_url('')).rstrip('/')
+            credentials = _credentials()
+            async with AsyncKamereon(
+                credentials=credentials,
+                gigya=AsyncGigya(credentials=credentials, root_url=root_url),
+                root_url=root_url
+            ) as k:
+                v = AsyncVehicle('VIN', k)
+                results = await asyncio.gather(*[v.battery_status() for _ in range(10)])
+                # Gigya's requests (made first) went through our pool
+                assert k._gigya._session is None
+                assert k._gigya._get_session() is k._get_session()
+                return results
+
+    results = asyncio.run(run())
+
+    assert results == [{'batteryLevel': 42}] * 10
+    assert calls.count('jwt') == 1
+    assert calls.count('GB') == 1
+
+
+def test_close_cancels_jwt_refresh():
+    async def run():
+        credentials = _credentials()
+        credentials['gigya-token'] = ('old-jwt', time.time() + 60)
+        # Nothing listening, so the refresh can't finish
+        gigya = AsyncGigya(credentials=credentials, root_url='http://192.0.2.1')
+
+        assert await gigya.get_jwt_token() == 'old-jwt'
+        task = gigya._refresh_task
+        assert task is not None and not task.done()
+        # Only one refresh at a time
+        await gigya.get_jwt_token()
+        assert gigya._refresh_task is task
+
+        await gigya.close()
+        assert task.cancelled()
+
+    asyncio.run(run())
+
+
+def test_vehicles_cached_until_expiry_or_login(monkeypatch):
+    requests_made = []
+
+    async def request(method, path, **kwargs):
+        requests_made.append(path)
+        return {'vehicleLinks': [], 'n': len(requests_made)}
+
+    async def run():
+        k = AsyncKamereon(credentials=_credentials())
+        monkeypatch.setattr(k, 'request', request)
+
+        assert (await k.get_vehicles())['n'] == 1
+        assert (await k.get_vehicles())['n'] == 1
+
+        k.set_account_id('other-account')
+        assert (await k.get_vehicles())['n'] == 2
+
+        # A new Gigya login
+        k._gigya._clear_all_caches()
+        assert k._account_id is None
+        assert (await k.get_vehicles())['n'] == 3
+
+        now = time.time()
+        monkeypatch.setattr(time, 'time', lambda: now + 7200)
+        assert (await k.get_vehicles())['n'] == 4
+        await k.close()
+
+    asyncio.run(run())
+    assert requests_made[-1] == '/commerce/v1/accounts/other-account/vehicles'
+
+
+def test_client_made_outside_event_loop():
+    calls = []
+    credentials = _credentials()
+    gigya = AsyncGigya(credentials=credentials)
+
+    async def run():
+        async with TestServer(_app(calls)) as server:
+            gigya._root_url = str(server.make_url('')).rstrip('/')
+            await asyncio.gather(gigya.get_jwt_token(), gigya.get_jwt_token())
+            await gigya.close()
+
+    asyncio.run(run())
+    assert calls == ['jwt']
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+import pytest
+
+
+np = pytest.importorskip('numpy')
+from pyze.api.analytics import ChargeSessions  # noqa: E402
+
+
+RECORDS = [
+    {
+        'chargeStartDate': '2020-01-30T22:00:00Z',
+        'chargeEndDate': '2020-01-31T02:00:00Z',
+        'chargeDuration': 240,
+        'chargeStartBatteryLevel': 20,
+        'chargeBatteryLevelRecovered': 50,
+        'chargeStartInstantaneousPower': 7400,
+        'chargePower': 'slow',
+        'chargeEndStatus': 'ok'
+    },
+    {
+        'chargeStartDate': '2020-02-03T08:30:00Z',
+        'chargeEndDate': '2020-02-03T09:00:00Z',
+        'chargeStartBatteryLevel': 60,
+        'chargeBatteryLevelRecovered': 10,
+        'chargePower': 'fast',
+        'chargeEndStatus': 'error'
+    },
+    {
+        'chargeStartDate': '2020-02-04T22:15:00Z',
+        'chargeStartBatteryLevel': 40
+    }
+]
+
+
+def test_from_records():
+    sessions = ChargeSessions.from_records(RECORDS, 'VIN')
+    assert len(sessions) == 3
+    assert sessions.start[1] == np.datetime64('2020-02-03T08:30:00')
+    assert np.isnat(sessions.end[2])
+    # Worked out from start and end when not given
+    np.testing.assert_array_equal(sessions.duration, [240, 30, np.nan])
+    np.testing.assert_array_equal(sessions.power, [7.4, np.nan, np.nan])
+    assert list(sessions.end_status) == ['ok', 'error', None]
+
+
+def test_aggregates():
+    sessions = ChargeSessions.from_records(RECORDS, 'VIN')
+
+    np.testing.assert_array_equal(sessions.energy_added(52), [26, 5.2, np.nan])
+    np.testing.assert_allclose(sessions.average_power(52), [6.5, 10.4, np.nan])
+
+    histogram = sessions.hour_histogram()
+    assert histogram.sum() == 3
+    assert histogram[22] == 2 and histogram[8] == 1
+    assert sessions.hour_histogram(utc_offset=2)[0] == 2
+
+    periods, energy = sessions.per_period(sessions.energy_added(52), 'month')
+    assert list(periods) == [np.datetime64('2020-01-01'), np.datetime64('2020-02-01')]
+    np.testing.assert_allclose(energy, [26, 5.2])
+
+    periods, rates = sessions.error_rate('week')
+    assert list(periods) == [np.datetime64('2020-01-27'), np.datetime64('2020-02-03')]
+    np.testing.assert_allclose(rates, [0, 0.5])
+
+    with pytest.raises(RuntimeError):
+        sessions.per_period(sessions.duration, 'year')
+
+
+def test_fleet():
+    fleet = ChargeSessions.concatenate([
+        ChargeSessions.from_records(RECORDS, 'VIN1'),
+        ChargeSessions.from_records(RECORDS[:1], 'VIN2')
+    ])
+    assert fleet.vins == ['VIN1', 'VIN2']
+    assert list(fleet.vehicle) == [0, 0, 0, 1]
+
+    # A battery size for each vehicle
+    np.testing.assert_allclose(fleet.per_vehicle(fleet.energy_added([52, 41])), [31.2, 20.5])
+
+    errors = fleet.select(fleet.errors())
+    assert len(errors) == 1 and errors.vins[errors.vehicle[0]] == 'VIN1'
+
+
+def test_from_history_store(tmp_path):
+    from pyze.api.historystore import HistoryStore
+    store = HistoryStore(str(tmp_path / 'history.sqlite'))
+    store.replace('VIN', 'charges', datetime(2020, 1, 1), datetime(2020, 2, 29), RECORDS)
+
+    sessions = ChargeSessions.from_history_store(['VIN', 'OTHER'], datetime(2020, 2, 1), datetime(2020, 2, 29), store)
+    assert len(sessions) == 2
+    assert sessions.vins == ['VIN', 'OTHER']
+
+
+def test_no_sessions():
+    for sessions in [ChargeSessions.concatenate([]), ChargeSessions.from_records([], 'VIN')]:
+        assert len(sessions) == 0
+        assert sessions.start.dtype == np.dtype('datetime64[s]')
+        assert sessions.duration.dtype == float
+        assert sessions.energy_added(52).shape == (0,)
+        assert list(sessions.hour_histogram()) == [0] * 24
+        periods, rates = sessions.error_rate()
+        assert len(periods) == 0 and len(rates) == 0
+
+    assert ChargeSessions.concatenate([]).vins == []
+    assert list(ChargeSessions.concatenate([]).per_vehicle([])) == []
@@ -0,0 +1,148 @@
+from pyze.api.cache import ResponseCache, MemoryCacheBackend, SQLiteCacheBackend, CachingAPIObject, ttl_cached, \
+    ttl_cached_async
+from pyze.api.credentials import BasicCredentialStore, requires_credentials
+
+import asyncio
+
+import gc
+import pytest
+import time
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryCacheBackend(maxsize=2)
+    return SQLiteCacheBackend(str(tmp_path / 'cache.sqlite'), maxsize=2)
+
+
+def test_get_put(backend):
+    cache = ResponseCache(backend)
+    assert cache.get('acc', 'VIN', 'battery-status', 2) is None
+
+    cache.put('acc', 'VIN', 'battery-status', 2, {'batteryLevel': 42})
+
+    assert cache.get('acc', 'VIN', 'battery-status', 2) == {'batteryLevel': 42}
+    assert cache.get('acc', 'VIN', 'battery-status', 1) is None
+    assert cache.get('acc', 'OTHER', 'battery-status', 2) is None
+
+
+def test_returned_responses_are_copies(backend):
+    cache = ResponseCache(backend)
+    cache.put('acc', 'VIN', 'cockpit', 2, {'totalMileage': 1234})
+
+    cache.get('acc', 'VIN', 'cockpit', 2)['totalMileage'] = 0
+
+    assert cache.get('acc', 'VIN', 'cockpit', 2) == {'totalMileage': 1234}
+
+
+def test_expiry(backend, monkeypatch):
+    cache = ResponseCache(backend, ttls={'battery-status': 10})
+    cache.put('acc', 'VIN', 'battery-status', 2, {'batteryLevel': 42})
+
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 11)
+
+    assert cache.get('acc', 'VIN', 'battery-status', 2) is None
+
+
+def test_lru_eviction(backend):
+    cache = ResponseCache(backend)
+    cache.put('acc', 'VIN', 'battery-status', 2, {})
+    cache.put('acc', 'VIN', 'cockpit', 2, {})
+    cache.get('acc', 'VIN', 'battery-status', 2)
+    cache.put('acc', 'VIN', 'hvac-status', 1, {})
+
+    assert cache.get('acc', 'VIN', 'battery-status', 2) == {}
+    assert cache.get('acc', 'VIN', 'cockpit', 2) is None
+    assert cache.get('acc', 'VIN', 'hvac-status', 1) == {}
+
+
+def test_action_invalidates_endpoint(backend):
+    cache = ResponseCache(backend)
+    cache.put('acc', 'VIN', 'charge-mode', 1, {'chargeMode': 'always'})
+    cache.put('acc', 'VIN', 'charges?start=20200101&end=20200131', 1, {})
+
+    cache.invalidate_action('acc', 'VIN', 'actions/charge-mode')
+
+    assert cache.get('acc', 'VIN', 'charge-mode', 1) is None
+    assert cache.get('acc', 'VIN', 'charges?start=20200101&end=20200131', 1) == {}
+
+
+def test_history_ttl():
+    cache = ResponseCache()
+    assert cache.ttl_for('charges?start=20200101&end=20200131') is None
+    assert cache.ttl_for('charge-history?type=month&start=202001&end=202002') is None
+    assert cache.ttl_for('charges?start=20200101&end=29991231') == 300
+    assert cache.ttl_for('battery-status') == 10
+
+
+class Counter(CachingAPIObject):
+    def __init__(self):
+        self.calls = 0
+
+    @ttl_cached(60)
+    def count(self):
+        self.calls += 1
+        return self.calls
+
+
+def test_ttl_cached_per_instance(monkeypatch):
+    now = 1000
+    monkeypatch.setattr(time, 'time', lambda: now)
+    a, b = Counter(), Counter()
+
+    assert a.count() == 1
+    assert a.count() == 1
+    assert b.count() == 1
+
+    now = 1060
+    assert a.count() == 2
+
+    a._clear_all_caches()
+    assert a.count() == 3
+    assert b.count() == 2
+
+
+def test_invalidation_hooks_held_weakly():
+    source, listener = Counter(), Counter()
+    source.add_invalidation_hook(listener._clear_all_caches)
+    listener.count()
+
+    source._clear_all_caches()
+    assert listener.count() == 2
+
+    del listener
+    gc.collect()
+    source._clear_all_caches()
+    assert source._invalidation_hooks == []
+
+
+class TwoCached(CachingAPIObject):
+    def __init__(self):
+        self._credentials = BasicCredentialStore()
+        self._credentials['token'] = ('t', None)
+
+    @ttl_cached(60)
+    @requires_credentials('token')
+    def first(self):
+        return 'first'
+
+    @ttl_cached(60)
+    @requires_credentials('token')
+    def second(self):
+        return 'second'
+
+    @ttl_cached_async(60)
+    @requires_credentials('token')
+    async def third(self):
+        return 'third'
+
+
+def test_ttl_cached_methods_cached_separately():
+    o = TwoCached()
+    assert TwoCached.first.__name__ == 'first'
+    assert o.first() == 'first'
+    assert o.second() == 'second'
+    assert asyncio.run(o.third()) == 'third'
+    assert (o.first(), o.second(), asyncio.run(o.third())) == ('first', 'second', 'third')
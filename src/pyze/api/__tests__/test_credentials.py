@@ -0,0 +1,245 @@
+from pyze.api.credentials import BasicCredentialStore, FileCredentialStore, MissingCredentialException, \
+    SQLiteCredentialDatabase, SQLiteCredentialStore, requires_credentials
+
+import multiprocessing
+import os
+import pytest
+import simplejson
+import threading
+import time
+
+
+def _store(path, write_delay=0):
+    return FileCredentialStore(str(path), reload_interval=0, write_delay=write_delay)
+
+
+def test_writers_merge_changes(tmp_path):
+    path = tmp_path / 'pyze.json'
+    a = _store(path)
+    b = _store(path)
+
+    a['gigya'] = ('login-token', None)
+    b['gigya-token'] = ('jwt', time.time() + 900)
+
+    c = _store(path)
+    assert c['gigya'] == 'login-token'
+    assert c['gigya-token'] == 'jwt'
+
+
+def test_changes_from_other_stores_picked_up(tmp_path):
+    path = tmp_path / 'pyze.json'
+    a = _store(path)
+    b = _store(path)
+
+    a['kamereon-account'] = ('account-id', None)
+
+    assert b['kamereon-account'] == 'account-id'
+
+
+def test_clear_removes_keys_from_file(tmp_path):
+    path = tmp_path / 'pyze.json'
+    a = _store(path)
+    a['gigya'] = ('login-token', None)
+    a['kamereon-api-key'] = ('api-key', None)
+
+    b = _store(path)
+    b.clear()
+
+    assert 'gigya' not in _store(path)
+    assert _store(path)['kamereon-api-key'] == 'api-key'
+
+
+def _write_many(path, prefix):
+    store = _store(path)
+    for i in range(20):
+        store['{}-{}'.format(prefix, i)] = ('token', None)
+
+
+def test_concurrent_processes(tmp_path):
+    path = str(tmp_path / 'pyze.json')
+    processes = [multiprocessing.Process(target=_write_many, args=(path, p)) for p in 'abcd']
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    with open(path) as f:
+        stored = simplejson.load(f)
+
+    assert len(stored) == 80
+    assert not [f for f in os.listdir(str(tmp_path)) if f.endswith('.tmp')]
+
+
+def test_writes_are_coalesced(tmp_path, monkeypatch):
+    path = tmp_path / 'pyze.json'
+    store = _store(path, write_delay=60)
+    writes = []
+    original_write = store._write_file
+    monkeypatch.setattr(store, '_write_file', lambda: writes.append(1) or original_write())
+
+    store['gigya'] = ('login-token', None)
+    store['gigya-person-id'] = ('person', None)
+    store['kamereon-account'] = ('account', None)
+
+    assert not path.exists()
+    store.flush()
+
+    assert len(writes) == 1
+    assert _store(path)['kamereon-account'] == 'account'
+
+
+def test_delayed_write(tmp_path):
+    path = tmp_path / 'pyze.json'
+    store = _store(path, write_delay=0.05)
+    store['gigya'] = ('login-token', None)
+
+    time.sleep(0.2)
+
+    assert _store(path)['gigya'] == 'login-token'
+
+
+def test_change_during_write_not_lost(tmp_path):
+    path = tmp_path / 'pyze.json'
+    store = _store(path, write_delay=10)
+    store['gigya'] = ('login-token', None)
+
+    # Another thread stores a credential while the write is in progress
+    late = threading.Thread(target=store.store, args=('gigya-token', 'jwt', None))
+    reindex = store._reindex
+
+    def slow_reindex():
+        # Called once the file's been written, before changes are marked clean
+        if not late.ident:
+            late.start()
+            time.sleep(0.1)
+        reindex()
+
+    store._reindex = slow_reindex
+    store.flush()
+    store._reindex = reindex
+    late.join()
+    store.flush()
+
+    on_disk = _store(path)
+    assert on_disk['gigya'] == 'login-token'
+    assert on_disk['gigya-token'] == 'jwt'
+
+
+def test_unchanged_values_not_rewritten(tmp_path):
+    path = tmp_path / 'pyze.json'
+    store = _store(path)
+    store['kamereon-account'] = ('account', None)
+    signature = store._file_signature()
+
+    store['kamereon-account'] = ('account', None)
+
+    assert store._file_signature() == signature
+
+
+def test_sqlite_profiles_are_independent(tmp_path):
+    db = SQLiteCredentialDatabase(str(tmp_path / 'pyze.sqlite'))
+    alice = db.store('alice')
+    bob = db.store('bob')
+
+    alice['gigya'] = ('alice-token', None)
+    bob['gigya'] = ('bob-token', None)
+    alice.clear()
+
+    assert 'gigya' not in alice
+    assert bob['gigya'] == 'bob-token'
+    assert db.profiles() == ['bob']
+
+
+def test_sqlite_changes_visible_to_other_stores(tmp_path):
+    path = str(tmp_path / 'pyze.sqlite')
+    a = SQLiteCredentialStore(SQLiteCredentialDatabase(path), 'alice', reload_interval=0)
+    b = SQLiteCredentialStore(SQLiteCredentialDatabase(path), 'alice', reload_interval=0)
+    same_connection = SQLiteCredentialStore(a._database, 'alice', reload_interval=0)
+
+    a['gigya-token'] = ('jwt', time.time() + 900)
+
+    assert b['gigya-token'] == 'jwt'
+    assert same_connection['gigya-token'] == 'jwt'
+
+
+def test_sqlite_reloads_only_changed_profiles(tmp_path, monkeypatch):
+    path = str(tmp_path / 'pyze.sqlite')
+    alice = SQLiteCredentialDatabase(path).store('alice', reload_interval=0)
+    db = SQLiteCredentialDatabase(path)
+    bob = db.store('bob', reload_interval=0)
+    other_alice = db.store('alice', reload_interval=0)
+    loaded = []
+    load = db.load
+    monkeypatch.setattr(db, 'load', lambda profile: loaded.append(profile) or load(profile))
+
+    alice['gigya'] = ('alice-token', None)
+    assert 'gigya' not in bob
+    assert other_alice['gigya'] == 'alice-token'
+    assert loaded == ['alice']
+
+    # Our own writes don't need reloading
+    bob['gigya'] = ('bob-token', None)
+    assert bob['gigya'] == 'bob-token'
+    assert loaded == ['alice']
+
+    db.purge_expired()
+    alice['gigya-token'] = ('jwt', time.time() - 100)
+    db.purge_expired()
+    assert 'gigya-token' not in other_alice
+    assert loaded == ['alice', 'alice']
+
+
+def test_sqlite_purge_expired(tmp_path):
+    db = SQLiteCredentialDatabase(str(tmp_path / 'pyze.sqlite'))
+    for i in range(10):
+        store = db.store('profile{}'.format(i))
+        store['gigya'] = ('login-token', None)
+        store['gigya-token'] = ('jwt', time.time() + (100 if i % 2 else -100))
+
+    assert db.purge_expired() == 5
+    assert len(db.profiles()) == 10
+
+
+def test_expired_credentials_evicted(monkeypatch):
+    now = 1000
+    monkeypatch.setattr(time, 'time', lambda: now)
+
+    store = BasicCredentialStore()
+    store['gigya'] = ('login-token', None)
+    store['gigya-token'] = ('jwt', 1100)
+    store['kamereon-account'] = ('account', 1200)
+
+    assert store.get('gigya-token') == 'jwt'
+    assert store.missing(['gigya', 'gigya-token']) is None
+
+    now = 1150
+    assert store.get('gigya-token', 'default') == 'default'
+    assert 'gigya-token' not in store
+    assert store.missing(['gigya', 'gigya-token']) == 'gigya-token'
+    assert set(store._store.keys()) == {'gigya', 'kamereon-account'}
+    assert store._next_expiry == 1200
+
+    now = 1200
+    assert store.credential('kamereon-account') is None
+    with pytest.raises(KeyError):
+        store['kamereon-account']
+
+
+def test_requires_credentials():
+    class Client(object):
+        def __init__(self):
+            self._credentials = BasicCredentialStore()
+
+        @requires_credentials('gigya', 'gigya-token')
+        def call(self):
+            return 'called'
+
+    client = Client()
+    client._credentials['gigya'] = ('login-token', None)
+    client._credentials['gigya-token'] = ('jwt', time.time() - 1)
+
+    with pytest.raises(MissingCredentialException, match='gigya-token'):
+        client.call()
+
+    client._credentials['gigya-token'] = ('jwt', time.time() + 900)
+    assert client.call() == 'called'
@@ -0,0 +1,73 @@
+from pyze.api.__tests__.conftest import FakeKamereon
+from pyze.api.fleet import FleetPoller
+from pyze.api.kamereon import Vehicle
+
+import pytest
+import threading
+import time
+
+
+class CountingKamereon(FakeKamereon):
+    def __init__(self):
+        super().__init__()
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+
+class FakeVehicle(Vehicle):
+    def battery_status(self):
+        k = self._kamereon
+        with k.lock:
+            k.active += 1
+            k.peak = max(k.peak, k.active)
+        time.sleep(0.05)
+        with k.lock:
+            k.active -= 1
+        if self._vin == 'BROKEN':
+            raise RuntimeError('Broken')
+        return {'vin': self._vin}
+
+
+def test_poll_bounds_concurrency_per_account():
+    accounts = [CountingKamereon(), CountingKamereon()]
+    vehicles = [FakeVehicle('VIN{}'.format(i), accounts[i % 2]) for i in range(20)]
+    vehicles.append(FakeVehicle('BROKEN', accounts[0]))
+
+    poller = FleetPoller(
+        vehicles,
+        endpoints=['battery_status'],
+        concurrency=6,
+        per_account_concurrency=3
+    )
+
+    results = list(poller.poll())
+
+    assert len(results) == 21
+    assert {r.vin for r in results if r.error is None} == {'VIN{}'.format(i) for i in range(20)}
+    broken = [r for r in results if r.vin == 'BROKEN'][0]
+    assert isinstance(broken.error, RuntimeError)
+    assert all(a.peak == 3 for a in accounts)
+
+
+def test_poll_streams_results():
+    k = CountingKamereon()
+    poller = FleetPoller(
+        [FakeVehicle('VIN{}'.format(i), k) for i in range(100)],
+        endpoints=['battery_status'],
+        concurrency=4,
+        per_account_concurrency=4
+    )
+
+    start = time.time()
+    first = next(poller.poll())
+
+    assert first.result['vin'].startswith('VIN')
+    assert time.time() - start < 0.5
+
+
+def test_concurrency_must_be_positive():
+    with pytest.raises(ValueError):
+        FleetPoller([], concurrency=0)
+    with pytest.raises(ValueError):
+        FleetPoller([], per_account_concurrency=0)
@@ -0,0 +1,61 @@
+from pyze.api.credentials import BasicCredentialStore
+from pyze.api.gigya import Gigya
+
+import concurrent.futures
+import threading
+import time
+
+
+class CountingGigya(Gigya):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fetches = 0
+        self.fetched = threading.Event()
+
+    def _fetch_jwt_token(self):
+        self.fetches += 1
+        time.sleep(0.1)
+        token = 'token{}'.format(self.fetches)
+        self._credentials['gigya-token'] = (token, time.time() + 900)
+        self.fetched.set()
+        return token
+
+
+def _gigya():
+    credentials = BasicCredentialStore()
+    credentials['gigya'] = ('gigya-token', None)
+    return CountingGigya(credentials=credentials)
+
+
+def test_concurrent_misses_fetch_one_token():
+    g = _gigya()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        tokens = list(executor.map(lambda _: g.get_jwt_token(), range(8)))
+
+    assert tokens == ['token1'] * 8
+    assert g.fetches == 1
+
+
+def test_token_refreshed_in_background_before_expiry():
+    g = _gigya()
+    g._credentials['gigya-token'] = ('old', time.time() + 60)
+
+    start = time.time()
+    for _ in range(5):
+        assert g.get_jwt_token() == 'old'
+    assert time.time() - start < 0.1
+
+    assert g.fetched.wait(1)
+    time.sleep(0.01)
+    assert g.get_jwt_token() == 'token1'
+    assert g.fetches == 1
+
+
+def test_fresh_token_not_refreshed():
+    g = _gigya()
+    g._credentials['gigya-token'] = ('current', time.time() + 800)
+
+    assert g.get_jwt_token() == 'current'
+    time.sleep(0.05)
+    assert g.fetches == 0
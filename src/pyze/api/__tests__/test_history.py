@@ -0,0 +1,74 @@
+from datetime import datetime
+from pyze.api.history import fetch_range, iter_range, split_range
+from pyze.api.scheduler import Priority, current_priority, request_priority
+
+import threading
+import time
+
+
+def _days(windows):
+    return [(s.strftime('%Y%m%d'), e.strftime('%Y%m%d')) for s, e in windows]
+
+
+def test_split_by_month():
+    assert _days(split_range(datetime(2019, 11, 15), datetime(2020, 2, 3))) == [
+        ('20191115', '20191130'),
+        ('20191201', '20191231'),
+        ('20200101', '20200131'),
+        ('20200201', '20200203')
+    ]
+    assert _days(split_range(datetime(2020, 1, 2), datetime(2020, 1, 20))) == [('20200102', '20200120')]
+
+
+def test_split_by_week():
+    # 2020-01-01 was a Wednesday
+    assert _days(split_range(datetime(2020, 1, 1, 12), datetime(2020, 1, 14), 'week')) == [
+        ('20200101', '20200105'),
+        ('20200106', '20200112'),
+        ('20200113', '20200114')
+    ]
+
+
+def test_fetch_range_merges_in_order():
+    lock = threading.Lock()
+    state = {'active': 0, 'peak': 0}
+
+    def fetch(start, end):
+        with lock:
+            state['active'] += 1
+            state['peak'] = max(state['peak'], state['active'])
+        # Later windows finish first
+        time.sleep(0.05 * (13 - start.month))
+        with lock:
+            state['active'] -= 1
+        records = [{'month': start.month, 'priority': current_priority().name}]
+        if start.month > 1:
+            # Straddles the boundary, so both windows return it
+            records.insert(0, {'month': start.month - 1, 'priority': current_priority().name})
+        return records
+
+    with request_priority(Priority.BACKGROUND):
+        records = fetch_range(fetch, datetime(2020, 1, 1), datetime(2020, 12, 31), concurrency=3)
+
+    assert [r['month'] for r in records] == list(range(1, 13))
+    assert all(r['priority'] == 'BACKGROUND' for r in records)
+    assert state['peak'] == 3
+
+
+def test_iter_range_yields_as_windows_arrive_and_stops_early():
+    fetched = []
+
+    def fetch(start, end):
+        fetched.append(start.month)
+        time.sleep(0.02)
+        return [{'month': start.month, 'n': n} for n in range(2)] + [{'straddles': start.month + 1}]
+
+    records = iter_range(fetch, datetime(2020, 1, 1), datetime(2020, 12, 31), concurrency=2)
+
+    assert next(records) == {'month': 1, 'n': 0}
+    assert len(fetched) <= 3
+    assert [next(records) for _ in range(3)] == [{'month': 1, 'n': 1}, {'straddles': 2}, {'month': 2, 'n': 0}]
+
+    records.close()
+    time.sleep(0.1)
+    assert len(fetched) <= 5
@@ -0,0 +1,130 @@
+from datetime import date, datetime, timedelta
+from pyze.api.historystore import HistoryStore
+
+
+class FakeVehicle(object):
+    _vin = 'VIN'
+
+    def __init__(self):
+        self.charges = {}
+        self.requests = []
+
+    def iter_charge_history(self, start, end):
+        self.requests.append((start.date(), end.date()))
+        day = start.date()
+        while day <= end.date():
+            for charge in self.charges.get(day, []):
+                yield charge
+            day += timedelta(days=1)
+
+    def iter_charge_statistics(self, start, end, period):
+        self.requests.append((start.date(), end.date(), period))
+        return [{'month': start.strftime('%Y%m'), 'totalChargesNumber': len(self.requests)}]
+
+
+def _charge(day, status='ok'):
+    return {'chargeStartDate': '{}T10:00:00Z'.format(day.isoformat()), 'chargeEndStatus': status}
+
+
+def test_sync_fetches_only_new_days(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite'))
+    v = FakeVehicle()
+    v.charges = {
+        date(2020, 1, 10): [_charge(date(2020, 1, 10))],
+        date(2020, 1, 20): [_charge(date(2020, 1, 20), 'in progress')]
+    }
+
+    assert store.sync(v, ['charges'], since=date(2020, 1, 1), today=date(2020, 1, 20)) == 2
+    assert store.watermark('VIN', 'charges') == (date(2020, 1, 1), date(2020, 1, 19))
+
+    # The last day is fetched again, replacing what we had for it
+    v.charges[date(2020, 1, 20)] = [_charge(date(2020, 1, 20), 'finished')]
+    v.charges[date(2020, 1, 21)] = [_charge(date(2020, 1, 21))]
+    v.requests = []
+    store.sync(v, ['charges'], today=date(2020, 1, 22))
+    assert v.requests == [(date(2020, 1, 20), date(2020, 1, 22))]
+
+    assert [c['chargeEndStatus'] for c in store.charge_history('VIN', datetime(2020, 1, 1), datetime(2020, 1, 31))] == \
+        ['ok', 'finished', 'ok']
+    assert len(store.charge_history('VIN', datetime(2020, 1, 15), datetime(2020, 1, 20))) == 1
+    assert store.charge_history('OTHER', datetime(2020, 1, 1), datetime(2020, 1, 31)) == []
+
+
+def test_sync_backfills_earlier_days(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite'))
+    v = FakeVehicle()
+    store.sync(v, ['charges'], since=date(2020, 1, 10), today=date(2020, 1, 20))
+
+    v.requests = []
+    store.sync(v, ['charges'], since=date(2020, 1, 1), today=date(2020, 1, 20))
+    assert v.requests == [(date(2020, 1, 1), date(2020, 1, 9)), (date(2020, 1, 20), date(2020, 1, 20))]
+    assert store.watermark('VIN', 'charges') == (date(2020, 1, 1), date(2020, 1, 19))
+
+
+def test_monthly_summaries_refetch_current_month(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite'))
+    v = FakeVehicle()
+    store.sync(v, ['charge-history/month'], since=date(2020, 1, 1), today=date(2020, 1, 20))
+    store.sync(v, ['charge-history/month'], today=date(2020, 2, 5))
+
+    assert v.requests[-1] == (date(2020, 1, 1), date(2020, 2, 5), 'month')
+    assert store.watermark('VIN', 'charge-history/month')[1] == date(2020, 1, 31)
+    assert [s['totalChargesNumber'] for s in store.charge_statistics('VIN', datetime(2020, 1, 1), datetime(2020, 2, 1))] == [2]
+
+
+def test_rollups_follow_stored_sessions(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite'))
+    jan31 = dict(_charge(date(2020, 1, 31)), chargeDuration=60)
+    feb3 = dict(_charge(date(2020, 2, 3), 'error'), chargeDuration=30)
+    store.replace('VIN', 'charges', date(2020, 1, 1), date(2020, 2, 3), [jan31, feb3, feb3])
+
+    assert store.charge_rollups('VIN', date(2020, 1, 1), date(2020, 2, 29)) == [
+        {'month': '202001', 'totalChargesNumber': 1, 'totalChargesErrors': 0, 'totalChargesDuration': 60},
+        {'month': '202002', 'totalChargesNumber': 1, 'totalChargesErrors': 1, 'totalChargesDuration': 30}
+    ]
+    # Weeks start on Monday, so Friday 31st and Monday 3rd are in different weeks
+    assert [r['week'] for r in store.charge_rollups('VIN', date(2020, 2, 1), date(2020, 2, 29), 'week')] == \
+        ['20200127', '20200203']
+
+    # A session that was in progress finishes, and another starts
+    feb3_done = dict(feb3, chargeEndStatus='ok', chargeDuration=45)
+    store.replace('VIN', 'charges', date(2020, 2, 3), date(2020, 2, 4), [feb3_done, _charge(date(2020, 2, 4))])
+    assert store.charge_rollups('VIN', date(2020, 2, 3), date(2020, 2, 4), 'day') == [
+        {'day': '20200203', 'totalChargesNumber': 1, 'totalChargesErrors': 0, 'totalChargesDuration': 45},
+        {'day': '20200204', 'totalChargesNumber': 1, 'totalChargesErrors': 0, 'totalChargesDuration': 0}
+    ]
+
+    # Periods left with no sessions disappear
+    store.replace('VIN', 'charges', date(2020, 1, 1), date(2020, 1, 31), [])
+    assert [r['month'] for r in store.charge_rollups('VIN', date(2020, 1, 1), date(2020, 2, 29))] == ['202002']
+    assert store.hvac_rollups('VIN', date(2020, 1, 1), date(2020, 2, 29)) == []
+
+
+def test_rollups_built_for_existing_store(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    store = HistoryStore(path)
+    store.replace('VIN', 'hvac-sessions', date(2020, 1, 1), date(2020, 1, 31), [
+        {'hvacSessionRequestDate': '2020-01-10T07:00:00Z', 'hvacSessionEndStatus': 'ok'},
+        {'hvacSessionRequestDate': '2020-01-11T07:00:00Z', 'hvacSessionEndStatus': 'error'}
+    ])
+    store._conn.execute('DROP TABLE rollups')
+
+    assert HistoryStore(path).hvac_rollups('VIN', date(2020, 1, 1), date(2020, 1, 31)) == [
+        {'month': '202001', 'totalHvacSessionsNumber': 2, 'totalHvacSessionsErrors': 1}
+    ]
+
+
+def test_session_spanning_midnight(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite'))
+    started = {'chargeStartDate': '2020-01-19T23:00:00Z', 'chargeDuration': 60}
+    store.replace('VIN', 'charges', date(2020, 1, 19), date(2020, 1, 19), [started])
+
+    # Returned again, finished, by each later window it overlaps
+    finished = dict(started, chargeDuration=120, chargeEndStatus='ok')
+    for _ in range(2):
+        store.replace('VIN', 'charges', date(2020, 1, 20), date(2020, 1, 22), [finished])
+
+    assert store.charge_history('VIN', datetime(2020, 1, 1), datetime(2020, 1, 31)) == [finished]
+    assert store.charge_rollups('VIN', date(2020, 1, 1), date(2020, 1, 31)) == [
+        {'month': '202001', 'totalChargesNumber': 1, 'totalChargesErrors': 0, 'totalChargesDuration': 120}
+    ]
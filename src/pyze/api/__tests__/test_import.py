@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+
+HEAVY_MODULES = [
+    'aiohttp',
+    'dateparser',
+    'dateutil',
+    'jwt',
+    'numpy',
+    'requests',
+    'simplejson',
+    'tzlocal',
+    'pyze.api.gigya',
+    'pyze.api.kamereon'
+]
+
+LIGHT_IMPORT = 'import pyze.api; from pyze.api import ChargeSchedule, ChargeMode, ChargeState, PlugState'
+
+
+def _run(code, *options):
+    src_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+    env = dict(os.environ, PYTHONPATH=src_dir)
+    return subprocess.run(
+        [sys.executable] + list(options) + ['-c', code],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True
+    )
+
+
+def _import_time_us(importtime_output, module):
+    # Lines look like "import time: self [us] | cumulative | imported package"
+    for line in importtime_output.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+
+
+def test_light_imports_avoid_heavy_modules():
+    loaded = _run(
+        LIGHT_IMPORT + '; import sys; print("\\n".join(m for m in {} if m in sys.modules))'.format(HEAVY_MODULES)
+    ).stdout.split()
+    assert loaded == []
+
+
+def test_import_time(record_property):
+    # Not asserted against a fixed budget, as that depends on the machine,
+    # but recorded so it shows up in test reports.
+    lazy = _import_time_us(_run(LIGHT_IMPORT, '-X', 'importtime').stderr, 'pyze.api')
+    eager = _import_time_us(_run('import pyze.api.kamereon', '-X', 'importtime').stderr, 'pyze.api.kamereon')
+    record_property('pyze_api_import_us', lazy)
+    record_property('pyze_api_kamereon_import_us', eager)
+    assert lazy is not None and eager is not None
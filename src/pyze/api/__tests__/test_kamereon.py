@@ -0,0 +1,180 @@
+from pyze.api.__tests__.conftest import FakeKamereon, FakeResponse
+from pyze.api.cache import ResponseCache
+from pyze.api.credentials import BasicCredentialStore
+from pyze.api.kamereon import Kamereon, Vehicle
+from pyze.api.schedule import ChargeMode
+from pyze.api.scheduler import Priority, current_priority, request_priority
+
+import concurrent.futures
+import requests
+import threading
+import time
+
+
+class SlowVehicle(Vehicle):
+    def battery_status(self):
+        time.sleep(0.2)
+        return {'batteryLevel': 42}
+
+    def mileage(self):
+        time.sleep(0.2)
+        return {'totalMileage': 1234}
+
+    def location(self):
+        raise requests.HTTPError('Not implemented for this vehicle')
+
+    def hvac_status(self):
+        time.sleep(1)
+
+
+def test_snapshot_fetches_concurrently():
+    v = SlowVehicle('VIN', FakeKamereon())
+
+    start = time.time()
+    snapshot = v.snapshot(['battery_status', 'mileage', 'location'])
+
+    assert time.time() - start < 0.35
+    assert snapshot.results == {
+        'battery_status': {'batteryLevel': 42},
+        'mileage': {'totalMileage': 1234}
+    }
+    assert list(snapshot.errors.keys()) == ['location']
+    assert isinstance(snapshot.errors['location'], requests.HTTPError)
+
+
+def test_snapshot_deadline():
+    v = SlowVehicle('VIN', FakeKamereon())
+
+    start = time.time()
+    snapshot = v.snapshot(['battery_status', 'hvac_status'], timeout=0.5)
+
+    assert time.time() - start < 1
+    assert snapshot.results == {'battery_status': {'batteryLevel': 42}}
+    assert isinstance(snapshot.errors['hvac_status'], concurrent.futures.TimeoutError)
+
+
+def test_snapshot_of_nothing():
+    snapshot = SlowVehicle('VIN', FakeKamereon()).snapshot([])
+    assert snapshot.results == {} and snapshot.errors == {}
+
+
+def test_snapshot_keeps_request_priority():
+    class PriorityVehicle(Vehicle):
+        def battery_status(self):
+            return current_priority()
+
+    with request_priority(Priority.INTERACTIVE):
+        snapshot = PriorityVehicle('VIN', FakeKamereon()).snapshot(['battery_status'])
+    assert snapshot.results == {'battery_status': Priority.INTERACTIVE}
+
+
+class RecordingVehicle(Vehicle):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+
+    def _request(self, method, endpoint, **kwargs):
+        self.requests.append((method, endpoint))
+        return FakeResponse(body={'data': {'attributes': {'chargeMode': 'always'}}})
+
+
+def test_get_uses_response_cache():
+    k = FakeKamereon()
+    k._cache = ResponseCache()
+    v = RecordingVehicle('VIN', k)
+
+    assert v.charge_mode() == ChargeMode.always
+    assert v.charge_mode() == ChargeMode.always
+    assert len(v.requests) == 1
+
+    v.set_charge_mode(ChargeMode.always_charging)
+    v.charge_mode()
+    assert [r[0] for r in v.requests] == ['GET', 'POST', 'GET']
+
+
+class CountingCredentialStore(BasicCredentialStore):
+    def __init__(self):
+        self.writes = 0
+        super().__init__()
+
+    def _write(self):
+        self.writes += 1
+        super()._write()
+
+
+def test_account_id_resolved_once(monkeypatch):
+    monkeypatch.setenv('KAMEREON_ACCOUNT_ID', 'account-from-env')
+    credentials = CountingCredentialStore()
+    k = Kamereon(credentials=credentials)
+    writes = credentials.writes
+
+    for _ in range(10):
+        assert k.get_account_id() == 'account-from-env'
+
+    assert credentials.writes == writes + 1
+
+
+def test_scheduler_can_be_disabled():
+    assert Kamereon(credentials=BasicCredentialStore())._scheduler
+    k = Kamereon(credentials=BasicCredentialStore(), scheduler=False)
+    assert k._admit() is None
+
+
+def test_login_clears_account_and_vehicles(monkeypatch):
+    requests_made = []
+
+    def send(session, method, url, *args, **kwargs):
+        requests_made.append(url)
+        return FakeResponse(body={'vehicleLinks': [{'vin': 'VIN{}'.format(len(requests_made))}]})
+
+    monkeypatch.setattr('pyze.api.kamereon.send', send)
+    monkeypatch.delenv('KAMEREON_ACCOUNT_ID', raising=False)
+    credentials = BasicCredentialStore()
+    credentials['kamereon-api-key'] = ('api-key', None)
+    credentials['gigya'] = ('login-token', None)
+    credentials['gigya-token'] = ('jwt', time.time() + 900)
+    k = Kamereon(credentials=credentials, rate_limiter=False)
+    k.set_account_id('account-1')
+
+    assert k.get_vehicles() == k.get_vehicles()
+    assert len(requests_made) == 1
+
+    k._gigya._clear_all_caches()  # As on login
+    assert k._account_id is None
+
+    k.set_account_id('account-2')
+    assert k.get_vehicles()['vehicleLinks'][0]['vin'] == 'VIN2'
+    assert 'account-2' in requests_made[-1]
+
+
+def test_vehicles_persisted_between_instances(monkeypatch):
+    requests_made = []
+
+    def send(session, method, url, *args, **kwargs):
+        requests_made.append(url)
+        return FakeResponse(body={'vehicleLinks': [{'vin': 'VIN{}'.format(len(requests_made))}]})
+
+    monkeypatch.setattr('pyze.api.kamereon.send', send)
+    monkeypatch.setenv('KAMEREON_ACCOUNT_ID', 'account-1')
+    credentials = BasicCredentialStore()
+    credentials['kamereon-api-key'] = ('api-key', None)
+    credentials['gigya'] = ('login-token', None)
+    credentials['gigya-token'] = ('jwt', time.time() + 86400)
+
+    assert Kamereon(credentials=credentials).get_stored_vehicles() is None
+    assert Kamereon(credentials=credentials).get_vehicles()['vehicleLinks'][0]['vin'] == 'VIN1'
+    assert Kamereon(credentials=credentials).get_vehicles()['vehicleLinks'][0]['vin'] == 'VIN1'
+    assert len(requests_made) == 1
+
+    # Stale: served from the store, then refreshed in the background
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 7200)
+    k = Kamereon(credentials=credentials)
+    assert k.get_stored_vehicles()['vehicleLinks'][0]['vin'] == 'VIN1'
+    assert len(requests_made) == 1
+    assert k.get_vehicles()['vehicleLinks'][0]['vin'] == 'VIN1'
+    for thread in threading.enumerate():
+        if thread.name.startswith('pyze-refresh'):
+            thread.join()
+    assert len(requests_made) == 2
+    assert k.get_vehicles()['vehicleLinks'][0]['vin'] == 'VIN2'
@@ -0,0 +1,84 @@
+from pyze.api.ratelimit import Budget, RateLimiter, MemoryBucketStore, SQLiteBucketStore
+
+import pytest
+import time
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBucketStore()
+    return SQLiteBucketStore(str(tmp_path / 'ratelimit.sqlite'))
+
+
+def test_burst_then_wait(store, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(time, 'time', lambda: now)
+    limiter = RateLimiter(store, api_key_budget=Budget(2, 3))
+    bucket = RateLimiter.api_key_bucket('key')
+
+    assert [limiter.try_acquire(bucket) for _ in range(3)] == [0, 0, 0]
+    assert limiter.try_acquire(bucket) == pytest.approx(0.5)
+
+    now += 0.5
+    assert limiter.try_acquire(bucket) == 0
+
+
+def test_all_buckets_must_have_tokens(store, monkeypatch):
+    monkeypatch.setattr(time, 'time', lambda: 1000.0)
+    limiter = RateLimiter(store, api_key_budget=Budget(1, 5), account_budget=Budget(1, 1))
+    key = RateLimiter.api_key_bucket('key')
+
+    assert limiter.try_acquire(key, RateLimiter.account_bucket('a')) == 0
+    assert limiter.try_acquire(key, RateLimiter.account_bucket('a')) > 0
+    # The API key bucket wasn't charged for the refused request
+    assert limiter.try_acquire(key, RateLimiter.account_bucket('b')) == 0
+    assert [limiter.try_acquire(key) for _ in range(3)] == [0, 0, 0]
+    assert limiter.try_acquire(key) > 0
+
+
+def test_specific_budgets_and_unlimited_defaults(store):
+    special = RateLimiter.account_bucket('special')
+    limiter = RateLimiter(store, budgets={special: Budget(0.001, 1)}, account_budget=None)
+
+    assert limiter.try_acquire(special) == 0
+    assert limiter.try_acquire(special) > 0
+    assert all(limiter.try_acquire(RateLimiter.account_bucket('other')) == 0 for _ in range(100))
+
+
+def test_sqlite_budget_shared_between_stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(time, 'time', lambda: 1000.0)
+    path = str(tmp_path / 'ratelimit.sqlite')
+    first = RateLimiter(SQLiteBucketStore(path), api_key_budget=Budget(1, 2))
+    second = RateLimiter(SQLiteBucketStore(path), api_key_budget=Budget(1, 2))
+    bucket = RateLimiter.api_key_bucket('key')
+
+    assert first.try_acquire(bucket) == 0
+    assert second.try_acquire(bucket) == 0
+    assert first.try_acquire(bucket) > 0
+    assert second.try_acquire(bucket) > 0
+
+
+def test_budget_validated():
+    with pytest.raises(RuntimeError):
+        Budget(0, 10)
+    with pytest.raises(RuntimeError):
+        Budget(1, 0.5)
+    assert Budget(0.5, 1) == (0.5, 1)
+
+
+def test_acquire_async_waits_off_the_event_loop(tmp_path, monkeypatch):
+    import asyncio
+    import threading
+    limiter = RateLimiter(SQLiteBucketStore(str(tmp_path / 'ratelimit.sqlite')))
+    threads = []
+    try_acquire = limiter.try_acquire
+
+    def recording_try_acquire(*names):
+        threads.append(threading.current_thread())
+        return try_acquire(*names)
+
+    monkeypatch.setattr(limiter, 'try_acquire', recording_try_acquire)
+    asyncio.run(limiter.acquire_async(RateLimiter.api_key_bucket('key')))
+
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,135 @@
+from pyze.api.ratelimit import Budget, RateLimiter
+from pyze.api.scheduler import Priority, RequestScheduler, current_priority, request_priority
+from functools import partial
+
+import threading
+import time
+
+
+def _run_queued(scheduler, requests):
+    '''
+    Queues `requests` (priority, vin, name) behind a request holding the only
+    slot, then releases it and returns the order in which they ran.
+    '''
+    order = []
+    release = threading.Event()
+
+    def hold():
+        with scheduler.slot(Priority.BACKGROUND):
+            release.wait()
+
+    def request(priority, vin, name):
+        with scheduler.slot(priority, vin):
+            order.append(name)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    time.sleep(0.05)
+
+    threads = []
+    for r in requests:
+        t = threading.Thread(target=request, args=r)
+        t.start()
+        threads.append(t)
+        time.sleep(0.02)
+
+    release.set()
+    for t in [holder] + threads:
+        t.join()
+    return order
+
+
+def test_higher_priorities_go_first():
+    scheduler = RequestScheduler(max_concurrency=1)
+    order = _run_queued(scheduler, [
+        (Priority.BACKGROUND, 'A', 'poll'),
+        (Priority.ON_DEMAND, 'A', 'read'),
+        (Priority.INTERACTIVE, 'A', 'action'),
+    ])
+    assert order == ['action', 'read', 'poll']
+
+
+def test_round_robin_between_vins():
+    scheduler = RequestScheduler(max_concurrency=1)
+    order = _run_queued(scheduler, [
+        (Priority.BACKGROUND, 'A', 'A1'),
+        (Priority.BACKGROUND, 'A', 'A2'),
+        (Priority.BACKGROUND, 'A', 'A3'),
+        (Priority.BACKGROUND, 'B', 'B1'),
+        (Priority.BACKGROUND, 'B', 'B2'),
+    ])
+    assert order == ['A1', 'B1', 'A2', 'B2', 'A3']
+
+
+def test_throttled_account_does_not_hold_up_others():
+    scheduler = RequestScheduler(max_concurrency=1)
+    limiter = RateLimiter(
+        budgets={RateLimiter.account_bucket('A'): Budget(2, 1)},
+        api_key_budget=None,
+        account_budget=None
+    )
+    started = time.time()
+    finished = {'A': [], 'B': []}
+
+    def request(account):
+        throttle = partial(limiter.try_acquire, RateLimiter.account_bucket(account))
+        with scheduler.slot(Priority.BACKGROUND, account, throttle):
+            finished[account].append(time.time() - started)
+
+    threads = [threading.Thread(target=request, args=(account,)) for account in 'AAAABBBB']
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert max(finished['B']) < 0.25
+    assert max(finished['A']) >= 1.4
+    assert scheduler.stats()['priorities']['BACKGROUND']['queued'] == 0
+
+
+def test_interactive_not_held_up_by_saturated_slots():
+    scheduler = RequestScheduler(max_concurrency=2)
+    release = threading.Event()
+    admitted = []
+
+    def request(priority, name):
+        with scheduler.slot(priority):
+            admitted.append(name)
+            release.wait()
+
+    threads = [threading.Thread(target=request, args=(Priority.BACKGROUND, 'poll')) for _ in range(3)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    assert admitted == ['poll', 'poll']
+
+    action = threading.Thread(target=request, args=(Priority.INTERACTIVE, 'action'))
+    action.start()
+    time.sleep(0.05)
+    # Goes straight out, without waiting for either poll to finish
+    assert admitted == ['poll', 'poll', 'action']
+    assert scheduler.stats()['active'] == 3
+
+    release.set()
+    for t in threads + [action]:
+        t.join()
+    assert admitted == ['poll', 'poll', 'action', 'poll']
+
+
+def test_stats():
+    scheduler = RequestScheduler()
+    with scheduler.slot(Priority.INTERACTIVE, 'A'):
+        assert scheduler.stats()['active'] == 1
+
+    stats = scheduler.stats()
+    assert stats['active'] == 0
+    assert stats['priorities']['INTERACTIVE']['admitted'] == 1
+    assert stats['priorities']['INTERACTIVE']['queued'] == 0
+    assert stats['priorities']['BACKGROUND']['admitted'] == 0
+
+
+def test_request_priority_context():
+    assert current_priority() == Priority.ON_DEMAND
+    with request_priority(Priority.BACKGROUND):
+        assert current_priority() == Priority.BACKGROUND
+    assert current_priority() == Priority.ON_DEMAND
@@ -0,0 +1,90 @@
+from pyze.api.credentials import SQLiteCredentialDatabase
+from pyze.api.gigya import Gigya
+from pyze.api.kamereon import Kamereon
+from pyze.api.ratelimit import Budget, RateLimiter
+from pyze.api.sessions import SessionManager
+
+import threading
+import time
+
+
+def _manager(tmp_path, **kwargs):
+    return SessionManager(SQLiteCredentialDatabase(str(tmp_path / 'pyze.sqlite')), **kwargs)
+
+
+def test_identities_created_lazily_and_share_pool(tmp_path):
+    manager = _manager(tmp_path)
+    assert len(manager) == 0
+
+    alice = manager.get('alice')
+    bob = manager['bob']
+
+    assert manager.get('alice') is alice
+    assert alice is not bob
+    assert alice._credentials.profile == 'alice'
+    assert alice._session is bob._session is alice._gigya._session
+    assert alice._scheduler is bob._scheduler
+
+
+def test_least_recently_used_identity_evicted(tmp_path):
+    manager = _manager(tmp_path, max_identities=2)
+    alice = manager.get('alice')
+    alice._credentials['kamereon-account'] = ('alice-account', None)
+    manager.get('bob')
+    manager.get('alice')
+    manager.get('carol')
+
+    assert manager.identities() == ['alice', 'carol']
+
+    manager.get('bob')
+    assert 'alice' not in manager
+    # Credentials outlive the client
+    assert manager.get('alice').get_account_id() == 'alice-account'
+
+
+def test_login_many(tmp_path, monkeypatch):
+    def login(self, user, password):
+        if password == 'wrong':
+            raise RuntimeError('Bad password')
+        self._credentials['gigya'] = (user, None)
+
+    monkeypatch.setattr(Gigya, 'login', login)
+    monkeypatch.setattr(Gigya, 'account_info', lambda self: None)
+    monkeypatch.setattr(Kamereon, 'get_account_id', lambda self: 'account')
+
+    manager = _manager(tmp_path)
+    results = manager.login_many(
+        [('user{}'.format(i), 'user{}@example.com'.format(i), 'wrong' if i == 3 else 'secret') for i in range(10)]
+    )
+
+    assert list(results.keys()) == ['user{}'.format(i) for i in range(10)]
+    assert isinstance(results.pop('user3'), RuntimeError)
+    assert all(error is None for error in results.values())
+    assert manager.get('user5')._credentials['gigya'] == 'user5@example.com'
+
+
+def test_throttled_identity_does_not_hold_up_others(tmp_path):
+    limiter = RateLimiter(
+        budgets={RateLimiter.account_bucket('alice-account'): Budget(2, 1)},
+        api_key_budget=None,
+        account_budget=None
+    )
+    manager = _manager(tmp_path, pool_size=1, rate_limiter=limiter)
+    started = time.time()
+    finished = {'alice': [], 'bob': []}
+
+    def request(identity):
+        kamereon = manager.get(identity)
+        with kamereon._admit('{}-account'.format(identity), identity)():
+            finished[identity].append(time.time() - started)
+
+    for identity in ('alice', 'bob'):
+        manager.get(identity)._credentials['kamereon-api-key'] = ('key', None)
+    threads = [threading.Thread(target=request, args=(identity,)) for identity in ['alice'] * 4 + ['bob'] * 4]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert max(finished['bob']) < 0.25
+    assert max(finished['alice']) >= 1.4
@@ -0,0 +1,72 @@
+from pyze.api.singleflight import SingleFlight, AsyncSingleFlight
+
+import asyncio
+import concurrent.futures
+import pytest
+import threading
+import time
+
+
+def test_concurrent_calls_are_coalesced():
+    sf = SingleFlight()
+    calls = []
+
+    def fetch():
+        calls.append(threading.current_thread())
+        time.sleep(0.1)
+        return {'batteryLevel': 42}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: sf.do('key', fetch), range(8)))
+
+    assert len(calls) == 1
+    assert results == [{'batteryLevel': 42}] * 8
+    # Each caller gets its own copy
+    assert len(set(id(r) for r in results)) == 8
+
+
+def test_different_keys_are_not_coalesced():
+    sf = SingleFlight()
+    assert sf.do('a', lambda: 1) == 1
+    assert sf.do('b', lambda: 2) == 2
+
+
+def test_exceptions_are_shared():
+    sf = SingleFlight()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        time.sleep(0.1)
+        raise RuntimeError('Nope')
+
+    def call(_):
+        try:
+            sf.do('key', fail)
+        except RuntimeError as e:
+            return e
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        errors = list(executor.map(call, range(4)))
+
+    assert len(calls) == 1
+    assert all(isinstance(e, RuntimeError) for e in errors)
+
+    # Subsequent calls aren't affected by the failure
+    assert sf.do('key', lambda: 'ok') == 'ok'
+
+
+def test_async_calls_are_coalesced():
+    sf = AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {'batteryLevel': 42}
+
+    async def run():
+        return await asyncio.gather(*[sf.do('key', fetch) for _ in range(5)])
+
+    assert asyncio.run(run()) == [{'batteryLevel': 42}] * 5
+    assert len(calls) == 1
@@ -0,0 +1,93 @@
+from pyze.api.__tests__.conftest import FakeResponse
+from pyze.api.transport import RetryPolicy, send, parse_retry_after
+
+import pytest
+import requests
+import time
+
+
+class FakeSession(object):
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(time, 'sleep', sleeps.append)
+    return sleeps
+
+
+def test_get_retried_on_server_error(no_sleep):
+    session = FakeSession(FakeResponse(502), requests.ConnectionError(), FakeResponse(200))
+
+    response = send(session, 'GET', 'https://example.com', RetryPolicy(), timeout=(1, 2))
+
+    assert response.status_code == 200
+    assert len(session.calls) == 3
+    assert len(no_sleep) == 2
+    assert session.calls[0][2]['timeout'] == (1, 2)
+
+
+def test_gives_up_after_total_retries():
+    session = FakeSession(*[FakeResponse(503)] * 3)
+
+    response = send(session, 'GET', 'https://example.com', RetryPolicy(total=2))
+
+    assert response.status_code == 503
+    assert len(session.calls) == 3
+
+
+def test_client_errors_not_retried():
+    session = FakeSession(FakeResponse(404))
+    assert send(session, 'GET', 'https://example.com', RetryPolicy()).status_code == 404
+    assert len(session.calls) == 1
+
+
+def test_post_only_retried_if_marked_retryable():
+    session = FakeSession(FakeResponse(502), FakeResponse(200))
+    assert send(session, 'POST', 'https://example.com', RetryPolicy()).status_code == 502
+
+    session = FakeSession(FakeResponse(502), FakeResponse(200))
+    assert send(session, 'POST', 'https://example.com', RetryPolicy(), retryable=True).status_code == 200
+
+
+def test_connection_errors_raised_when_not_retryable():
+    session = FakeSession(requests.ConnectionError())
+    with pytest.raises(requests.ConnectionError):
+        send(session, 'POST', 'https://example.com', RetryPolicy())
+
+
+def test_retry_after_honoured(no_sleep):
+    session = FakeSession(FakeResponse(429, {'Retry-After': '7'}), FakeResponse(200))
+
+    send(session, 'GET', 'https://example.com', RetryPolicy())
+
+    assert no_sleep == [7]
+
+
+def test_excessive_retry_after_gives_up():
+    session = FakeSession(FakeResponse(429, {'Retry-After': '3600'}))
+    assert send(session, 'GET', 'https://example.com', RetryPolicy()).status_code == 429
+
+
+def test_backoff_is_bounded():
+    policy = RetryPolicy(backoff_factor=1, max_backoff=10, jitter=False)
+    assert [policy.backoff(a) for a in range(6)] == [1, 2, 4, 8, 10, 10]
+    jittered = RetryPolicy(backoff_factor=1, max_backoff=10)
+    assert all(0 <= jittered.backoff(a) <= 10 for a in range(10))
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert parse_retry_after('nonsense') is None
@@ -0,0 +1,594 @@
+from .cache import CachingAPIObject, ttl_cached_async
+from .credentials import CredentialStore, requires_credentials
+from .gigya import DEFAULT_ROOT_URL as DEFAULT_GIGYA_ROOT_URL, DEFAULT_JWT_REFRESH_WINDOW, \
+    ACCOUNT_INFO_TTL, raise_gigya_errors
+from .kamereon import DEFAULT_ROOT_URL, VEHICLES_TTL, AccountException, Kamereon, \
+    Snapshot, SNAPSHOT_ENDPOINTS, DEFAULT_SNAPSHOT_TIMEOUT, \
+    vehicle_url, history_endpoint, statistics_endpoint, parse_charge_mode, _check_dates, \
+    ac_start_body, charge_schedules_body, charge_mode_body, \
+    CANCEL_AC_BODY, CHARGE_START_BODY
+from .history import fetch_range_async
+from .schedule import ChargeSchedules
+from .ratelimit import RateLimiter, default_rate_limiter
+from .singleflight import AsyncSingleFlight
+from .transport import DEFAULT_TIMEOUT, NO_RETRIES, RetryPolicy, is_retryable
+from functools import partial
+
+import aiohttp
+import asyncio
+import jwt
+import logging
+import os
+import time
+
+
+_log = logging.getLogger('pyze.api.aio')
+
+# Maximum number of simultaneous connections in the shared pool. aiohttp's
+# own default (100) is far too low to keep a fleet's worth of requests in
+# flight.
+DEFAULT_CONNECTION_LIMIT = 1000
+
+
+def create_session(limit=DEFAULT_CONNECTION_LIMIT):
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=limit)
+    )
+
+
+async def send(session, method, url, retry_policy=None, timeout=DEFAULT_TIMEOUT, retryable=None, throttle=None, **kwargs):
+    '''
+    asyncio equivalent of pyze.api.transport.send. Returns the decoded JSON
+    body, raising aiohttp.ClientResponseError if the final response was an
+    error.
+    '''
+    policy = retry_policy if retry_policy is not None and is_retryable(method, retryable) else NO_RETRIES
+    client_timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+    attempt = 0
+
+    while True:
+        if throttle:
+            await throttle()
+        try:
+            async with session.request(method, url, timeout=client_timeout, **kwargs) as response:
+                delay = policy.delay_for(attempt, response.status, response.headers)
+                if response.status < 400 or delay is None:
+                    _log.debug('Received response: {}'.format(await response.text()))
+                    _log.debug('Response headers: {}'.format(response.headers))
+                    response.raise_for_status()
+                    # Neither API reliably sets a JSON content type
+                    return await response.json(content_type=None)
+                _log.debug('{} {} returned {}, retrying in {:.2f}s'.format(method, url, response.status, delay))
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            delay = policy.delay_for(attempt)
+            if delay is None:
+                raise
+            _log.debug('{} {} failed ({}), retrying in {:.2f}s'.format(method, url, e, delay))
+
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+class _AsyncSessionOwner(CachingAPIObject):
+    def __init__(self, session):
+        self._session = session
+        self._session_owner = None
+        self._owns_session = session is None
+
+    def _use_session_of(self, owner):
+        # Share `owner`'s connection pool, whichever of us needs it first
+        self._session_owner = owner
+        self._owns_session = False
+
+    def _get_session(self):
+        if self._session is None and self._session_owner is not None:
+            return self._session_owner._get_session()
+        # aiohttp sessions must be created inside a running event loop, so
+        # defer creating our own until the first request.
+        if self._session is None:
+            self._session = create_session()
+        return self._session
+
+    async def close(self):
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class AsyncGigya(_AsyncSessionOwner):
+    def __init__(
+        self,
+        api_key=None,
+        credentials=None,
+        root_url=DEFAULT_GIGYA_ROOT_URL,
+        session=None,
+        retry_policy=None,
+        timeout=DEFAULT_TIMEOUT,
+        rate_limiter=None,
+        jwt_refresh_window=DEFAULT_JWT_REFRESH_WINDOW
+    ):
+        super().__init__(session)
+        self._credentials = credentials or CredentialStore()
+        self._root_url = root_url
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._timeout = timeout
+        self._rate_limiter = rate_limiter if rate_limiter is not None else default_rate_limiter()
+        # Made on first use: before Python 3.10, a Lock is tied to the event
+        # loop current when it's made, which needn't be the one we run in
+        self._jwt_lock = None
+        self._jwt_refresh_window = jwt_refresh_window
+        self._refresh_task = None
+        if api_key:
+            self.set_api_key(api_key)
+
+    def set_api_key(self, api_key):
+        self._credentials.store('gigya-api-key', api_key, None)
+
+    async def close(self):
+        task, self._refresh_task = self._refresh_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await super().close()
+
+    async def _throttle(self):
+        if self._rate_limiter:
+            await self._rate_limiter.acquire_async(
+                RateLimiter.api_key_bucket(self._credentials['gigya-api-key'])
+            )
+
+    def _require_api_key(self):
+        if 'gigya-api-key' not in self._credentials:
+            raise RuntimeError('Gigya API key not specified. Call set_api_key or set GIGYA_API_KEY environment variable.')
+
+    async def _post(self, method, data, retryable=None):
+        response_body = await send(
+            self._get_session(),
+            'POST',
+            self._root_url + '/' + method,
+            self._retry_policy,
+            self._timeout,
+            retryable,
+            self._throttle,
+            data=data
+        )
+
+        _log.debug('Received Gigya {} response: {}'.format(method, response_body))
+        raise_gigya_errors(response_body)
+        return response_body
+
+    async def login(self, user, password):
+        self._require_api_key()
+
+        response_body = await self._post(
+            'accounts.login',
+            {
+                'ApiKey': self._credentials['gigya-api-key'],
+                'loginID': user,
+                'password': password
+            }
+        )
+
+        token = response_body.get('sessionInfo', {}).get('cookieValue')
+
+        if token:
+            # Any stored credentials may be based on an old gigya login
+            self._credentials.clear()
+            self._credentials['gigya'] = (token, None)
+            self._clear_all_caches()
+            return response_body
+        else:
+            raise RuntimeError(
+                'Unable to find Gigya token from login response! Response included keys {}'.format(
+                    ', '.join(response_body.keys())
+                )
+            )
+
+    @ttl_cached_async(ACCOUNT_INFO_TTL)
+    @requires_credentials('gigya')
+    async def account_info(self):
+        self._require_api_key()
+
+        response_body = await self._post(
+            'accounts.getAccountInfo',
+            {
+                'ApiKey': self._credentials['gigya-api-key'],
+                'login_token': self._credentials['gigya']
+            },
+            retryable=True
+        )
+
+        person_id = response_body.get('data', {}).get('personId')
+
+        if person_id:
+            self._credentials['gigya-person-id'] = (person_id, None)
+            return response_body
+
+        raise RuntimeError(
+            'Unable to find Gigya person ID from account info! Response contained keys {}'.format(
+                ', '.join(response_body.keys())
+            )
+        )
+
+    @requires_credentials('gigya')
+    async def get_jwt_token(self):
+        credential = self._credentials.credential('gigya-token')
+        if credential:
+            refreshing = self._refresh_task is not None and not self._refresh_task.done()
+            fetching = self._jwt_lock is not None and self._jwt_lock.locked()
+            if self._needs_refresh(credential) and not refreshing and not fetching:
+                # Kept so that it isn't collected before it finishes, and
+                # can be cancelled by close()
+                self._refresh_task = asyncio.ensure_future(self._refresh_jwt_token())
+            return credential.token
+
+        # Only one coroutine should fetch a new token; the rest wait for it.
+        async with self._get_jwt_lock():
+            if 'gigya-token' in self._credentials:
+                return self._credentials['gigya-token']
+            return await self._fetch_jwt_token()
+
+    def _needs_refresh(self, credential):
+        return credential.expiry and credential.expiry - time.time() < self._jwt_refresh_window
+
+    def _get_jwt_lock(self):
+        if self._jwt_lock is None:
+            self._jwt_lock = asyncio.Lock()
+        return self._jwt_lock
+
+    async def _refresh_jwt_token(self):
+        async with self._get_jwt_lock():
+            credential = self._credentials.credential('gigya-token')
+            if credential and not self._needs_refresh(credential):
+                return
+            try:
+                await self._fetch_jwt_token()
+            except asyncio.CancelledError:
+                # An Exception before Python 3.8
+                raise
+            except Exception as e:
+                _log.warning('Failed to refresh Gigya JWT: {}'.format(e))
+
+    async def _fetch_jwt_token(self):
+        self._require_api_key()
+
+        response_body = await self._post(
+            'accounts.getJWT',
+            {
+                'ApiKey': self._credentials['gigya-api-key'],
+                'login_token': self._credentials['gigya'],
+                'fields': 'data.personId,data.gigyaDataCenter',
+                'expiration': '900'
+            },
+            retryable=True
+        )
+
+        token = response_body.get('id_token')
+
+        if token:
+            decoded = jwt.decode(token, options={'verify_signature': False})
+            self._credentials['gigya-token'] = (token, decoded['exp'])
+            return token
+
+        raise RuntimeError('Unable to find Gigya JWT token in response: {}'.format(response_body))
+
+
+class AsyncKamereon(_AsyncSessionOwner):
+    def __init__(
+        self,
+        api_key=None,
+        credentials=None,
+        gigya=None,
+        country='GB',
+        root_url=DEFAULT_ROOT_URL,
+        session=None,
+        cache=None,
+        single_flight=None,
+        retry_policy=None,
+        timeout=DEFAULT_TIMEOUT,
+        rate_limiter=None
+    ):
+        super().__init__(session)
+        self._root_url = root_url
+        self._credentials = credentials or CredentialStore()
+        self._country = country
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._timeout = timeout
+        self._rate_limiter = rate_limiter if rate_limiter is not None else default_rate_limiter()
+        self._gigya = gigya or AsyncGigya(
+            credentials=self._credentials,
+            session=session,
+            retry_policy=self._retry_policy,
+            timeout=timeout,
+            rate_limiter=self._rate_limiter
+        )
+        if self._gigya._session is None:
+            # Share our connection pool with the Gigya client
+            self._gigya._use_session_of(self)
+        self._account_id = None
+        self._cache = cache
+        self._single_flight = single_flight or AsyncSingleFlight()
+        if isinstance(self._gigya, CachingAPIObject):
+            self._gigya.add_invalidation_hook(self._gigya_login_changed)
+        if api_key:
+            self.set_api_key(api_key)
+
+    def _gigya_login_changed(self):
+        # A new login may belong to a different account altogether
+        self._account_id = None
+        self._clear_all_caches()
+
+    async def close(self):
+        await self._gigya.close()
+        await super().close()
+
+    def set_api_key(self, api_key):
+        self._credentials.store('kamereon-api-key', api_key, None)
+
+    async def _headers(self, **extra):
+        headers = {
+            'apikey': self._credentials['kamereon-api-key'],
+            'x-gigya-id_token': await self._gigya.get_jwt_token(),
+        }
+        headers.update(extra)
+        return headers
+
+    def _url(self, path):
+        return '{}{}{}country={}'.format(
+            self._root_url,
+            path,
+            '&' if '?' in path else '?',
+            self._country
+        )
+
+    def _throttle(self, account_id=None):
+        if not self._rate_limiter:
+            return None
+
+        buckets = [RateLimiter.api_key_bucket(self._credentials['kamereon-api-key'])]
+        if account_id:
+            buckets.append(RateLimiter.account_bucket(account_id))
+        return lambda: self._rate_limiter.acquire_async(*buckets)
+
+    async def request(self, method, path, retryable=None, account_id=None, **kwargs):
+        headers = await self._headers(**kwargs.pop('headers', {}))
+        return await send(
+            self._get_session(),
+            method,
+            self._url(path),
+            self._retry_policy,
+            self._timeout,
+            retryable,
+            self._throttle(account_id),
+            headers=headers,
+            **kwargs
+        )
+
+    async def get_account_id(self):
+        if self._account_id:
+            return self._account_id
+
+        if 'KAMEREON_ACCOUNT_ID' in os.environ:
+            self.set_account_id(os.environ['KAMEREON_ACCOUNT_ID'])
+            return self._account_id
+        if 'kamereon-account' in self._credentials:
+            self._account_id = self._credentials['kamereon-account']
+            return self._account_id
+
+        accounts = await self.get_accounts()
+
+        if len(accounts) == 0:
+            raise AccountException('No Kamereon accounts found!')
+        if len(accounts) > 1:
+            Kamereon.print_multiple_account_warning(accounts)
+
+        self.set_account_id(accounts[0]['accountId'])
+        return self._account_id
+
+    @requires_credentials('gigya', 'gigya-person-id', 'kamereon-api-key')
+    async def get_accounts(self):
+        response_body = await self.request(
+            'GET',
+            '/commerce/v1/persons/{}'.format(self._credentials['gigya-person-id'])
+        )
+        return response_body.get('accounts', [])
+
+    def set_account_id(self, account_id):
+        if account_id != self._account_id:
+            self._clear_all_caches()
+        self._account_id = account_id
+        self._credentials['kamereon-account'] = (account_id, None)
+
+    @ttl_cached_async(VEHICLES_TTL)
+    @requires_credentials('kamereon-api-key')
+    async def get_vehicles(self):
+        account_id = await self.get_account_id()
+        return await self.request(
+            'GET',
+            '/commerce/v1/accounts/{}/vehicles'.format(account_id),
+            account_id=account_id
+        )
+
+
+class AsyncVehicle(object):
+    def __init__(self, vin, kamereon=None):
+        self._vin = vin
+        self._kamereon = kamereon or AsyncKamereon()
+
+    @requires_credentials('kamereon-api-key')
+    async def _request(self, method, account_id, endpoint, version=1, retryable=None, **kwargs):
+        return await self._kamereon.request(
+            method,
+            vehicle_url('', account_id, version, self._vin, endpoint),
+            retryable,
+            account_id,
+            headers={'Content-type': 'application/vnd.api+json'},
+            **kwargs
+        )
+
+    async def _get(self, endpoint, version=1):
+        account_id = await self._kamereon.get_account_id()
+        cache = self._kamereon._cache
+        if cache:
+            cached = cache.get(account_id, self._vin, endpoint, version)
+            if cached is not None:
+                return cached
+
+        return await self._kamereon._single_flight.do(
+            (account_id, self._vin, endpoint, version),
+            self._fetch,
+            account_id,
+            endpoint,
+            version
+        )
+
+    async def _fetch(self, account_id, endpoint, version):
+        json = await self._request('GET', account_id, endpoint, version)
+        attributes = json['data']['attributes']
+
+        if self._kamereon._cache:
+            self._kamereon._cache.put(account_id, self._vin, endpoint, version, attributes)
+        return attributes
+
+    async def _post(self, endpoint, data, version=1, retryable=False):
+        _log.debug('POSTing with data: {}'.format(data))
+        account_id = await self._kamereon.get_account_id()
+        json = await self._request('POST', account_id, endpoint, version, retryable, json={'data': data})
+
+        if self._kamereon._cache:
+            self._kamereon._cache.invalidate_action(account_id, self._vin, endpoint)
+        return json
+
+    async def battery_status(self):
+        return await self._get('battery-status', 2)
+
+    async def location(self):
+        return await self._get('location')
+
+    async def hvac_status(self):
+        return await self._get('hvac-status')
+
+    async def charge_mode(self):
+        return parse_charge_mode(await self._get('charge-mode'))
+
+    async def mileage(self):
+        return await self._get('cockpit', 2)
+
+    async def lock_status(self):
+        return await self._get('lock-status')
+
+    async def charge_schedules(self):
+        return ChargeSchedules(
+            await self._get('charging-settings')
+        )
+
+    async def notification_settings(self):
+        return await self._get('notification-settings')
+
+    async def charge_history(self, start, end):
+        _check_dates(start, end)
+        return await fetch_range_async(self._charge_history, start, end)
+
+    async def _charge_history(self, start, end):
+        return (await self._get(
+            history_endpoint('charges', start, end)
+        )).get('charges', [])
+
+    async def charge_statistics(self, start, end, period='month'):
+        _check_dates(start, end)
+        return await fetch_range_async(partial(self._charge_statistics, period=period), start, end)
+
+    async def _charge_statistics(self, start, end, period):
+        return (await self._get(
+            statistics_endpoint('charge-history', start, end, period)
+        ))['chargeSummaries']
+
+    async def hvac_history(self, start, end):
+        _check_dates(start, end)
+        return await fetch_range_async(self._hvac_history, start, end)
+
+    async def _hvac_history(self, start, end):
+        return (await self._get(
+            history_endpoint('hvac-sessions', start, end)
+        )).get('hvacSessions', [])
+
+    async def hvac_statistics(self, start, end, period='month'):
+        _check_dates(start, end)
+        return await fetch_range_async(partial(self._hvac_statistics, period=period), start, end)
+
+    async def _hvac_statistics(self, start, end, period):
+        return (await self._get(
+            statistics_endpoint('hvac-history', start, end, period)
+        ))['hvacSessionsSummaries']
+
+    async def snapshot(self, endpoints=SNAPSHOT_ENDPOINTS, timeout=DEFAULT_SNAPSHOT_TIMEOUT):
+        endpoints = list(endpoints)
+        if not endpoints:
+            return Snapshot({}, {})
+
+        await self._kamereon.get_account_id()
+        await self._kamereon._gigya.get_jwt_token()
+
+        tasks = {
+            asyncio.ensure_future(getattr(self, endpoint)()): endpoint for endpoint in endpoints
+        }
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+
+        results = {}
+        errors = {}
+        for task, endpoint in tasks.items():
+            if task in pending:
+                task.cancel()
+                errors[endpoint] = asyncio.TimeoutError(
+                    'Timed out waiting for {}'.format(endpoint)
+                )
+            elif task.exception() is not None:
+                errors[endpoint] = task.exception()
+            else:
+                results[endpoint] = task.result()
+        return Snapshot(results, errors)
+
+    # Actions
+
+    async def ac_start(self, when=None, temperature=21):
+        return await self._post(
+            'actions/hvac-start',
+            ac_start_body(when, temperature)
+        )
+
+    async def cancel_ac(self):
+        return await self._post(
+            'actions/hvac-start',
+            CANCEL_AC_BODY,
+            retryable=True
+        )
+
+    async def set_charge_schedules(self, schedules):
+        return await self._post(
+            'actions/charge-schedule',
+            charge_schedules_body(schedules),
+            version=2,
+            retryable=True
+        )
+
+    async def set_charge_mode(self, charge_mode):
+        return await self._post(
+            'actions/charge-mode',
+            charge_mode_body(charge_mode),
+            retryable=True
+        )
+
+    async def charge_start(self):
+        return await self._post(
+            'actions/charging-start',
+            CHARGE_START_BODY
+        )
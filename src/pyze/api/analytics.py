@@ -0,0 +1,220 @@
+'''
+Columnar analysis of charge history, for one vehicle or many.
+
+Needs NumPy: install PyZE with the `analytics` extra.
+'''
+from .states import OK_END_STATUSES
+
+import numpy as np
+
+
+PERIODS = ['day', 'week', 'month']
+# 1970-01-01, day 0 of datetime64, was a Thursday
+_EPOCH_WEEKDAY = 3
+
+
+def _dates(records, field):
+    # Dates come back in UTC ("2020-01-31T10:00:00Z"); missing ones become NaT
+    return np.array(
+        [str(r.get(field) or 'NaT')[:19] for r in records],
+        dtype='datetime64[s]'
+    )
+
+
+def _floats(records, field, scale=1):
+    return np.array(
+        [r.get(field) for r in records],
+        dtype=float
+    ) / scale
+
+
+def _period_starts(when, period):
+    if period not in PERIODS:
+        raise RuntimeError('`period` should be one of {}'.format(', '.join('`{}`'.format(p) for p in PERIODS)))
+    if period == 'month':
+        return when.astype('datetime64[M]').astype('datetime64[D]')
+    days = when.astype('datetime64[D]')
+    if period == 'week':
+        weekday = (days.astype(np.int64) + _EPOCH_WEEKDAY) % 7
+        return days - weekday.astype('timedelta64[D]')
+    return days
+
+
+class ChargeSessions(object):
+    '''
+    Charge sessions held as one NumPy array per field, so that aggregates
+    over many sessions (and many vehicles) are computed without looping in
+    Python.
+
+    Columns, one entry per session:
+     * vehicle: index into `vins` of the session's vehicle
+     * start, end: datetime64 (UTC), NaT if unknown
+     * duration: minutes
+     * start_level, level_recovered: battery level (%) at the start, and
+       how much was added
+     * power: instantaneous power (kW) at the start
+     * power_level: the server's description of the power (e.g. 'slow')
+     * end_status: why the session ended ('ok' if all went well)
+
+    Missing numbers are NaN.
+    '''
+
+    COLUMNS = [
+        'vehicle',
+        'start',
+        'end',
+        'duration',
+        'start_level',
+        'level_recovered',
+        'power',
+        'power_level',
+        'end_status'
+    ]
+
+    def __init__(self, vins, **columns):
+        self.vins = list(vins)
+        for column in self.COLUMNS:
+            setattr(self, column, columns[column])
+
+    @classmethod
+    def from_records(cls, records, vin=None):
+        '''
+        Loads records as returned by Vehicle.charge_history() (or
+        iter_charge_history(), or a HistoryStore).
+        '''
+        records = list(records)
+        start = _dates(records, 'chargeStartDate')
+        end = _dates(records, 'chargeEndDate')
+
+        duration = _floats(records, 'chargeDuration')
+        # Not always present, but we can usually work it out
+        missing = np.isnan(duration)
+        duration[missing] = (end[missing] - start[missing]) / np.timedelta64(1, 'm')
+
+        return cls(
+            [vin],
+            vehicle=np.zeros(len(records), dtype=np.intp),
+            start=start,
+            end=end,
+            duration=duration,
+            start_level=_floats(records, 'chargeStartBatteryLevel'),
+            level_recovered=_floats(records, 'chargeBatteryLevelRecovered'),
+            power=_floats(records, 'chargeStartInstantaneousPower', 1000),
+            power_level=np.array([r.get('chargePower') for r in records], dtype=object),
+            end_status=np.array([r.get('chargeEndStatus') for r in records], dtype=object)
+        )
+
+    @classmethod
+    def from_history_store(cls, vins, start, end, store=None):
+        '''
+        Loads the sessions for each of `vins` between `start` and `end` from
+        a HistoryStore (default the one at $PYZE_HISTORY_STORE).
+        '''
+        if store is None:
+            from .historystore import HistoryStore
+            store = HistoryStore()
+        return cls.concatenate(
+            [cls.from_records(store.charge_history(vin, start, end), vin) for vin in vins]
+        )
+
+    @classmethod
+    def concatenate(cls, sessions):
+        '''
+        Combines several ChargeSessions (e.g. one per vehicle) into one.
+        '''
+        sessions = list(sessions)
+        if not sessions:
+            # No vehicles, so no sessions, but columns of the usual types
+            empty = cls.from_records([])
+            return cls([], **{column: getattr(empty, column) for column in cls.COLUMNS})
+
+        vins = []
+        vehicles = []
+        for s in sessions:
+            vehicles.append(s.vehicle + len(vins))
+            vins.extend(s.vins)
+
+        columns = {
+            column: np.concatenate([getattr(s, column) for s in sessions])
+            for column in cls.COLUMNS if column != 'vehicle'
+        }
+        return cls(vins, vehicle=np.concatenate(vehicles), **columns)
+
+    def __len__(self):
+        return len(self.vehicle)
+
+    def select(self, mask):
+        '''
+        Returns the sessions for which `mask` (a boolean array, or array of
+        indices) is set, e.g. `sessions.select(sessions.errors())`.
+        '''
+        return ChargeSessions(
+            self.vins,
+            **{column: getattr(self, column)[mask] for column in self.COLUMNS}
+        )
+
+    def energy_added(self, battery_capacity):
+        '''
+        Energy (kWh) added by each session to a battery of
+        `battery_capacity` kWh (a number, or an array with one entry per
+        vehicle in `vins`).
+        '''
+        capacity = np.asarray(battery_capacity, dtype=float)
+        if capacity.ndim:
+            capacity = capacity[self.vehicle]
+        return self.level_recovered * capacity / 100
+
+    def average_power(self, battery_capacity):
+        '''
+        Average power (kW) over each session; NaN where the duration is
+        unknown or zero.
+        '''
+        hours = self.duration / 60
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(hours > 0, self.energy_added(battery_capacity) / hours, np.nan)
+
+    def errors(self, ok_statuses=OK_END_STATUSES):
+        '''
+        Whether each session ended with an error. Sessions that haven't
+        ended yet don't count.
+        '''
+        ended = np.not_equal(self.end_status, None)
+        return ended & ~np.isin(self.end_status, list(ok_statuses))
+
+    def hour_histogram(self, utc_offset=0):
+        '''
+        Number of sessions started in each hour of the day (an array of 24
+        counts), optionally shifted from UTC by `utc_offset` hours.
+        '''
+        start = self.start[~np.isnat(self.start)]
+        hours = (start.astype('datetime64[h]').astype(np.int64) + utc_offset) % 24
+        return np.bincount(hours, minlength=24)
+
+    def per_period(self, values, period='month'):
+        '''
+        Sums `values` (one per session) over each day, week (starting
+        Monday) or month in which sessions started. Returns arrays of the
+        periods' first days (datetime64) and of the sums; NaN values are
+        skipped.
+        '''
+        known = ~np.isnat(self.start)
+        periods, index = np.unique(_period_starts(self.start[known], period), return_inverse=True)
+        values = np.nan_to_num(np.asarray(values, dtype=float)[known])
+        return periods, np.bincount(index, weights=values, minlength=len(periods))
+
+    def per_vehicle(self, values):
+        '''
+        Sums `values` (one per session) for each vehicle in `vins`; NaN
+        values are skipped.
+        '''
+        values = np.nan_to_num(np.asarray(values, dtype=float))
+        return np.bincount(self.vehicle, weights=values, minlength=len(self.vins))
+
+    def error_rate(self, period='month', ok_statuses=OK_END_STATUSES):
+        '''
+        The fraction of sessions started in each period that ended with an
+        error. Returns arrays of the periods' first days and of the rates.
+        '''
+        periods, errors = self.per_period(self.errors(ok_statuses), period)
+        _, counts = self.per_period(np.ones(len(self)), period)
+        return periods, errors / counts
@@ -0,0 +1,292 @@
+from collections import OrderedDict
+from datetime import datetime
+
+import functools
+import simplejson
+import sqlite3
+import threading
+import time
+import weakref
+
+
+# Seconds for which a response from each endpoint may be reused. Live vehicle
+# state changes quickly; settings and history rarely do.
+DEFAULT_TTLS = {
+    'battery-status': 10,
+    'hvac-status': 10,
+    'lock-status': 10,
+    'location': 60,
+    'charge-mode': 300,
+    'cockpit': 300,
+    'charging-settings': 300,
+    'notification-settings': 300,
+    'charges': 300,
+    'charge-history': 300,
+    'hvac-sessions': 300,
+    'hvac-history': 300
+}
+DEFAULT_TTL = 10
+
+# Endpoints whose responses only describe the date range they were asked for.
+# Once that range is entirely in the past the response can't change.
+HISTORY_ENDPOINTS = [
+    'charges',
+    'charge-history',
+    'hvac-sessions',
+    'hvac-history'
+]
+
+# Cached endpoints whose state is changed by each action.
+ACTION_INVALIDATES = {
+    'actions/hvac-start': ['hvac-status'],
+    'actions/charge-schedule': ['charging-settings'],
+    'actions/charge-mode': ['charge-mode'],
+    'actions/charging-start': ['battery-status']
+}
+
+_END_DATE_FORMATS = {
+    6: '%Y%m',
+    8: '%Y%m%d'
+}
+
+
+def _split_endpoint(endpoint):
+    base, _, query = endpoint.partition('?')
+    return base, query
+
+
+def _is_closed_range(query):
+    params = dict(p.partition('=')[::2] for p in query.split('&'))
+    end = params.get('end', '')
+    if len(end) not in _END_DATE_FORMATS:
+        return False
+    return end < datetime.utcnow().strftime(_END_DATE_FORMATS[len(end)])
+
+
+class ResponseCache(object):
+    '''
+    Caches Kamereon vehicle responses for a time depending on the endpoint,
+    in a pluggable backend (by default an in-memory LRU).
+
+    A TTL of None means the response never expires.
+    '''
+
+    def __init__(self, backend=None, ttls=DEFAULT_TTLS, default_ttl=DEFAULT_TTL):
+        self._backend = backend if backend is not None else MemoryCacheBackend()
+        self._ttls = ttls
+        self._default_ttl = default_ttl
+
+    def ttl_for(self, endpoint):
+        base, query = _split_endpoint(endpoint)
+        if base in HISTORY_ENDPOINTS and _is_closed_range(query):
+            return None
+        return self._ttls.get(base, self._default_ttl)
+
+    @staticmethod
+    def _key(account_id, vin, endpoint, version):
+        base, query = _split_endpoint(endpoint)
+        return '{}/{}/{}/v{}?{}'.format(account_id, vin, base, version, query)
+
+    def get(self, account_id, vin, endpoint, version):
+        value = self._backend.get(self._key(account_id, vin, endpoint, version), time.time())
+        if value is not None:
+            return simplejson.loads(value)
+
+    def put(self, account_id, vin, endpoint, version, response):
+        ttl = self.ttl_for(endpoint)
+        if ttl == 0:
+            return
+        self._backend.put(
+            self._key(account_id, vin, endpoint, version),
+            simplejson.dumps(response),
+            None if ttl is None else time.time() + ttl
+        )
+
+    def invalidate(self, account_id, vin, endpoint):
+        self._backend.delete_prefix('{}/{}/{}/'.format(account_id, vin, endpoint))
+
+    def invalidate_action(self, account_id, vin, action):
+        for endpoint in ACTION_INVALIDATES.get(action, []):
+            self.invalidate(account_id, vin, endpoint)
+
+    def clear(self):
+        self._backend.clear()
+
+
+class MemoryCacheBackend(object):
+    def __init__(self, maxsize=1024):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, expires):
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend(object):
+    '''
+    Stores cached responses in an SQLite database, so that they can be
+    shared between processes and survive restarts.
+    '''
+
+    def __init__(self, path, maxsize=100000):
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL, accessed REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires)')
+
+    def get(self, key, now):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value FROM responses WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            return row[0]
+
+    def put(self, key, value, expires):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                (key, value, expires, now)
+            )
+            self._conn.execute('DELETE FROM responses WHERE expires <= ?', (now,))
+            self._conn.execute(
+                'DELETE FROM responses WHERE key IN ('
+                'SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                (self._maxsize,)
+            )
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            self._conn.execute(
+                'DELETE FROM responses WHERE key >= ? AND key < ?',
+                (prefix, prefix + '\uffff')
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+
+def _cached_result(results, key):
+    cached = results.get(key)
+    if cached and cached[1] > time.time():
+        return cached
+    return None
+
+
+def ttl_cached(ttl):
+    '''
+    Caches the result of a method taking no arguments on the instance (a
+    CachingAPIObject) for `ttl` seconds, or until it clears its caches.
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def inner(self):
+            results = self._cached_results
+            # Keyed by the function itself, as names may be shared by
+            # decorated methods
+            cached = _cached_result(results, func)
+            if cached:
+                return cached[0]
+            result = func(self)
+            # Don't keep the result if the caches were cleared meanwhile
+            if results is self._cached_results:
+                results[func] = (result, time.time() + ttl)
+            return result
+
+        return inner
+    return decorator
+
+
+def ttl_cached_async(ttl):
+    '''
+    As ttl_cached, for a coroutine method.
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        async def inner(self):
+            results = self._cached_results
+            cached = _cached_result(results, func)
+            if cached:
+                return cached[0]
+            result = await func(self)
+            if results is self._cached_results:
+                results[func] = (result, time.time() + ttl)
+            return result
+
+        return inner
+    return decorator
+
+
+class CachingAPIObject(object):
+    '''
+    Base for API clients with ttl_cached methods. Each instance has its own
+    cache, so cached results go away with the instance.
+    '''
+
+    @property
+    def _cached_results(self):
+        return self.__dict__.setdefault('_cached_result_store', {})
+
+    @property
+    def _invalidation_hooks(self):
+        return self.__dict__.setdefault('_invalidation_hook_list', [])
+
+    def add_invalidation_hook(self, method):
+        '''
+        Calls the bound `method` whenever this object clears its caches. Only
+        a weak reference is kept, so the hook doesn't keep its owner alive.
+        '''
+        self._invalidation_hooks.append(weakref.WeakMethod(method))
+
+    def _clear_all_caches(self):
+        self.__dict__['_cached_result_store'] = {}
+        for ref in list(self._invalidation_hooks):
+            hook = ref()
+            if hook is None:
+                self._invalidation_hooks.remove(ref)
+            else:
+                hook()
@@ -1,8 +1,20 @@
 from collections import namedtuple
 
+import atexit
+import contextlib
+import functools
 import os
 import simplejson
+import sqlite3
+import tempfile
+import threading
 import time
+import weakref
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; writes are still atomic but unlocked
+    fcntl = None
 
 
 PERMANENT_KEYS = [
@@ -10,6 +22,10 @@ PERMANENT_KEYS = [
     'kamereon-api-key'
 ]
 
+DEFAULT_PROFILE = 'default'
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+NEVER = float('inf')
+
 
 class MissingCredentialException(Exception):
     pass
@@ -17,15 +33,16 @@ class MissingCredentialException(Exception):
 
 def requires_credentials(*names):
     def _requires_credentials(func):
+        @functools.wraps(func)
         def inner(*args, **kwargs):
             credentials = None
             if args[0] and hasattr(args[0], '_credentials'):
                 credentials = args[0]._credentials
             elif args[0] and hasattr(args[0], '_kamereon'):
                 credentials = args[0]._kamereon._credentials
-            for name in names:
-                if name not in credentials:
-                    raise MissingCredentialException(name)
+            missing = credentials.missing(names)
+            if missing:
+                raise MissingCredentialException(missing)
             return func(*args, **kwargs)
 
         return inner
@@ -38,21 +55,83 @@ class CredentialStore(object):
     def __new__(cls):
         if CredentialStore.__instance is None:
             default_store_location = os.environ.get('PYZE_TOKEN_STORE', os.path.expanduser('~/.credentials/pyze.json'))
-            CredentialStore.__instance = FileCredentialStore(default_store_location)
+            if default_store_location.endswith(SQLITE_EXTENSIONS):
+                CredentialStore.__instance = SQLiteCredentialStore(
+                    default_store_location,
+                    os.environ.get('PYZE_PROFILE', DEFAULT_PROFILE)
+                )
+            else:
+                CredentialStore.__instance = FileCredentialStore(default_store_location)
         return CredentialStore.__instance
 
 
 class BasicCredentialStore(object):
     def __init__(self):
+        self._lock = threading.RLock()
         self._store = {}
+        self._dirty = set()
+        self._deleted = set()
+        self._reindex()
         self._add_api_keys_from_env()
 
+    def _refresh(self, now):
+        pass
+
+    def _reindex(self):
+        # The earliest time at which any stored credential expires. Until
+        # then everything in _store is valid, so checking that is a single
+        # comparison however many credentials we hold.
+        self._next_expiry = min(
+            (cred.expiry for cred in list(self._store.values()) if cred.expiry),
+            default=NEVER
+        )
+
+    def _check_expiry(self):
+        now = time.time()
+        self._refresh(now)
+        if now >= self._next_expiry:
+            # Evict everything that's expired in one pass. Only our in-memory
+            # copy is affected; expired entries are harmless wherever else
+            # they're stored.
+            for name, cred in list(self._store.items()):
+                if cred.expiry and cred.expiry <= now:
+                    self._store.pop(name, None)
+            self._reindex()
+
+    def get(self, name, default=None):
+        '''
+        Returns the token stored under `name`, or `default` if there isn't
+        one or it has expired.
+        '''
+        self._check_expiry()
+        cred = self._store.get(name)
+        return cred.token if cred else default
+
     def __getitem__(self, name):
-        if name in self._store:
-            cred = self._store[name]
-            if not cred.expiry or cred.expiry > time.time():
-                return cred.token
-        raise KeyError(name)
+        self._check_expiry()
+        cred = self._store.get(name)
+        if cred is None:
+            raise KeyError(name)
+        return cred.token
+
+    def credential(self, name):
+        '''
+        Returns the Credential (token and expiry) stored under `name`, or
+        None if there isn't one or it has expired.
+        '''
+        self._check_expiry()
+        return self._store.get(name)
+
+    def missing(self, names):
+        '''
+        Returns the first of `names` with no valid credential, or None if
+        we have them all.
+        '''
+        self._check_expiry()
+        for name in names:
+            if name not in self._store:
+                return name
+        return None
 
     def __setitem__(self, name, value):
         return self.store(name, *value)
@@ -62,23 +141,35 @@ class BasicCredentialStore(object):
             raise RuntimeError('Credential name must be a string')
         if not isinstance(token, str):
             raise RuntimeError('Credential value must be a string')
-        self._store[name] = Credential(token, expiry)
-        self._write()
+        credential = Credential(token, expiry)
+        # Atomic with respect to writes and reloads, which replace _store
+        # and clear _dirty
+        with self._lock:
+            if self._store.get(name) == credential and name not in self._deleted:
+                return
+            self._store[name] = credential
+            if expiry and expiry < self._next_expiry:
+                self._next_expiry = expiry
+            self._dirty.add(name)
+            self._deleted.discard(name)
+            self._write()
 
     def _write(self):
-        pass
+        self._dirty.clear()
+        self._deleted.clear()
 
     def __contains__(self, name):
-        try:
-            return self[name] is not None
-        except KeyError:
-            return False
+        self._check_expiry()
+        return name in self._store
 
     def clear(self):
-        for k in list(self._store.keys()):
-            if k not in PERMANENT_KEYS:
-                del self._store[k]
-        self._write()
+        with self._lock:
+            for k in list(self._store.keys()):
+                if k not in PERMANENT_KEYS:
+                    del self._store[k]
+                    self._dirty.discard(k)
+                    self._deleted.add(k)
+            self._write()
 
     def _add_api_keys_from_env(self):
         if 'GIGYA_API_KEY' in os.environ:
@@ -88,31 +179,313 @@ class BasicCredentialStore(object):
             self.store('kamereon-api-key', os.environ['KAMEREON_API_KEY'], None)
 
     def requires(self, *names):
-        for name in names:
-            if name not in self._store:
-                raise MissingCredentialException(name)
+        missing = self.missing(names)
+        if missing:
+            raise MissingCredentialException(missing)
 
 
 class FileCredentialStore(BasicCredentialStore):
-    def __init__(self, store_location):
+    '''
+    Persists credentials to a JSON file that may be shared by several
+    processes.
+
+    Changes are written `write_delay` seconds after they're made, so that a
+    burst of changes (such as logging in) results in a single write, and
+    any still pending are written when the interpreter exits. Call flush()
+    to write them immediately; a write_delay of 0 writes on every change.
+
+    Writes take an exclusive lock, merge our changes into whatever is
+    currently on disk and atomically replace the file, so concurrent writers
+    don't lose each other's changes or leave a half-written file. Changes
+    made by other processes are picked up on lookup, checking the file at
+    most every `reload_interval` seconds.
+    '''
+
+    def __init__(self, store_location, reload_interval=1, write_delay=0.5):
         self._store_location = store_location
-        self._store = {}
+        self._reload_interval = reload_interval
+        self._write_delay = write_delay
+        self._write_timer = None
+        self._lock = threading.RLock()
+        self._dirty = set()
+        self._deleted = set()
+        self._store, self._signature = self._read()
+        self._reindex()
+        self._last_checked = time.time()
+        self._add_api_keys_from_env()
+
+    def _file_signature(self):
         try:
-            with open(self._store_location, 'r') as token_store:
-                stored = simplejson.load(token_store)
+            stat = os.stat(self._store_location)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
 
-                for key, value in stored.items():
-                    self._store[key] = Credential(value['token'], value['expiry'])
+    def _read(self):
+        signature = self._file_signature()
+        stored = {}
+        try:
+            with open(self._store_location, 'r') as token_store:
+                for key, value in simplejson.load(token_store).items():
+                    stored[key] = Credential(value['token'], value['expiry'])
         except Exception:
             pass
-        self._add_api_keys_from_env()
+        return stored, signature
+
+    def _merge(self, on_disk):
+        # Our unsaved changes take precedence over what's on disk
+        for name in self._deleted:
+            on_disk.pop(name, None)
+        for name in self._dirty:
+            if name in self._store:
+                on_disk[name] = self._store[name]
+        return on_disk
+
+    def _refresh(self, now):
+        if now - self._last_checked < self._reload_interval:
+            return
+        self._last_checked = now
+
+        if self._file_signature() != self._signature:
+            with self._lock:
+                on_disk, self._signature = self._read()
+                self._store = self._merge(on_disk)
+                self._reindex()
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        with open(self._store_location + '.lock', 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
 
     def _write(self):
+        if not self._write_delay:
+            self.flush()
+            return
+
+        with self._lock:
+            _unflushed.add(self)
+            if self._write_timer is None:
+                self._write_timer = threading.Timer(self._write_delay, self.flush)
+                self._write_timer.daemon = True
+                self._write_timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._write_timer is not None:
+                self._write_timer.cancel()
+                self._write_timer = None
+            _unflushed.discard(self)
+            if self._dirty or self._deleted:
+                self._write_file()
+
+    def _write_file(self):
         dirname = os.path.dirname(self._store_location)
-        if not os.path.isdir(dirname):
+        if dirname and not os.path.isdir(dirname):
             os.makedirs(dirname)
-        with open(self._store_location, 'w') as token_store:
-            simplejson.dump(self._store, token_store)
+
+        with self._lock, self._file_lock():
+            on_disk, _ = self._read()
+            merged = self._merge(on_disk)
+
+            fd, temp_path = tempfile.mkstemp(dir=dirname or '.', prefix='.pyze-', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as token_store:
+                    simplejson.dump(merged, token_store)
+                    token_store.flush()
+                    os.fsync(token_store.fileno())
+                os.replace(temp_path, self._store_location)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+
+            self._store = merged
+            self._reindex()
+            self._signature = self._file_signature()
+            self._dirty.clear()
+            self._deleted.clear()
+
+
+class SQLiteCredentialDatabase(object):
+    '''
+    An SQLite database of credentials for any number of profiles (e.g. one
+    per My Renault login), which may be shared between threads and
+    processes. Use store() to get the SQLiteCredentialStore for a profile.
+    '''
+
+    def __init__(self, path):
+        dirname = os.path.dirname(path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS credentials ('
+            'profile TEXT NOT NULL, name TEXT NOT NULL, token TEXT NOT NULL, expiry REAL, '
+            'PRIMARY KEY (profile, name))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS credentials_expiry ON credentials (expiry)')
+        # Bumped with every change to a profile's credentials, so that its
+        # stores needn't reload when other profiles change
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS profiles (profile TEXT PRIMARY KEY, version INTEGER NOT NULL)'
+        )
+
+    def store(self, profile=DEFAULT_PROFILE, **kwargs):
+        return SQLiteCredentialStore(self, profile, **kwargs)
+
+    def profiles(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute('SELECT DISTINCT profile FROM credentials ORDER BY profile')]
+
+    def version(self, profile):
+        with self._lock:
+            row = self._conn.execute('SELECT version FROM profiles WHERE profile = ?', (profile,)).fetchone()
+            return row[0] if row else 0
+
+    def _bump_versions(self, profiles):
+        # Called within a write transaction
+        self._conn.executemany('INSERT OR IGNORE INTO profiles (profile, version) VALUES (?, 0)', [(p,) for p in profiles])
+        self._conn.executemany('UPDATE profiles SET version = version + 1 WHERE profile = ?', [(p,) for p in profiles])
+
+    def load(self, profile):
+        with self._lock:
+            return {
+                name: Credential(token, expiry) for name, token, expiry in self._conn.execute(
+                    'SELECT name, token, expiry FROM credentials WHERE profile = ?',
+                    (profile,)
+                )
+            }
+
+    def write(self, profile, changed, deleted):
+        '''
+        Writes changes to `profile`'s credentials, returning its new version.
+        '''
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO credentials (profile, name, token, expiry) VALUES (?, ?, ?, ?)',
+                    [(profile, name, cred.token, cred.expiry) for name, cred in changed.items()]
+                )
+                self._conn.executemany(
+                    'DELETE FROM credentials WHERE profile = ? AND name = ?',
+                    [(profile, name) for name in deleted]
+                )
+                self._bump_versions([profile])
+                version = self.version(profile)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return version
+
+    def purge_expired(self, now=None):
+        '''
+        Deletes every expired credential, for all profiles. Returns the
+        number deleted.
+        '''
+        now = now or time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._bump_versions([
+                    row[0] for row in self._conn.execute(
+                        'SELECT DISTINCT profile FROM credentials WHERE expiry IS NOT NULL AND expiry <= ?',
+                        (now,)
+                    )
+                ])
+                deleted = self._conn.execute(
+                    'DELETE FROM credentials WHERE expiry IS NOT NULL AND expiry <= ?',
+                    (now,)
+                ).rowcount
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return deleted
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def _database(path):
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = SQLiteCredentialDatabase(path)
+        return _databases[path]
+
+
+class SQLiteCredentialStore(BasicCredentialStore):
+    '''
+    The credentials for one profile in an SQLiteCredentialDatabase (or the
+    path to one). Lookups are served from memory; changes are written
+    through to the database, and changes made through other connections are
+    picked up on lookup, checking at most every `reload_interval` seconds.
+    '''
+
+    def __init__(self, database, profile=DEFAULT_PROFILE, reload_interval=1):
+        if not isinstance(database, SQLiteCredentialDatabase):
+            database = _database(database)
+        self._database = database
+        self._profile = profile
+        self._reload_interval = reload_interval
+        self._lock = threading.RLock()
+        self._dirty = set()
+        self._deleted = set()
+        # Read before loading: a change in between just means a spare reload
+        self._version = database.version(profile)
+        self._store = database.load(profile)
+        self._reindex()
+        self._last_checked = time.time()
+        self._add_api_keys_from_env()
+
+    @property
+    def profile(self):
+        return self._profile
+
+    def _refresh(self, now):
+        if now - self._last_checked < self._reload_interval:
+            return
+        self._last_checked = now
+
+        with self._lock:
+            version = self._database.version(self._profile)
+            if version != self._version:
+                self._version = version
+                self._store = self._database.load(self._profile)
+                self._reindex()
+
+    def _write(self):
+        with self._lock:
+            version = self._database.write(
+                self._profile,
+                {name: self._store[name] for name in self._dirty if name in self._store},
+                self._deleted
+            )
+            self._dirty.clear()
+            self._deleted.clear()
+            # Our own change needn't trigger a reload, but one made by
+            # someone else since we last loaded still should
+            if version == self._version + 1:
+                self._version = version
+
+
+# Stores with changes not yet written to disk
+_unflushed = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_all():
+    for store in list(_unflushed):
+        store.flush()
 
 
 Credential = namedtuple(
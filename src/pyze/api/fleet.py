@@ -0,0 +1,145 @@
+from .kamereon import Kamereon, Vehicle, SNAPSHOT_ENDPOINTS
+from .scheduler import Priority, request_priority
+from collections import Counter, OrderedDict, deque, namedtuple
+
+import concurrent.futures
+import logging
+
+
+DEFAULT_CONCURRENCY = 64
+DEFAULT_PER_ACCOUNT_CONCURRENCY = 16
+_log = logging.getLogger('pyze.api.fleet')
+
+
+FleetResult = namedtuple(
+    'FleetResult',
+    [
+        'vin',
+        'endpoint',
+        'result',
+        'error'
+    ]
+)
+
+
+class FleetPoller(object):
+    '''
+    Fetches a set of endpoints for many vehicles at once, yielding each
+    FleetResult as soon as it arrives.
+
+    At most `concurrency` requests are in flight at any time, and at most
+    `per_account_concurrency` of those for any one Kamereon account. Vehicles
+    belonging to the same account should share a Kamereon instance.
+
+    Requests are made at Priority.BACKGROUND, so they give way to other
+    requests made through the same Kamereon. They also pass through that
+    Kamereon's RequestScheduler, which admits at most its own
+    max_concurrency (16 by default) at once: to poll an account with more
+    than that in flight, give its Kamereon a larger scheduler.
+    '''
+
+    def __init__(
+        self,
+        vehicles,
+        endpoints=SNAPSHOT_ENDPOINTS,
+        concurrency=DEFAULT_CONCURRENCY,
+        per_account_concurrency=DEFAULT_PER_ACCOUNT_CONCURRENCY
+    ):
+        if concurrency < 1 or per_account_concurrency < 1:
+            raise ValueError('concurrency and per_account_concurrency must be at least 1')
+        self._vehicles = list(vehicles)
+        self._endpoints = list(endpoints)
+        self._concurrency = concurrency
+        self._per_account_concurrency = per_account_concurrency
+
+    @classmethod
+    def for_account(cls, kamereon=None, vins=None, **kwargs):
+        kamereon = kamereon or Kamereon()
+        if vins is None:
+            vins = [v['vin'] for v in kamereon.get_vehicles().get('vehicleLinks', [])]
+        return cls([Vehicle(vin, kamereon) for vin in vins], **kwargs)
+
+    def poll(self):
+        queues = OrderedDict()
+        for vehicle in self._vehicles:
+            for endpoint in self._endpoints:
+                queues.setdefault(vehicle._kamereon, deque()).append((vehicle, endpoint))
+
+        in_flight = {}
+        load = Counter()
+        primed = set()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            try:
+                while queues or in_flight:
+                    self._dispatch(executor, queues, in_flight, load, primed)
+
+                    done, _ = concurrent.futures.wait(
+                        in_flight,
+                        return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+
+                    for future in done:
+                        kamereon, vehicle, endpoint = in_flight.pop(future)
+                        load[kamereon] -= 1
+                        error = future.exception()
+
+                        if vehicle is None:
+                            if error:
+                                _log.debug('Failed to prepare account: {}'.format(error))
+                                for queued_vehicle, queued_endpoint in queues.pop(kamereon, []):
+                                    yield FleetResult(queued_vehicle._vin, queued_endpoint, None, error)
+                            else:
+                                primed.add(kamereon)
+                        else:
+                            yield FleetResult(
+                                vehicle._vin,
+                                endpoint,
+                                None if error else future.result(),
+                                error
+                            )
+            finally:
+                # Stop queued work if the caller stops consuming results early
+                for future in in_flight:
+                    future.cancel()
+
+    def _dispatch(self, executor, queues, in_flight, load, primed):
+        # Hand out one request per account per pass, so that one large
+        # account can't starve the others.
+        progress = True
+        while progress and len(in_flight) < self._concurrency:
+            progress = False
+            for kamereon in list(queues.keys()):
+                if len(in_flight) >= self._concurrency:
+                    break
+                if load[kamereon] >= self._per_account_concurrency:
+                    continue
+
+                if kamereon not in primed:
+                    if load[kamereon] == 0:
+                        # Resolve the account ID and JWT once before
+                        # fanning out requests that all need them.
+                        future = executor.submit(_prime, kamereon)
+                        in_flight[future] = (kamereon, None, None)
+                        load[kamereon] += 1
+                    continue
+
+                vehicle, endpoint = queues[kamereon].popleft()
+                if not queues[kamereon]:
+                    del queues[kamereon]
+
+                future = executor.submit(_fetch, vehicle, endpoint)
+                in_flight[future] = (kamereon, vehicle, endpoint)
+                load[kamereon] += 1
+                progress = True
+
+
+def _prime(kamereon):
+    with request_priority(Priority.BACKGROUND):
+        kamereon.get_account_id()
+        kamereon._gigya.get_jwt_token()
+
+
+def _fetch(vehicle, endpoint):
+    with request_priority(Priority.BACKGROUND):
+        return getattr(vehicle, endpoint)()
@@ -1,38 +1,66 @@
+from .cache import CachingAPIObject, ttl_cached
 from .credentials import requires_credentials, CredentialStore
-from functools import lru_cache
+from .ratelimit import RateLimiter, default_rate_limiter
+from .transport import DEFAULT_TIMEOUT, RetryPolicy, send, throttled
 
 import jwt
 import logging
-import os
 import requests
+import threading
+import time
 
 
 DEFAULT_ROOT_URL = 'https://accounts.eu1.gigya.com'
+# Fetch a new JWT in the background once the current one is this close (in
+# seconds) to expiring, so requests never have to wait for one.
+DEFAULT_JWT_REFRESH_WINDOW = 120
+ACCOUNT_INFO_TTL = 3600
 _log = logging.getLogger('pyze.api.gigya')
 
 
-class Gigya(object):
+class Gigya(CachingAPIObject):
     def __init__(
         self,
         api_key=None,
         credentials=None,
         root_url=DEFAULT_ROOT_URL,
+        retry_policy=None,
+        timeout=DEFAULT_TIMEOUT,
+        rate_limiter=None,
+        jwt_refresh_window=DEFAULT_JWT_REFRESH_WINDOW,
+        session=None
     ):
         self._credentials = credentials or CredentialStore()
-        self._session = requests.Session()
+        self._session = session or requests.Session()
         self._root_url = root_url
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._timeout = timeout
+        self._rate_limiter = rate_limiter if rate_limiter is not None else default_rate_limiter()
+        self._jwt_refresh_window = jwt_refresh_window
+        self._jwt_lock = threading.Lock()
         if api_key:
             self.set_api_key(api_key)
 
     def set_api_key(self, api_key):
         self._credentials.store('gigya-api-key', api_key, None)
 
+    def _admit(self):
+        if not self._rate_limiter:
+            return None
+        bucket = RateLimiter.api_key_bucket(self._credentials['gigya-api-key'])
+        return lambda: throttled(lambda: self._rate_limiter.acquire(bucket))
+
     def login(self, user, password):
         if 'gigya-api-key' not in self._credentials:
             raise RuntimeError('Gigya API key not specified. Call set_api_key or set GIGYA_API_KEY environment variable.')
 
-        response = self._session.post(
+        response = send(
+            self._session,
+            'POST',
             self._root_url + '/accounts.login',
+            self._retry_policy,
+            self._timeout,
+            admit=self._admit(),
             data={
                 'ApiKey': self._credentials['gigya-api-key'],
                 'loginID': user,
@@ -52,7 +80,7 @@ class Gigya(object):
             # Any stored credentials may be based on an old gigya login
             self._credentials.clear()
             self._credentials['gigya'] = (token, None)
-            self.account_info.cache_clear()
+            self._clear_all_caches()
             return response_body
         else:
             raise RuntimeError(
@@ -61,15 +89,22 @@ class Gigya(object):
                 )
             )
 
-    @lru_cache(maxsize=1)
+    @ttl_cached(ACCOUNT_INFO_TTL)
     @requires_credentials('gigya')
     def account_info(self):
         if 'gigya-api-key' not in self._credentials:
             raise RuntimeError('Gigya API key not specified. Call set_api_key or set GIGYA_API_KEY environment variable.')
 
-        response = self._session.post(
+        # Read-only, so safe to retry despite being a POST
+        response = send(
+            self._session,
+            'POST',
             self._root_url + '/accounts.getAccountInfo',
-            {
+            self._retry_policy,
+            self._timeout,
+            retryable=True,
+            admit=self._admit(),
+            data={
                 'ApiKey': self._credentials['gigya-api-key'],
                 'login_token': self._credentials['gigya']
             }
@@ -94,16 +129,46 @@ class Gigya(object):
 
     @requires_credentials('gigya')
     def get_jwt_token(self):
-
-        if 'gigya-token' in self._credentials:
-            return self._credentials['gigya-token']
-
+        credential = self._credentials.credential('gigya-token')
+        if credential:
+            if credential.expiry and credential.expiry - time.time() < self._jwt_refresh_window:
+                self._refresh_jwt_token_in_background()
+            return credential.token
+
+        # Only one thread fetches a new token; any others wait and use it.
+        with self._jwt_lock:
+            if 'gigya-token' in self._credentials:
+                return self._credentials['gigya-token']
+            return self._fetch_jwt_token()
+
+    def _refresh_jwt_token_in_background(self):
+        # If the lock is held, a refresh is already under way.
+        if not self._jwt_lock.acquire(blocking=False):
+            return
+
+        def refresh():
+            try:
+                self._fetch_jwt_token()
+            except Exception as e:
+                _log.warning('Failed to refresh Gigya JWT: {}'.format(e))
+            finally:
+                self._jwt_lock.release()
+
+        threading.Thread(target=refresh, name='pyze-jwt-refresh', daemon=True).start()
+
+    def _fetch_jwt_token(self):
         if 'gigya-api-key' not in self._credentials:
             raise RuntimeError('Gigya API key not specified. Call set_api_key or set GIGYA_API_KEY environment variable.')
 
-        response = self._session.post(
+        response = send(
+            self._session,
+            'POST',
             self._root_url + '/accounts.getJWT',
-            {
+            self._retry_policy,
+            self._timeout,
+            retryable=True,
+            admit=self._admit(),
+            data={
                 'ApiKey': self._credentials['gigya-api-key'],
                 'login_token': self._credentials['gigya'],
                 'fields': 'data.personId,data.gigyaDataCenter',
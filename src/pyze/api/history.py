@@ -0,0 +1,136 @@
+from collections import OrderedDict, deque
+
+import concurrent.futures
+import contextvars
+import datetime
+import itertools
+import simplejson
+
+
+# Long date ranges are fetched a window at a time, so that no one response is
+# huge (or slow enough to time out).
+WINDOWS = ['month', 'week']
+DEFAULT_WINDOW = 'month'
+DEFAULT_CONCURRENCY = 4
+
+
+def submit_in_context(executor, fn, *args):
+    '''
+    Submits `fn(*args)` to `executor`, to run in a copy of the caller's
+    context, so that e.g. request_priority() applies in the worker thread.
+    '''
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _next_window_start(when, window):
+    midnight = when.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == 'week':
+        return midnight + datetime.timedelta(days=7 - midnight.weekday())
+    if midnight.month == 12:
+        return midnight.replace(year=midnight.year + 1, month=1, day=1)
+    return midnight.replace(month=midnight.month + 1, day=1)
+
+
+def split_range(start, end, window=DEFAULT_WINDOW):
+    '''
+    Splits `start`..`end` into consecutive (start, end) pairs, one for each
+    calendar month or (Monday to Sunday) week it covers.
+    '''
+    if window not in WINDOWS:
+        raise RuntimeError('`window` should be one of {}'.format(', '.join('`{}`'.format(w) for w in WINDOWS)))
+
+    windows = []
+    window_start = start
+    while True:
+        next_start = _next_window_start(window_start, window)
+        if next_start > end:
+            windows.append((window_start, end))
+            return windows
+        windows.append((window_start, next_start - datetime.timedelta(microseconds=1)))
+        window_start = next_start
+
+
+def _record_key(record):
+    return simplejson.dumps(record, sort_keys=True)
+
+
+def merge(results):
+    '''
+    Concatenates lists of records, dropping any repeated (e.g. a session
+    spanning midnight at the boundary between two windows).
+    '''
+    merged = OrderedDict()
+    for records in results:
+        for record in records:
+            merged.setdefault(_record_key(record), record)
+    return list(merged.values())
+
+
+def iter_range(fetch, start, end, window=DEFAULT_WINDOW, concurrency=DEFAULT_CONCURRENCY):
+    '''
+    Calls `fetch(start, end)`, which returns a list of records, for each
+    window of `start`..`end`, and yields their records in order as each
+    window arrives.
+
+    At most `concurrency` windows are fetched (or held waiting to be
+    yielded) at once, so memory use doesn't grow with the length of the
+    range. Closing the generator early cancels any windows not yet started.
+    '''
+    windows = iter(split_range(start, end, window))
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+    pending = deque()
+    previous_keys = set()
+
+    def submit():
+        for window_start, window_end in itertools.islice(windows, 1):
+            pending.append(submit_in_context(executor, fetch, window_start, window_end))
+
+    try:
+        for _ in range(concurrency):
+            submit()
+
+        while pending:
+            records = pending.popleft().result()
+            submit()
+
+            # Only adjacent windows can share a record
+            keys = set()
+            for record in records:
+                key = _record_key(record)
+                if key not in keys and key not in previous_keys:
+                    yield record
+                keys.add(key)
+            previous_keys = keys
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def fetch_range(fetch, start, end, window=DEFAULT_WINDOW, concurrency=DEFAULT_CONCURRENCY):
+    '''
+    As iter_range, but returns a list of all the records.
+    '''
+    windows = split_range(start, end, window)
+    if len(windows) == 1:
+        return fetch(start, end)
+    return list(iter_range(fetch, start, end, window, concurrency))
+
+
+async def fetch_range_async(fetch, start, end, window=DEFAULT_WINDOW, concurrency=DEFAULT_CONCURRENCY):
+    '''
+    As fetch_range, for a coroutine function `fetch`.
+    '''
+    import asyncio  # Already loaded by pyze.api.aio, our only caller
+
+    windows = split_range(start, end, window)
+    if len(windows) == 1:
+        return await fetch(start, end)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_window(window_start, window_end):
+        async with semaphore:
+            return await fetch(window_start, window_end)
+
+    return merge(await asyncio.gather(*[fetch_window(s, e) for s, e in windows]))
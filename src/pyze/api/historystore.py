@@ -0,0 +1,387 @@
+from .kamereon import PERIOD_FORMATS
+from .states import OK_END_STATUSES
+from collections import OrderedDict, defaultdict
+
+import datetime
+import os
+import simplejson
+import sqlite3
+import threading
+
+
+DAY_FORMAT = PERIOD_FORMATS['day']
+# How far back to fetch for a vehicle we've never synced, unless told otherwise
+DEFAULT_SYNC_DAYS = 365
+
+
+class _Dataset(object):
+    def __init__(self, method, key_format, date_field, period=None):
+        self.method = method
+        self.key_format = key_format
+        self.date_field = date_field
+        self.period = period
+
+    def fetch(self, vehicle, start, end):
+        if self.period:
+            return getattr(vehicle, self.method)(start, end, self.period)
+        return getattr(vehicle, self.method)(start, end)
+
+    def key_for(self, record):
+        # Sessions are keyed by the day they started ("2020-01-31T..."),
+        # summaries by the day or month they summarise ("20200131").
+        return str(record.get(self.date_field) or '')[:10].replace('-', '')
+
+    def last_closed_day(self, today):
+        # Today isn't over, and neither is this month
+        if self.period == 'month':
+            return today.replace(day=1) - datetime.timedelta(days=1)
+        return today - datetime.timedelta(days=1)
+
+
+DATASETS = {
+    'charges': _Dataset('iter_charge_history', DAY_FORMAT, 'chargeStartDate'),
+    'hvac-sessions': _Dataset('iter_hvac_history', DAY_FORMAT, 'hvacSessionRequestDate'),
+    'charge-history/day': _Dataset('iter_charge_statistics', DAY_FORMAT, 'day', 'day'),
+    'charge-history/month': _Dataset('iter_charge_statistics', PERIOD_FORMATS['month'], 'month', 'month'),
+    'hvac-history/day': _Dataset('iter_hvac_statistics', DAY_FORMAT, 'day', 'day'),
+    'hvac-history/month': _Dataset('iter_hvac_statistics', PERIOD_FORMATS['month'], 'month', 'month')
+}
+
+
+class _Rollup(object):
+    '''
+    What's totted up for each day, week and month of a dataset of sessions,
+    named as in the server's own summaries.
+    '''
+
+    def __init__(self, count_field, errors_field, status_field, duration_field=None, duration_total_field=None):
+        self.count_field = count_field
+        self.errors_field = errors_field
+        self.status_field = status_field
+        self.duration_field = duration_field
+        self.duration_total_field = duration_total_field
+
+    def totals(self, record):
+        status = record.get(self.status_field)
+        return (
+            1,
+            1 if status is not None and status not in OK_END_STATUSES else 0,
+            (record.get(self.duration_field) or 0) if self.duration_field else 0
+        )
+
+    def summary(self, period, period_start, sessions, errors, duration):
+        if period == 'month':
+            period_start = period_start[:6]
+        summary = {
+            period: period_start,
+            self.count_field: sessions,
+            self.errors_field: errors
+        }
+        if self.duration_total_field:
+            summary[self.duration_total_field] = duration
+        return summary
+
+
+ROLLUPS = {
+    'charges': _Rollup(
+        'totalChargesNumber', 'totalChargesErrors', 'chargeEndStatus', 'chargeDuration', 'totalChargesDuration'
+    ),
+    'hvac-sessions': _Rollup('totalHvacSessionsNumber', 'totalHvacSessionsErrors', 'hvacSessionEndStatus')
+}
+ROLLUP_PERIODS = ['day', 'week', 'month']
+
+
+def _period_start(day, period):
+    # Weeks start on Monday
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    return day
+
+
+def default_history_store_path():
+    return os.environ.get('PYZE_HISTORY_STORE', os.path.expanduser('~/.credentials/pyze-history.sqlite'))
+
+
+class HistoryStore(object):
+    '''
+    A local copy of vehicles' charge and HVAC history (sessions and daily
+    and monthly summaries), kept in an SQLite database.
+
+    sync() fetches whatever's missing: days before the earliest we have, if
+    asked for, and days since the last one known to be complete. The
+    current day (or month, for monthly summaries) can still change, so it's
+    fetched again on every sync.
+
+    Sessions are also totted up by day, week and month as they're stored
+    (see rollups()), so totals for any range can be read without going
+    through every session in it.
+    '''
+
+    def __init__(self, path=None):
+        path = path or default_history_store_path()
+        dirname = os.path.dirname(path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS records ('
+            'vin TEXT NOT NULL, dataset TEXT NOT NULL, key TEXT NOT NULL, record TEXT NOT NULL, '
+            'PRIMARY KEY (vin, dataset, record))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS records_key ON records (vin, dataset, key)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS watermarks ('
+            'vin TEXT NOT NULL, dataset TEXT NOT NULL, synced_from TEXT NOT NULL, synced_until TEXT NOT NULL, '
+            'PRIMARY KEY (vin, dataset))'
+        )
+
+        with self._lock:
+            have_rollups = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollups'"
+            ).fetchone()
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS rollups ('
+                'vin TEXT NOT NULL, dataset TEXT NOT NULL, period TEXT NOT NULL, period_start TEXT NOT NULL, '
+                'sessions INTEGER NOT NULL, errors INTEGER NOT NULL, duration REAL NOT NULL, '
+                'PRIMARY KEY (vin, dataset, period, period_start))'
+            )
+            if not have_rollups:
+                # A store from before we kept rollups
+                self._rebuild_rollups()
+
+    def watermark(self, vin, dataset):
+        '''
+        Returns the first and last days (as dates) for which we have all of
+        `dataset`, or None if it's never been synced.
+        '''
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT synced_from, synced_until FROM watermarks WHERE vin = ? AND dataset = ?',
+                (vin, dataset)
+            ).fetchone()
+        if row is None:
+            return None
+        return tuple(datetime.datetime.strptime(day, DAY_FORMAT).date() for day in row)
+
+    def sync(self, vehicle, datasets=None, since=None, today=None):
+        '''
+        Fetches whatever's missing for `vehicle` from each of `datasets`
+        (default all of DATASETS), back as far as `since` (a date or
+        datetime; default DEFAULT_SYNC_DAYS ago for a dataset we've never
+        synced). Returns the number of records stored.
+        '''
+        today = today or datetime.datetime.utcnow().date()
+        if isinstance(since, datetime.datetime):
+            since = since.date()
+        stored = 0
+
+        for name in datasets or DATASETS.keys():
+            dataset = DATASETS[name]
+            watermark = self.watermark(vehicle._vin, name)
+
+            if watermark is None:
+                synced_from = since or today - datetime.timedelta(days=DEFAULT_SYNC_DAYS)
+                stored += self._fetch(vehicle, name, synced_from, today)
+            else:
+                synced_from, synced_until = watermark
+                if since and since < synced_from:
+                    stored += self._fetch(vehicle, name, since, synced_from - datetime.timedelta(days=1))
+                    synced_from = since
+                stored += self._fetch(vehicle, name, synced_until + datetime.timedelta(days=1), today)
+
+            synced_until = max(dataset.last_closed_day(today), synced_from - datetime.timedelta(days=1))
+            with self._lock:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO watermarks (vin, dataset, synced_from, synced_until) VALUES (?, ?, ?, ?)',
+                    (vehicle._vin, name, synced_from.strftime(DAY_FORMAT), synced_until.strftime(DAY_FORMAT))
+                )
+
+        return stored
+
+    def _fetch(self, vehicle, name, start, end):
+        if start > end:
+            return 0
+        dataset = DATASETS[name]
+        records = list(
+            dataset.fetch(
+                vehicle,
+                datetime.datetime.combine(start, datetime.time()),
+                datetime.datetime.combine(end, datetime.time())
+            )
+        )
+        self.replace(vehicle._vin, name, start, end, records)
+        return len(records)
+
+    def replace(self, vin, dataset, start, end, records):
+        '''
+        Replaces everything stored from `dataset` for the days `start` to
+        `end` (dates) with `records`, updating its rollups to match.
+
+        `records` may include sessions that began before `start` (e.g. ones
+        spanning midnight); these replace any stored copy of the same
+        session.
+        '''
+        dataset_info = DATASETS[dataset]
+        key_format = dataset_info.key_format
+        # Each record once, however many times we were given it
+        rows = OrderedDict()
+        for record in records:
+            rows[simplejson.dumps(record, sort_keys=True)] = (dataset_info.key_for(record), record)
+        first_key, last_key = start.strftime(key_format), end.strftime(key_format)
+
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Anything stored for these days before may since have changed
+                replaced = OrderedDict(
+                    self._conn.execute(
+                        'SELECT rowid, record FROM records WHERE vin = ? AND dataset = ? AND key >= ? AND key <= ?',
+                        (vin, dataset, first_key, last_key)
+                    ).fetchall()
+                )
+                # ...as may sessions from other days that we've been given again
+                for key, record in rows.values():
+                    if first_key <= key <= last_key:
+                        continue
+                    stored = self._conn.execute(
+                        'SELECT rowid, record FROM records WHERE vin = ? AND dataset = ? AND key = ?',
+                        (vin, dataset, key)
+                    ).fetchall()
+                    for rowid, stored_record in stored:
+                        if simplejson.loads(stored_record).get(dataset_info.date_field) == record.get(dataset_info.date_field):
+                            replaced[rowid] = stored_record
+
+                if dataset in ROLLUPS:
+                    self._update_rollups(
+                        vin,
+                        dataset,
+                        [simplejson.loads(record) for record in replaced.values()],
+                        [record for _, record in rows.values()]
+                    )
+
+                self._conn.executemany(
+                    'DELETE FROM records WHERE rowid = ?',
+                    [(rowid,) for rowid in replaced.keys()]
+                )
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO records (vin, dataset, key, record) VALUES (?, ?, ?, ?)',
+                    [(vin, dataset, key, record) for record, (key, _) in rows.items()]
+                )
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def _update_rollups(self, vin, dataset, removed, added):
+        # Work out how each period's totals change, then apply just that
+        rollup = ROLLUPS[dataset]
+        deltas = defaultdict(lambda: [0, 0, 0])
+        for sign, records in ((-1, removed), (1, added)):
+            for record in records:
+                key = DATASETS[dataset].key_for(record)
+                if not key:
+                    continue
+                day = datetime.datetime.strptime(key, DAY_FORMAT).date()
+                totals = rollup.totals(record)
+                for period in ROLLUP_PERIODS:
+                    delta = deltas[(period, _period_start(day, period).strftime(DAY_FORMAT))]
+                    for i, value in enumerate(totals):
+                        delta[i] += sign * value
+
+        for (period, period_start), (sessions, errors, duration) in deltas.items():
+            if not (sessions or errors or duration):
+                continue
+            self._conn.execute(
+                'INSERT OR IGNORE INTO rollups (vin, dataset, period, period_start, sessions, errors, duration) '
+                'VALUES (?, ?, ?, ?, 0, 0, 0)',
+                (vin, dataset, period, period_start)
+            )
+            self._conn.execute(
+                'UPDATE rollups SET sessions = sessions + ?, errors = errors + ?, duration = duration + ? '
+                'WHERE vin = ? AND dataset = ? AND period = ? AND period_start = ?',
+                (sessions, errors, duration, vin, dataset, period, period_start)
+            )
+        self._conn.execute(
+            'DELETE FROM rollups WHERE vin = ? AND dataset = ? AND sessions <= 0',
+            (vin, dataset)
+        )
+
+    def _rebuild_rollups(self):
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._conn.execute('DELETE FROM rollups')
+            for dataset in ROLLUPS.keys():
+                vins = self._conn.execute(
+                    'SELECT DISTINCT vin FROM records WHERE dataset = ?', (dataset,)
+                ).fetchall()
+                for (vin,) in vins:
+                    rows = self._conn.execute(
+                        'SELECT record FROM records WHERE vin = ? AND dataset = ?', (vin, dataset)
+                    ).fetchall()
+                    self._update_rollups(vin, dataset, [], [simplejson.loads(row[0]) for row in rows])
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def records(self, vin, dataset, start, end):
+        '''
+        Returns the stored records from `dataset` for `start`..`end`, in
+        order.
+        '''
+        key_format = DATASETS[dataset].key_format
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT record FROM records WHERE vin = ? AND dataset = ? AND key >= ? AND key <= ? ORDER BY key, rowid',
+                (vin, dataset, start.strftime(key_format), end.strftime(key_format))
+            ).fetchall()
+        return [simplejson.loads(row[0]) for row in rows]
+
+    def charge_history(self, vin, start, end):
+        return self.records(vin, 'charges', start, end)
+
+    def hvac_history(self, vin, start, end):
+        return self.records(vin, 'hvac-sessions', start, end)
+
+    def charge_statistics(self, vin, start, end, period='month'):
+        return self.records(vin, 'charge-history/{}'.format(period), start, end)
+
+    def hvac_statistics(self, vin, start, end, period='month'):
+        return self.records(vin, 'hvac-history/{}'.format(period), start, end)
+
+    def rollups(self, vin, dataset, start, end, period='month'):
+        '''
+        Returns totals for each day, week or month from `start` to `end`
+        (inclusive of the periods they fall in) of the stored sessions from
+        `dataset` ('charges' or 'hvac-sessions'), in the same form as the
+        server's summaries. Weeks start on Monday, and are labelled with
+        their first day.
+
+        Reads one row per period, however many sessions there are.
+        '''
+        if period not in ROLLUP_PERIODS:
+            raise RuntimeError('`period` should be one of {}'.format(', '.join('`{}`'.format(p) for p in ROLLUP_PERIODS)))
+        if isinstance(start, datetime.datetime):
+            start = start.date()
+        if isinstance(end, datetime.datetime):
+            end = end.date()
+
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT period_start, sessions, errors, duration FROM rollups '
+                'WHERE vin = ? AND dataset = ? AND period = ? AND period_start >= ? AND period_start <= ? '
+                'ORDER BY period_start',
+                (vin, dataset, period, _period_start(start, period).strftime(DAY_FORMAT), end.strftime(DAY_FORMAT))
+            ).fetchall()
+        return [ROLLUPS[dataset].summary(period, *row) for row in rows]
+
+    def charge_rollups(self, vin, start, end, period='month'):
+        return self.rollups(vin, 'charges', start, end, period)
+
+    def hvac_rollups(self, vin, start, end, period='month'):
+        return self.rollups(vin, 'hvac-sessions', start, end, period)
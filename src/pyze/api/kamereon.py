@@ -1,21 +1,42 @@
+from .cache import CachingAPIObject, ttl_cached
 from .credentials import CredentialStore, requires_credentials
 from .gigya import Gigya
+from .history import DEFAULT_WINDOW, fetch_range, iter_range, submit_in_context
+from .ratelimit import RateLimiter, default_rate_limiter
 from .schedule import ChargeSchedules, ChargeMode
+from .scheduler import Priority, RequestScheduler, current_priority
+from .singleflight import SingleFlight
+from .states import ChargeState, PlugState  # Previously defined here
+from .transport import DEFAULT_TIMEOUT, RetryPolicy, send, throttled
 from collections import namedtuple
 from enum import Enum
-from functools import lru_cache
+from functools import partial
 
+import concurrent.futures
 import datetime
 import dateutil.tz
-import itertools
 import jwt
 import logging
 import os
 import requests
 import simplejson
+import threading
+import time
 
 
 DEFAULT_ROOT_URL = 'https://api-wired-prod-1-euw1.wrd-aws.com'
+SNAPSHOT_ENDPOINTS = [
+    'battery_status',
+    'charge_mode',
+    'mileage',
+    'location',
+    'hvac_status'
+]
+DEFAULT_SNAPSHOT_TIMEOUT = 30
+ACCOUNTS_TTL = 3600
+VEHICLES_TTL = 3600
+# Bump when the format of persisted lookups changes, so old ones are ignored
+PERSISTED_VERSION = 1
 _log = logging.getLogger('pyze.api.kamereon')
 
 
@@ -23,13 +44,6 @@ class AccountException(Exception):
     pass
 
 
-class CachingAPIObject(object):
-    def _clear_all_caches(self):
-        cached_funcs = [f for f in dir(self) if hasattr(f, 'cache_clear')]
-        for func in cached_funcs:
-            func.cache_clear()
-
-
 class Kamereon(CachingAPIObject):
     def __init__(
         self,
@@ -37,17 +51,47 @@ class Kamereon(CachingAPIObject):
         credentials=None,
         gigya=None,
         country='GB',
-        root_url=DEFAULT_ROOT_URL
+        root_url=DEFAULT_ROOT_URL,
+        cache=None,
+        single_flight=None,
+        retry_policy=None,
+        timeout=DEFAULT_TIMEOUT,
+        rate_limiter=None,
+        scheduler=None,
+        session=None
     ):
 
         self._root_url = root_url
         self._credentials = credentials or CredentialStore()
         self._country = country
-        self._gigya = gigya or Gigya(credentials=self._credentials)
-        self._session = requests.Session()
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._timeout = timeout
+        self._rate_limiter = rate_limiter if rate_limiter is not None else default_rate_limiter()
+        self._session = session or requests.Session()
+        self._gigya = gigya or Gigya(
+            credentials=self._credentials,
+            retry_policy=self._retry_policy,
+            timeout=timeout,
+            rate_limiter=self._rate_limiter,
+            session=self._session
+        )
+        # Pass scheduler=False to send requests as soon as they're made
+        self._scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self._account_id = None
+        self._cache = cache
+        self._single_flight = single_flight or SingleFlight()
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+        if isinstance(self._gigya, CachingAPIObject):
+            self._gigya.add_invalidation_hook(self._gigya_login_changed)
         if api_key:
             self.set_api_key(api_key)
 
+    def _gigya_login_changed(self):
+        # A new login may belong to a different account altogether
+        self._account_id = None
+        self._clear_all_caches()
+
     @staticmethod
     def print_multiple_account_warning(accounts):
         print("WARNING: Multiple Kamereon accounts found:")
@@ -63,11 +107,38 @@ class Kamereon(CachingAPIObject):
     def set_api_key(self, api_key):
         self._credentials.store('kamereon-api-key', api_key, None)
 
+    def _admit(self, account_id=None, vin=None, priority=None):
+        '''
+        Returns a function giving a context manager that waits for the
+        scheduler and rate limiter to admit a request.
+        '''
+        buckets = []
+        if self._rate_limiter:
+            buckets = [RateLimiter.api_key_bucket(self._credentials['kamereon-api-key'])]
+            if account_id:
+                buckets.append(RateLimiter.account_bucket(account_id))
+
+        if self._scheduler:
+            priority = priority if priority is not None else current_priority()
+            # The scheduler asks for tokens itself, without blocking
+            throttle = partial(self._rate_limiter.try_acquire, *buckets) if buckets else None
+            return lambda: self._scheduler.slot(priority, vin, throttle)
+        if buckets:
+            return lambda: throttled(partial(self._rate_limiter.acquire, *buckets))
+        return None
+
     def get_account_id(self):
+        # Resolved once per instance, so that requests don't need to consult
+        # the credential store (let alone write to it).
+        if self._account_id:
+            return self._account_id
+
         if 'KAMEREON_ACCOUNT_ID' in os.environ:
             self.set_account_id(os.environ['KAMEREON_ACCOUNT_ID'])
+            return self._account_id
         if 'kamereon-account' in self._credentials:
-            return self._credentials['kamereon-account']
+            self._account_id = self._credentials['kamereon-account']
+            return self._account_id
 
         accounts = self.get_accounts()
 
@@ -77,18 +148,90 @@ class Kamereon(CachingAPIObject):
             Kamereon.print_multiple_account_warning(accounts)
 
         account = accounts[0]
-        self._clear_all_caches()
-        self._credentials['kamereon-account'] = (account['accountId'], None)
-        return account['accountId']
+        self.set_account_id(account['accountId'])
+        return self._account_id
+
+    def _load_persisted(self, name, scope):
+        raw = self._credentials.get(name)
+        if raw is None:
+            return None
+        try:
+            entry = simplejson.loads(raw)
+        except ValueError:
+            return None
+        if entry.get('version') != PERSISTED_VERSION or entry.get('scope') != scope:
+            return None
+        return entry
+
+    def _fetch_persisted(self, name, scope, ttl, fetch):
+        data = fetch()
+        self._credentials[name] = (
+            simplejson.dumps({
+                'version': PERSISTED_VERSION,
+                'scope': scope,
+                'fetched': time.time(),
+                'ttl': ttl,
+                'data': data
+            }),
+            None
+        )
+        return data
+
+    def _refresh_persisted_in_background(self, name, scope, ttl, fetch):
+        with self._refreshing_lock:
+            if name in self._refreshing:
+                return
+            self._refreshing.add(name)
+
+        def refresh():
+            try:
+                self._fetch_persisted(name, scope, ttl, fetch)
+                self._clear_all_caches()
+            except Exception as e:
+                _log.warning('Failed to refresh {}: {}'.format(name, e))
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing.discard(name)
+
+        # Not a daemon, so that a short-lived process still saves the result
+        threading.Thread(target=refresh, name='pyze-refresh-{}'.format(name)).start()
+
+    def _persisted(self, name, scope, ttl, fetch):
+        '''
+        Returns the result of `fetch`, which is kept in the credential store
+        so that other instances and processes needn't fetch it again. Once
+        it's older than `ttl` seconds the stored copy is still returned, and
+        refreshed in the background. `scope` identifies what the result
+        belongs to; a stored result for any other scope is ignored.
+        '''
+        entry = self._load_persisted(name, scope)
+        if entry is None:
+            return self._fetch_persisted(name, scope, ttl, fetch)
+        if entry['fetched'] + entry['ttl'] < time.time():
+            self._refresh_persisted_in_background(name, scope, ttl, fetch)
+        return entry['data']
 
     @requires_credentials('gigya', 'gigya-person-id', 'kamereon-api-key')
     def get_accounts(self):
-        response = self._session.get(
+        return self._persisted(
+            'kamereon-accounts',
+            self._credentials['gigya-person-id'],
+            ACCOUNTS_TTL,
+            self._fetch_accounts
+        )
+
+    def _fetch_accounts(self):
+        response = send(
+            self._session,
+            'GET',
             '{}/commerce/v1/persons/{}?country={}'.format(
                 self._root_url,
                 self._credentials['gigya-person-id'],
                 self._country
             ),
+            self._retry_policy,
+            self._timeout,
+            admit=self._admit(),
             headers={
                 'apikey': self._credentials['kamereon-api-key'],
                 'x-gigya-id_token': self._gigya.get_jwt_token()
@@ -102,17 +245,45 @@ class Kamereon(CachingAPIObject):
         return response_body.get('accounts', [])
 
     def set_account_id(self, account_id):
+        if account_id != self._account_id:
+            self._clear_all_caches()
+        self._account_id = account_id
         self._credentials['kamereon-account'] = (account_id, None)
 
-    @lru_cache(maxsize=1)
+    @ttl_cached(VEHICLES_TTL)
     @requires_credentials('kamereon-api-key')
     def get_vehicles(self):
-        response = self._session.get(
+        account_id = self.get_account_id()
+        return self._persisted(
+            'kamereon-vehicles',
+            account_id,
+            VEHICLES_TTL,
+            partial(self._fetch_vehicles, account_id)
+        )
+
+    def get_stored_vehicles(self):
+        '''
+        Returns the vehicle list as last fetched (however long ago), or None
+        if we haven't one for this account. Never makes a request.
+        '''
+        account_id = self._account_id or os.environ.get('KAMEREON_ACCOUNT_ID') or self._credentials.get('kamereon-account')
+        if not account_id:
+            return None
+        entry = self._load_persisted('kamereon-vehicles', account_id)
+        return entry['data'] if entry else None
+
+    def _fetch_vehicles(self, account_id):
+        response = send(
+            self._session,
+            'GET',
             '{}/commerce/v1/accounts/{}/vehicles?country={}'.format(
                 self._root_url,
-                self.get_account_id(),
+                account_id,
                 self._country
             ),
+            self._retry_policy,
+            self._timeout,
+            admit=self._admit(account_id),
             headers={
                 'apikey': self._credentials['kamereon-api-key'],
                 'x-gigya-id_token': self._gigya.get_jwt_token(),
@@ -133,10 +304,15 @@ class Vehicle(object):
         self._root_url = self._kamereon._root_url
 
     @requires_credentials('kamereon-api-key')
-    def _request(self, method, endpoint, **kwargs):
-        return self._kamereon._session.request(
+    def _request(self, method, endpoint, retryable=None, account_id=None, priority=None, **kwargs):
+        return send(
+            self._kamereon._session,
             method,
             endpoint,
+            self._kamereon._retry_policy,
+            self._kamereon._timeout,
+            retryable,
+            self._kamereon._admit(account_id, self._vin, priority),
             headers={
                 'Content-type': 'application/vnd.api+json',
                 'apikey': self._kamereon._credentials['kamereon-api-key'],
@@ -149,34 +325,60 @@ class Vehicle(object):
         )
 
     def _get(self, endpoint, version=1):
+        account_id = self._kamereon.get_account_id()
+        cache = self._kamereon._cache
+        if cache:
+            cached = cache.get(account_id, self._vin, endpoint, version)
+            if cached is not None:
+                return cached
+
+        # Concurrent identical reads share a single request
+        return self._kamereon._single_flight.do(
+            (account_id, self._vin, endpoint, version),
+            self._fetch,
+            account_id,
+            endpoint,
+            version
+        )
+
+    def _fetch(self, account_id, endpoint, version):
         response = self._request(
             'GET',
-            '{}/commerce/v1/accounts/{}/kamereon/kca/car-adapter/v{}/cars/{}/{}'.format(
+            vehicle_url(
                 self._root_url,
-                self._kamereon.get_account_id(),
+                account_id,
                 version,
                 self._vin,
                 endpoint
-            )
+            ),
+            account_id=account_id
         )
 
         _log.debug('Received Kamereon vehicle response: {}'.format(response.text))
         _log.debug('Response headers: {}'.format(response.headers))
         response.raise_for_status()
         json = response.json()
-        return json['data']['attributes']
+        attributes = json['data']['attributes']
 
-    def _post(self, endpoint, data, version=1):
+        if self._kamereon._cache:
+            self._kamereon._cache.put(account_id, self._vin, endpoint, version, attributes)
+        return attributes
+
+    def _post(self, endpoint, data, version=1, retryable=False):
         _log.debug('POSTing with data: {}'.format(data))
+        account_id = self._kamereon.get_account_id()
         response = self._request(
             'POST',
-            '{}/commerce/v1/accounts/{}/kamereon/kca/car-adapter/v{}/cars/{}/{}'.format(
+            vehicle_url(
                 self._root_url,
-                self._kamereon.get_account_id(),
+                account_id,
                 version,
                 self._vin,
                 endpoint
             ),
+            retryable=retryable,
+            account_id=account_id,
+            priority=Priority.INTERACTIVE,
             json={
                 'data': data
             }
@@ -186,6 +388,9 @@ class Vehicle(object):
         _log.debug('Response headers: {}'.format(response.headers))
         response.raise_for_status()
         json = response.json()
+
+        if self._kamereon._cache:
+            self._kamereon._cache.invalidate_action(account_id, self._vin, endpoint)
         return json
 
     def battery_status(self):
@@ -198,11 +403,7 @@ class Vehicle(object):
         return self._get('hvac-status')
 
     def charge_mode(self):
-        raw_mode = self._get('charge-mode')['chargeMode']
-        if hasattr(ChargeMode, raw_mode):
-            return getattr(ChargeMode, raw_mode)
-        else:
-            return raw_mode
+        return parse_charge_mode(self._get('charge-mode'))
 
     def mileage(self):
         return self._get('cockpit', 2)
@@ -224,183 +425,262 @@ class Vehicle(object):
         return self._get('notification-settings')
 
     def charge_history(self, start, end):
-        if not isinstance(start, datetime.datetime):
-            raise RuntimeError('`start` should be an instance of datetime.datetime, not {}'.format(start.__class__))
-        if not isinstance(end, datetime.datetime):
-            raise RuntimeError('`end` should be an instance of datetime.datetime, not {}'.format(end.__class__))
+        _check_dates(start, end)
+        return fetch_range(self._charge_history, start, end)
 
+    def _charge_history(self, start, end):
         return self._get(
-            'charges?start={}&end={}'.format(
-                start.strftime('%Y%m%d'),
-                end.strftime('%Y%m%d')
-            )
+            history_endpoint('charges', start, end)
         ).get('charges', [])
 
     def charge_statistics(self, start, end, period='month'):
-        if not isinstance(start, datetime.datetime):
-            raise RuntimeError('`start` should be an instance of datetime.datetime, not {}'.format(start.__class__))
-        if not isinstance(end, datetime.datetime):
-            raise RuntimeError('`end` should be an instance of datetime.datetime, not {}'.format(end.__class__))
-        if period not in PERIOD_FORMATS.keys():
-            raise RuntimeError('`period` should be one of `month`, `day`')
+        _check_dates(start, end)
+        return fetch_range(partial(self._charge_statistics, period=period), start, end)
 
+    def _charge_statistics(self, start, end, period):
         return self._get(
-            'charge-history?type={}&start={}&end={}'.format(
-                period,
-                start.strftime(PERIOD_FORMATS[period]),
-                end.strftime(PERIOD_FORMATS[period])
-            )
+            statistics_endpoint('charge-history', start, end, period)
         )['chargeSummaries']
 
     def hvac_history(self, start, end):
-        if not isinstance(start, datetime.datetime):
-            raise RuntimeError('`start` should be an instance of datetime.datetime, not {}'.format(start.__class__))
-        if not isinstance(end, datetime.datetime):
-            raise RuntimeError('`end` should be an instance of datetime.datetime, not {}'.format(end.__class__))
+        _check_dates(start, end)
+        return fetch_range(self._hvac_history, start, end)
 
+    def _hvac_history(self, start, end):
         return self._get(
-            'hvac-sessions?start={}&end={}'.format(
-                start.strftime('%Y%m%d'),
-                end.strftime('%Y%m%d')
-            )
+            history_endpoint('hvac-sessions', start, end)
         ).get('hvacSessions', [])
 
     def hvac_statistics(self, start, end, period='month'):
-        if not isinstance(start, datetime.datetime):
-            raise RuntimeError('`start` should be an instance of datetime.datetime, not {}'.format(start.__class__))
-        if not isinstance(end, datetime.datetime):
-            raise RuntimeError('`end` should be an instance of datetime.datetime, not {}'.format(end.__class__))
-        if period not in PERIOD_FORMATS.keys():
-            raise RuntimeError('`period` should be one of `month`, `day`')
-
+        _check_dates(start, end)
+        return fetch_range(partial(self._hvac_statistics, period=period), start, end)
+
+    def iter_charge_history(self, start, end, window=DEFAULT_WINDOW):
+        '''
+        Yields charge history records a window (month or week) at a time,
+        as they arrive. See pyze.api.history.iter_range.
+        '''
+        _check_dates(start, end)
+        return iter_range(self._charge_history, start, end, window)
+
+    def iter_charge_statistics(self, start, end, period='month', window=DEFAULT_WINDOW):
+        _check_dates(start, end)
+        return iter_range(partial(self._charge_statistics, period=period), start, end, window)
+
+    def iter_hvac_history(self, start, end, window=DEFAULT_WINDOW):
+        _check_dates(start, end)
+        return iter_range(self._hvac_history, start, end, window)
+
+    def iter_hvac_statistics(self, start, end, period='month', window=DEFAULT_WINDOW):
+        _check_dates(start, end)
+        return iter_range(partial(self._hvac_statistics, period=period), start, end, window)
+
+    def _hvac_statistics(self, start, end, period):
         return self._get(
-            'hvac-history?type={}&start={}&end={}'.format(
-                period,
-                start.strftime(PERIOD_FORMATS[period]),
-                end.strftime(PERIOD_FORMATS[period])
-            )
+            statistics_endpoint('hvac-history', start, end, period)
         )['hvacSessionsSummaries']
 
-    # Actions
-
-    def ac_start(self, when=None, temperature=21):
-
-        attrs = {
-            'action': 'start',
-            'targetTemperature': temperature
+    def snapshot(self, endpoints=SNAPSHOT_ENDPOINTS, timeout=DEFAULT_SNAPSHOT_TIMEOUT):
+        '''
+        Fetch several endpoints concurrently, waiting at most `timeout`
+        seconds in total. `endpoints` are names of methods on this class that
+        take no arguments. Returns a Snapshot of those that succeeded and of
+        the exception raised by each of those that didn't; endpoints still in
+        flight at the deadline fail with concurrent.futures.TimeoutError.
+        '''
+        endpoints = list(endpoints)
+        if not endpoints:
+            return Snapshot({}, {})
+
+        # Resolve the account and JWT up front so that the concurrent
+        # requests don't all race to fetch them.
+        self._kamereon.get_account_id()
+        self._kamereon._gigya.get_jwt_token()
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(endpoints))
+        futures = {
+            submit_in_context(executor, getattr(self, endpoint)): endpoint for endpoint in endpoints
         }
+        executor.shutdown(wait=False)
 
-        if when:
-
-            if not isinstance(when, datetime.datetime):
-                raise RuntimeError('`when` should be an instance of datetime.datetime, not {}'.format(when.__class__))
+        done, _ = concurrent.futures.wait(futures, timeout=timeout)
+        return _collect_snapshot(futures, done)
 
-            attrs['startDateTime'] = when.astimezone(
-                dateutil.tz.tzutc()
-            ).strftime(
-                "%Y-%m-%dT%H:%M:%SZ"
-            )
+    # Actions
 
+    def ac_start(self, when=None, temperature=21):
         return self._post(
             'actions/hvac-start',
-            {
-                'type': 'HvacStart',
-                'attributes': attrs
-            }
+            ac_start_body(when, temperature)
         )
 
     def cancel_ac(self):
         return self._post(
             'actions/hvac-start',
-            {
-                'type': 'HvacStart',
-                'attributes': {
-                    'action': 'cancel'
-                }
-            }
+            CANCEL_AC_BODY,
+            retryable=True
         )
 
     def set_charge_schedules(self, schedules):
-        if not isinstance(schedules, ChargeSchedules):
-            raise RuntimeError('Expected schedule to be instance of ChargeSchedules, but got {} instead'.format(schedules.__class__))
-        schedules.validate()
-
-        data = {
-            'type': 'ChargeSchedule',
-            'attributes': schedules
-        }
-
         return self._post(
             'actions/charge-schedule',
-            simplejson.loads(simplejson.dumps(data, for_json=True)),
-            version=2
+            charge_schedules_body(schedules),
+            version=2,
+            retryable=True
         )
 
     def set_charge_mode(self, charge_mode):
-        if not isinstance(charge_mode, ChargeMode):
-            raise RuntimeError('Expected charge_mode to be instance of ChargeMode, but got {} instead'.format(charge_mode.__class__))
-
-        data = {
-            'type': 'ChargeMode',
-            'attributes': {
-                'action': charge_mode.name
-            }
-        }
-
         return self._post(
             'actions/charge-mode',
-            data
+            charge_mode_body(charge_mode),
+            retryable=True
         )
 
     def charge_start(self):
         return self._post(
             'actions/charging-start',
-            {
-                'type': 'ChargingStart',
-                'attributes': {
-                    'action': 'start'
-                }
-            }
+            CHARGE_START_BODY
         )
 
-# Serious metaprogramming follows:
-# https://www.notinventedhere.org/articles/python/how-to-use-strings-as-name-aliases-in-python-enums.html
-
-
-_CHARGE_STATES = {
-    0.0: ['Not charging', 'NOT_IN_CHARGE'],
-    0.1: ['Waiting for planned charge', 'WAITING_FOR_PLANNED_CHARGE'],
-    0.2: ['Charge ended', 'CHARGE_ENDED'],
-    0.3: ['Waiting for current charge', 'WAITING_FOR_CURRENT_CHARGE'],
-    0.4: ['Energy flap opened', 'ENERGY_FLAP_OPENED'],
-    1.0: ['Charging', 'CHARGE_IN_PROGRESS'],
-    # This next is more accurately "not charging" (<= ZE40) or "error" (ZE50).
-    # But I don't want to include 'error' in the output text because people will
-    # think that it's an error in Pyze when their ZE40 isn't plugged in...
-    -1.0: ['Not charging or plugged in', 'CHARGE_ERROR'],
-    -1.1: ['Not available', 'NOT_AVAILABLE']
-}
 
-ChargeState = Enum(
-    value='ChargeState',
-    names=itertools.chain.from_iterable(
-        itertools.product(v, [k]) for k, v in _CHARGE_STATES.items()
-    )
+Snapshot = namedtuple(
+    'Snapshot',
+    [
+        'results',
+        'errors'
+    ]
 )
 
-_PLUG_STATES = {
-    0: ['Unplugged', 'UNPLUGGED'],
-    1: ['Plugged in', 'PLUGGED'],
-    -1: ['Plug error', 'PLUG_ERROR'],
-    -2147483648: ['Not available', 'NOT_AVAILABLE']
-}
 
-PlugState = Enum(
-    value='PlugState',
-    names=itertools.chain.from_iterable(
-        itertools.product(v, [k]) for k, v in _PLUG_STATES.items()
+def _collect_snapshot(futures, done):
+    results = {}
+    errors = {}
+    for future, endpoint in futures.items():
+        if future not in done:
+            future.cancel()
+            errors[endpoint] = concurrent.futures.TimeoutError(
+                'Timed out waiting for {}'.format(endpoint)
+            )
+        elif future.exception() is not None:
+            errors[endpoint] = future.exception()
+        else:
+            results[endpoint] = future.result()
+    return Snapshot(results, errors)
+
+
+# Request building and response parsing shared between Vehicle and the
+# asyncio client in pyze.api.aio.
+
+
+def vehicle_url(root_url, account_id, version, vin, endpoint):
+    return '{}/commerce/v1/accounts/{}/kamereon/kca/car-adapter/v{}/cars/{}/{}'.format(
+        root_url,
+        account_id,
+        version,
+        vin,
+        endpoint
     )
-)
+
+
+def _check_dates(start, end):
+    if not isinstance(start, datetime.datetime):
+        raise RuntimeError('`start` should be an instance of datetime.datetime, not {}'.format(start.__class__))
+    if not isinstance(end, datetime.datetime):
+        raise RuntimeError('`end` should be an instance of datetime.datetime, not {}'.format(end.__class__))
+
+
+def history_endpoint(endpoint, start, end):
+    _check_dates(start, end)
+    return '{}?start={}&end={}'.format(
+        endpoint,
+        start.strftime('%Y%m%d'),
+        end.strftime('%Y%m%d')
+    )
+
+
+def statistics_endpoint(endpoint, start, end, period):
+    _check_dates(start, end)
+    if period not in PERIOD_FORMATS.keys():
+        raise RuntimeError('`period` should be one of `month`, `day`')
+
+    return '{}?type={}&start={}&end={}'.format(
+        endpoint,
+        period,
+        start.strftime(PERIOD_FORMATS[period]),
+        end.strftime(PERIOD_FORMATS[period])
+    )
+
+
+def parse_charge_mode(response):
+    raw_mode = response['chargeMode']
+    if hasattr(ChargeMode, raw_mode):
+        return getattr(ChargeMode, raw_mode)
+    else:
+        return raw_mode
+
+
+def ac_start_body(when, temperature):
+    attrs = {
+        'action': 'start',
+        'targetTemperature': temperature
+    }
+
+    if when:
+
+        if not isinstance(when, datetime.datetime):
+            raise RuntimeError('`when` should be an instance of datetime.datetime, not {}'.format(when.__class__))
+
+        attrs['startDateTime'] = when.astimezone(
+            dateutil.tz.tzutc()
+        ).strftime(
+            "%Y-%m-%dT%H:%M:%SZ"
+        )
+
+    return {
+        'type': 'HvacStart',
+        'attributes': attrs
+    }
+
+
+CANCEL_AC_BODY = {
+    'type': 'HvacStart',
+    'attributes': {
+        'action': 'cancel'
+    }
+}
+
+
+def charge_schedules_body(schedules):
+    if not isinstance(schedules, ChargeSchedules):
+        raise RuntimeError('Expected schedule to be instance of ChargeSchedules, but got {} instead'.format(schedules.__class__))
+    schedules.validate()
+
+    data = {
+        'type': 'ChargeSchedule',
+        'attributes': schedules
+    }
+
+    return simplejson.loads(simplejson.dumps(data, for_json=True))
+
+
+def charge_mode_body(charge_mode):
+    if not isinstance(charge_mode, ChargeMode):
+        raise RuntimeError('Expected charge_mode to be instance of ChargeMode, but got {} instead'.format(charge_mode.__class__))
+
+    return {
+        'type': 'ChargeMode',
+        'attributes': {
+            'action': charge_mode.name
+        }
+    }
+
+
+CHARGE_START_BODY = {
+    'type': 'ChargingStart',
+    'attributes': {
+        'action': 'start'
+    }
+}
 
 
 PERIOD_FORMATS = {
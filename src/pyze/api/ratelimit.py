@@ -0,0 +1,196 @@
+from collections import namedtuple
+
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+class Budget(namedtuple('Budget', ['rate', 'burst'])):
+    '''
+    Allows `burst` requests at once, refilling at `rate` requests per
+    second.
+    '''
+    __slots__ = ()
+
+    def __new__(cls, rate, burst):
+        if not rate > 0:
+            raise RuntimeError('Budget rate must be greater than zero')
+        if not burst >= 1:
+            raise RuntimeError('Budget burst must be at least 1')
+        return super().__new__(cls, rate, burst)
+
+
+DEFAULT_API_KEY_BUDGET = Budget(5, 10)
+DEFAULT_ACCOUNT_BUDGET = Budget(2, 5)
+
+
+class MemoryBucketStore(object):
+    '''
+    Keeps token buckets in memory, shared only within this process.
+    '''
+
+    blocking = False
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, buckets, now):
+        with self._lock:
+            return _take(self._buckets.get, self._buckets.__setitem__, buckets, now)
+
+
+class SQLiteBucketStore(object):
+    '''
+    Keeps token buckets in an SQLite database so that every process on the
+    host using the same file draws from the same budget.
+    '''
+
+    blocking = True
+
+    def __init__(self, path):
+        dirname = os.path.dirname(path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+        )
+
+    def _get(self, name):
+        return self._conn.execute('SELECT tokens, updated FROM buckets WHERE name = ?', (name,)).fetchone()
+
+    def _set(self, name, state):
+        self._conn.execute('INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)', (name,) + state)
+
+    def take(self, buckets, now):
+        with self._lock:
+            # Take the write lock up front so no other process can spend the
+            # same tokens between our read and write.
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                wait = _take(self._get, self._set, buckets, now)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return wait
+
+
+def _take(get, set, buckets, now):
+    '''
+    Takes a token from every one of `buckets` (name, Budget) pairs if they
+    all have one, returning 0. Otherwise takes nothing and returns the
+    number of seconds until they all will.
+    '''
+    states = []
+    wait = 0
+    for name, budget in buckets:
+        state = get(name)
+        if state is None:
+            tokens = budget.burst
+        else:
+            tokens = min(budget.burst, state[0] + (now - state[1]) * budget.rate)
+        states.append((name, tokens))
+        if tokens < 1:
+            wait = max(wait, (1 - tokens) / budget.rate)
+
+    if wait == 0:
+        for name, tokens in states:
+            set(name, (tokens - 1, now))
+    return wait
+
+
+class RateLimiter(object):
+    '''
+    Client-side token-bucket rate limiter with budgets per API key and per
+    Kamereon account. Budgets for particular keys or accounts can be set in
+    `budgets`, keyed by the bucket names returned by `api_key_bucket` and
+    `account_bucket`; anything else gets the default budget for its kind. A
+    default of None means unlimited.
+
+    Pass an SQLiteBucketStore to share budgets between processes.
+    '''
+
+    def __init__(
+        self,
+        store=None,
+        budgets=None,
+        api_key_budget=DEFAULT_API_KEY_BUDGET,
+        account_budget=DEFAULT_ACCOUNT_BUDGET
+    ):
+        self._store = store if store is not None else MemoryBucketStore()
+        self._budgets = budgets or {}
+        self._defaults = {
+            'api-key': api_key_budget,
+            'account': account_budget
+        }
+
+    @staticmethod
+    def api_key_bucket(api_key):
+        # Don't put API keys in the shared store
+        return 'api-key:{}'.format(hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16])
+
+    @staticmethod
+    def account_bucket(account_id):
+        return 'account:{}'.format(account_id)
+
+    def _buckets(self, names):
+        buckets = []
+        for name in names:
+            budget = self._budgets.get(name, self._defaults.get(name.partition(':')[0]))
+            if budget is not None:
+                buckets.append((name, budget))
+        return buckets
+
+    def try_acquire(self, *names):
+        '''
+        Takes a token for each named bucket if possible, returning 0, or
+        otherwise returns the number of seconds to wait before trying again.
+        '''
+        buckets = self._buckets(names)
+        if not buckets:
+            return 0
+        return self._store.take(buckets, time.time())
+
+    def acquire(self, *names):
+        while True:
+            wait = self.try_acquire(*names)
+            if wait == 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, *names):
+        import asyncio  # Only needed by the asyncio client
+        loop = asyncio.get_event_loop()
+        while True:
+            if getattr(self._store, 'blocking', True):
+                # e.g. SQLite, which may wait on other processes' locks
+                wait = await loop.run_in_executor(None, functools.partial(self.try_acquire, *names))
+            else:
+                wait = self.try_acquire(*names)
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+
+_default_rate_limiters = {}
+
+
+def default_rate_limiter():
+    '''
+    Returns a RateLimiter shared between processes through the SQLite file
+    named by the PYZE_RATE_LIMIT_STORE environment variable, or None if it
+    isn't set.
+    '''
+    path = os.environ.get('PYZE_RATE_LIMIT_STORE')
+    if not path:
+        return None
+    if path not in _default_rate_limiters:
+        _default_rate_limiters[path] = RateLimiter(SQLiteBucketStore(path))
+    return _default_rate_limiters[path]
@@ -1,5 +1,4 @@
 from enum import Enum
-from tzlocal import get_localzone
 from datetime import datetime
 
 import math
@@ -300,6 +299,8 @@ def round_date_fifteen(dt):
 
 
 def timezone_offset():
+    # Imported here as it's slow to import, and only needed to edit schedules
+    from tzlocal import get_localzone
     offset = get_localzone().utcoffset(datetime.now()).total_seconds() / 60
     return offset / 60, offset % 60
 
@@ -0,0 +1,190 @@
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from enum import IntEnum
+
+import contextvars
+import threading
+import time
+
+
+DEFAULT_MAX_CONCURRENCY = 16
+# Slots beyond max_concurrency that only INTERACTIVE requests may use
+DEFAULT_INTERACTIVE_RESERVE = 2
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # Actions triggered by a user, e.g. starting preconditioning
+    ON_DEMAND = 1  # Reads someone is waiting for
+    BACKGROUND = 2  # Polling
+
+
+_current_priority = contextvars.ContextVar('pyze_request_priority', default=Priority.ON_DEMAND)
+
+
+def current_priority():
+    return _current_priority.get()
+
+
+@contextmanager
+def request_priority(priority):
+    '''
+    Sets the priority of reads made within this context (in this thread or
+    task). Actions are always sent as Priority.INTERACTIVE.
+    '''
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class _PriorityStats(object):
+    def __init__(self):
+        self.queued = 0
+        self.admitted = 0
+        self.total_wait = 0
+        self.max_wait = 0
+
+    def record(self, wait):
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def as_dict(self):
+        return {
+            'queued': self.queued,
+            'admitted': self.admitted,
+            'mean_wait': self.total_wait / self.admitted if self.admitted else 0,
+            'max_wait': self.max_wait
+        }
+
+
+class _Ticket(object):
+    __slots__ = ('ready_at',)
+
+    def __init__(self):
+        # When the rate limiter will next have a token for this request
+        self.ready_at = 0
+
+
+class RequestScheduler(object):
+    '''
+    Admits requests in priority order, and round-robin between VINs within
+    a priority, with at most `max_concurrency` in flight.
+
+    A further `interactive_reserve` slots are kept for Priority.INTERACTIVE
+    requests, so that an action needn't wait for a request in flight to
+    finish when (say) a FleetPoller is using every other slot.
+
+    The rate limiter is asked for a token by one request at a time, in the
+    same order, so that whenever a token becomes available it goes to the
+    most important request waiting for one. A request refused a token keeps
+    its place but steps aside until the token is due, so that requests
+    drawing on other buckets (e.g. another account's) aren't held up.
+    '''
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, interactive_reserve=DEFAULT_INTERACTIVE_RESERVE):
+        self._max_concurrency = max_concurrency
+        self._interactive_reserve = interactive_reserve
+        self._cond = threading.Condition()
+        self._queues = OrderedDict((p, OrderedDict()) for p in Priority)
+        self._stats = OrderedDict((p, _PriorityStats()) for p in Priority)
+        self._active = 0
+        self._gate_busy = False
+
+    def _next_ready(self, now):
+        for queue in self._queues.values():
+            for tickets in queue.values():
+                for ticket in tickets:
+                    if ticket.ready_at <= now:
+                        return ticket
+
+    def _limit(self, priority):
+        if priority == Priority.INTERACTIVE:
+            return self._max_concurrency + self._interactive_reserve
+        return self._max_concurrency
+
+    def _dequeue(self, priority, vin, ticket):
+        queue = self._queues[priority]
+        tickets = queue[vin]
+        tickets.remove(ticket)
+        if tickets:
+            # Let other vehicles' requests go next
+            queue.move_to_end(vin)
+        else:
+            del queue[vin]
+        self._stats[priority].queued -= 1
+
+    def _wait_for_turn(self, priority, ticket):
+        # Called holding self._cond; takes the gate
+        while True:
+            now = time.time()
+            if not self._gate_busy and self._active < self._limit(priority) and self._next_ready(now) is ticket:
+                self._gate_busy = True
+                return
+            self._cond.wait(ticket.ready_at - now if ticket.ready_at > now else None)
+
+    def _admit(self, priority, vin, ticket, throttle, enqueued):
+        while True:
+            with self._cond:
+                self._wait_for_turn(priority, ticket)
+
+            wait = None
+            try:
+                wait = throttle() if throttle else 0
+            finally:
+                with self._cond:
+                    self._gate_busy = False
+                    if wait == 0:
+                        self._dequeue(priority, vin, ticket)
+                        self._active += 1
+                        self._stats[priority].record(time.time() - enqueued)
+                    elif wait:
+                        ticket.ready_at = time.time() + wait
+                    self._cond.notify_all()
+            if wait == 0:
+                return
+
+    @contextmanager
+    def slot(self, priority, vin=None, throttle=None):
+        '''
+        Waits for this request's turn, and for `throttle` (if given) to
+        allow it, and holds one of the concurrent request slots for the
+        duration of the context.
+
+        `throttle` mustn't block: it should return 0 to let the request go,
+        or otherwise the number of seconds to wait before asking again (as
+        RateLimiter.try_acquire does).
+        '''
+        ticket = _Ticket()
+        enqueued = time.time()
+
+        with self._cond:
+            self._queues[priority].setdefault(vin, deque()).append(ticket)
+            self._stats[priority].queued += 1
+
+        try:
+            self._admit(priority, vin, ticket, throttle, enqueued)
+        except BaseException:
+            with self._cond:
+                self._dequeue(priority, vin, ticket)
+                self._cond.notify_all()
+            raise
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def stats(self):
+        '''
+        Returns the number of requests in flight, and for each priority the
+        number queued and how long admitted requests waited (in seconds).
+        '''
+        with self._cond:
+            return {
+                'active': self._active,
+                'priorities': OrderedDict((p.name, s.as_dict()) for p, s in self._stats.items())
+            }
@@ -0,0 +1,183 @@
+from .credentials import SQLITE_EXTENSIONS, SQLiteCredentialDatabase, _database
+from .gigya import Gigya
+from .kamereon import Kamereon, Vehicle
+from .ratelimit import default_rate_limiter
+from .scheduler import RequestScheduler
+from .singleflight import SingleFlight
+from .transport import DEFAULT_TIMEOUT, RetryPolicy
+from collections import OrderedDict
+
+import concurrent.futures
+import logging
+import os
+import requests
+import threading
+
+
+DEFAULT_MAX_IDENTITIES = 256
+DEFAULT_POOL_SIZE = 32
+DEFAULT_LOGIN_CONCURRENCY = 8
+_log = logging.getLogger('pyze.api.sessions')
+
+
+def default_credential_database():
+    path = os.environ.get('PYZE_TOKEN_STORE', '')
+    if not path.endswith(SQLITE_EXTENSIONS):
+        path = os.path.expanduser('~/.credentials/pyze.sqlite')
+    return _database(path)
+
+
+class SessionManager(object):
+    '''
+    Holds Kamereon/Gigya clients for many identities (My Renault logins),
+    creating each when it's first used. Every client shares one connection
+    pool, request scheduler and rate limiter; an identity whose account has
+    used up its rate limit waits without holding up the others.
+
+    Credentials for each identity come from `credentials`, either an
+    SQLiteCredentialDatabase (using the identity as the profile) or a
+    function taking the identity and returning a credential store. By
+    default they're kept in the SQLite database named by PYZE_TOKEN_STORE,
+    or ~/.credentials/pyze.sqlite.
+
+    At most `max_identities` clients are kept; the least recently used is
+    dropped to make room for another. Its credentials remain in the store,
+    so it's recreated without logging in again next time it's needed.
+    '''
+
+    def __init__(
+        self,
+        credentials=None,
+        max_identities=DEFAULT_MAX_IDENTITIES,
+        pool_size=DEFAULT_POOL_SIZE,
+        country='GB',
+        cache=None,
+        retry_policy=None,
+        timeout=DEFAULT_TIMEOUT,
+        rate_limiter=None,
+        scheduler=None
+    ):
+        if credentials is None:
+            credentials = default_credential_database()
+        if isinstance(credentials, SQLiteCredentialDatabase):
+            credentials = credentials.store
+        self._credentials_for = credentials
+        self._max_identities = max_identities
+        self._country = country
+        self._cache = cache
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._timeout = timeout
+        self._rate_limiter = rate_limiter if rate_limiter is not None else default_rate_limiter()
+        self._scheduler = scheduler if scheduler is not None else RequestScheduler(max_concurrency=pool_size)
+        self._single_flight = SingleFlight()
+
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+        self._lock = threading.Lock()
+        self._identities = OrderedDict()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._identities)
+
+    def __contains__(self, identity):
+        with self._lock:
+            return identity in self._identities
+
+    def identities(self):
+        with self._lock:
+            return list(self._identities.keys())
+
+    def get(self, identity):
+        '''
+        Returns the Kamereon client for `identity`, creating it if need be.
+        '''
+        with self._lock:
+            kamereon = self._identities.get(identity)
+            if kamereon is not None:
+                self._identities.move_to_end(identity)
+                return kamereon
+
+        # Opening a credential store may hit the disk, so do it unlocked.
+        kamereon = self._create(identity)
+
+        with self._lock:
+            # Another thread may have beaten us to it
+            kamereon = self._identities.setdefault(identity, kamereon)
+            self._identities.move_to_end(identity)
+            while len(self._identities) > self._max_identities:
+                evicted, _ = self._identities.popitem(last=False)
+                _log.debug('Evicted idle identity {}'.format(evicted))
+            return kamereon
+
+    __getitem__ = get
+
+    def _create(self, identity):
+        credentials = self._credentials_for(identity)
+        gigya = Gigya(
+            credentials=credentials,
+            retry_policy=self._retry_policy,
+            timeout=self._timeout,
+            rate_limiter=self._rate_limiter,
+            session=self._session
+        )
+        return Kamereon(
+            credentials=credentials,
+            gigya=gigya,
+            country=self._country,
+            cache=self._cache,
+            single_flight=self._single_flight,
+            retry_policy=self._retry_policy,
+            timeout=self._timeout,
+            rate_limiter=self._rate_limiter,
+            scheduler=self._scheduler,
+            session=self._session
+        )
+
+    def vehicle(self, identity, vin):
+        return Vehicle(vin, self.get(identity))
+
+    def evict(self, identity):
+        with self._lock:
+            self._identities.pop(identity, None)
+
+    def login(self, identity, user, password):
+        '''
+        Logs `identity` in to My Renault and resolves its Kamereon account,
+        returning its Kamereon client.
+        '''
+        kamereon = self.get(identity)
+        kamereon._gigya.login(user, password)
+        kamereon._gigya.account_info()
+        kamereon.get_account_id()
+        return kamereon
+
+    def login_many(self, logins, concurrency=DEFAULT_LOGIN_CONCURRENCY):
+        '''
+        Logs in many identities at once, given (identity, user, password)
+        tuples. Returns an OrderedDict mapping each identity to the
+        exception its login raised, or None if it succeeded.
+        '''
+        logins = list(logins)
+        results = OrderedDict((identity, None) for identity, _, _ in logins)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {
+                executor.submit(self.login, identity, user, password): identity
+                for identity, user, password in logins
+            }
+            for future in concurrent.futures.as_completed(futures):
+                error = future.exception()
+                if error:
+                    _log.debug('Failed to log in {}: {}'.format(futures[future], error))
+                results[futures[future]] = error
+
+        return results
+
+    def close(self):
+        with self._lock:
+            self._identities.clear()
+        self._session.close()
@@ -0,0 +1,62 @@
+import asyncio
+import concurrent.futures
+import copy
+import threading
+
+
+class SingleFlight(object):
+    '''
+    Coalesces concurrent identical calls: while a call for a key is in
+    flight, other threads calling with the same key wait for it and share its
+    result (or exception) instead of making their own.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self._calls[key] = future
+
+        if not leader:
+            # Callers are free to modify what they get back, so each waiter
+            # needs its own copy.
+            return copy.deepcopy(future.result())
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight(object):
+    '''
+    asyncio equivalent of SingleFlight, for use within a single event loop.
+    '''
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func, *args, **kwargs):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+            # Shield the shared task so that one waiter being cancelled
+            # doesn't cancel it for everyone else.
+            return await asyncio.shield(task)
+
+        return copy.deepcopy(await asyncio.shield(task))
@@ -0,0 +1,47 @@
+from enum import Enum
+
+import itertools
+
+
+# How a charge or HVAC session that went well ends; anything else is an error
+OK_END_STATUSES = ('ok',)
+
+
+# Serious metaprogramming follows:
+# https://www.notinventedhere.org/articles/python/how-to-use-strings-as-name-aliases-in-python-enums.html
+
+
+_CHARGE_STATES = {
+    0.0: ['Not charging', 'NOT_IN_CHARGE'],
+    0.1: ['Waiting for planned charge', 'WAITING_FOR_PLANNED_CHARGE'],
+    0.2: ['Charge ended', 'CHARGE_ENDED'],
+    0.3: ['Waiting for current charge', 'WAITING_FOR_CURRENT_CHARGE'],
+    0.4: ['Energy flap opened', 'ENERGY_FLAP_OPENED'],
+    1.0: ['Charging', 'CHARGE_IN_PROGRESS'],
+    # This next is more accurately "not charging" (<= ZE40) or "error" (ZE50).
+    # But I don't want to include 'error' in the output text because people will
+    # think that it's an error in Pyze when their ZE40 isn't plugged in...
+    -1.0: ['Not charging or plugged in', 'CHARGE_ERROR'],
+    -1.1: ['Not available', 'NOT_AVAILABLE']
+}
+
+ChargeState = Enum(
+    value='ChargeState',
+    names=itertools.chain.from_iterable(
+        itertools.product(v, [k]) for k, v in _CHARGE_STATES.items()
+    )
+)
+
+_PLUG_STATES = {
+    0: ['Unplugged', 'UNPLUGGED'],
+    1: ['Plugged in', 'PLUGGED'],
+    -1: ['Plug error', 'PLUG_ERROR'],
+    -2147483648: ['Not available', 'NOT_AVAILABLE']
+}
+
+PlugState = Enum(
+    value='PlugState',
+    names=itertools.chain.from_iterable(
+        itertools.product(v, [k]) for k, v in _PLUG_STATES.items()
+    )
+)
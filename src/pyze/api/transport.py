@@ -0,0 +1,138 @@
+from email.utils import parsedate_to_datetime
+
+import contextlib
+import datetime
+import logging
+import random
+import requests
+import time
+
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 30)
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+_log = logging.getLogger('pyze.api.transport')
+
+
+class RetryPolicy(object):
+    '''
+    Decides whether and when to retry a failed request.
+
+    Delays grow exponentially from `backoff_factor` up to `max_backoff`
+    seconds, with full jitter. A Retry-After header on the response is
+    honoured if it asks for no more than `max_retry_after` seconds; if it
+    asks for longer, we give up rather than stall.
+    '''
+
+    def __init__(
+        self,
+        total=3,
+        backoff_factor=0.5,
+        max_backoff=30,
+        jitter=True,
+        statuses=RETRY_STATUSES,
+        respect_retry_after=True,
+        max_retry_after=120
+    ):
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = statuses
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def backoff(self, attempt):
+        delay = min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def delay_for(self, attempt, status=None, headers=None):
+        '''
+        Returns the number of seconds to wait before retrying after the
+        given (zero-based) attempt failed, or None if we shouldn't retry.
+        An attempt with no status failed to get a response at all.
+        '''
+        if attempt >= self.total:
+            return None
+        if status is not None and status not in self.statuses:
+            return None
+
+        if self.respect_retry_after and headers:
+            retry_after = parse_retry_after(headers.get('Retry-After'))
+            if retry_after is not None:
+                if retry_after > self.max_retry_after:
+                    return None
+                return retry_after
+
+        return self.backoff(attempt)
+
+
+NO_RETRIES = RetryPolicy(total=0)
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = datetime.datetime.now(when.tzinfo)
+    return max(0, (when - now).total_seconds())
+
+
+def is_retryable(method, retryable=None):
+    if retryable is None:
+        return method.upper() in IDEMPOTENT_METHODS
+    return retryable
+
+
+def send(session, method, url, retry_policy=None, timeout=DEFAULT_TIMEOUT, retryable=None, admit=None, **kwargs):
+    '''
+    Makes a request with `session`, retrying according to `retry_policy`.
+    Only idempotent methods are retried unless `retryable` says otherwise.
+    If given, `admit` is called before each attempt and must return a
+    context manager, held for the duration of the attempt, that blocks on
+    entry until the attempt is allowed to go ahead.
+    Returns the last response received, whatever its status.
+    '''
+    policy = retry_policy if retry_policy is not None and is_retryable(method, retryable) else NO_RETRIES
+    attempt = 0
+
+    while True:
+        response = None
+        with admit() if admit else contextlib.nullcontext():
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = policy.delay_for(attempt)
+                if delay is None:
+                    raise
+                _log.debug('{} {} failed ({}), retrying in {:.2f}s'.format(method, url, e, delay))
+
+        if response is not None:
+            delay = policy.delay_for(attempt, response.status_code, response.headers)
+            if response.ok or delay is None:
+                return response
+            _log.debug('{} {} returned {}, retrying in {:.2f}s'.format(method, url, response.status_code, delay))
+
+        time.sleep(delay)
+        attempt += 1
+
+
+@contextlib.contextmanager
+def throttled(throttle):
+    '''
+    Adapts a blocking `throttle` function into an `admit` context manager.
+    '''
+    throttle()
+    yield
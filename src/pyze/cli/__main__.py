@@ -1,75 +1,116 @@
+from collections import OrderedDict
+
 import argparse
 import importlib
 import logging
-import requests
 import sys
 
-from .ac import run as ac
-from .login import run as login
-from .schedule import run as schedule
-from .status import run as status
-from .vehicles import run as vehicles
-
-COMMAND_MODULES = [
-    'ac',
-    'ac-history',
-    'ac-stats',
-    'charge-history',
-    'charge-mode',
-    'charge-start',
-    'charge-stats',
-    'login',
-    'schedule',
-    'set-account',
-    'status',
-    'vehicles'
-]
-
-
-def argument_parser():
+
+# Help text for each command, so that the command's module (and everything it
+# imports) is only loaded when that command is run.
+COMMANDS = OrderedDict([
+    ('ac', 'Activate your vehicle\'s preconditioning, now or in the future.'),
+    ('ac-history', 'Show preconditioning history for your vehicle.'),
+    ('ac-stats', 'Show preconditioning statistics for your vehicle.'),
+    ('batch', 'Run many commands, one per line, from a file or standard input, printing results as JSON lines.'),
+    ('charge-history', 'Show charge history for your vehicle.'),
+    ('charge-mode', 'Set charge mode for your vehicle.'),
+    ('charge-start', 'Begin charging immediately (if your vehicle is plugged in).'),
+    ('charge-stats', 'Show charging statistics for your vehicle.'),
+    ('daemon', 'Run in the background, keeping sessions and caches warm for other pyze commands.'),
+    ('login', 'Log in to your MY Renault account.'),
+    ('schedule', 'Show or edit your vehicle\'s charge schedule.'),
+    ('set-account', 'Set the Kamereon account ID to use. Useful if there are multiple accounts to choose from.'),
+    ('status', 'Show the current status of your vehicle.'),
+    ('vehicles', 'List the vehicles on your account.')
+])
+DEFAULT_COMMAND = 'status'
+# Commands never forwarded to a running daemon
+LOCAL_COMMANDS = ['batch', 'daemon', 'login']
+
+
+def argument_parser(command=None):
+    '''
+    Builds the argument parser. Every command is listed, but only `command`
+    is imported and has its arguments configured.
+    '''
     parser = argparse.ArgumentParser()
 
     subparsers = parser.add_subparsers(dest='subparser', metavar='COMMAND')
 
-    for module_name in COMMAND_MODULES:
-        module = importlib.import_module('.{}'.format(module_name), __package__)
-
-        if hasattr(module, 'help_text'):
-            help_text = module.help_text
-        else:
-            help_text = None
-
-        subparser = subparsers.add_parser(module_name, description=help_text, help=help_text)
+    for name, help_text in COMMANDS.items():
+        subparser = subparsers.add_parser(name, description=help_text, help=help_text)
 
-        if hasattr(module, 'configure_parser'):
-            module.configure_parser(subparser)
-        subparser.set_defaults(func=module.run)
+        if name == command:
+            module = importlib.import_module('.{}'.format(name), __package__)
+            if hasattr(module, 'configure_parser'):
+                module.configure_parser(subparser)
+            subparser.set_defaults(func=module.run)
 
     parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--no-daemon', action='store_true', help='Don\'t use a running `pyze daemon`')
 
     return parser
 
 
+def _command_name(args):
+    # Only options precede the command, and none of them take values
+    for arg in args:
+        if not arg.startswith('-'):
+            return arg
+    return None
+
+
+def _with_default_command(args):
+    command = _command_name(args)
+    if command is None and '-h' not in args and '--help' not in args:
+        command = DEFAULT_COMMAND
+        args = args + [command]
+    return command, args
+
+
 def main(args=None):
 
     if args is None:
         args = sys.argv[1:]
 
-    parser = argument_parser()
+    command, args = _with_default_command(args)
+
+    # No command means `pyze --help`, which is quicker to answer ourselves
+    if command is not None and command not in LOCAL_COMMANDS and '--no-daemon' not in args and '--debug' not in args:
+        from .daemon import forward
+        exit_code = forward(args)
+        if exit_code is not None:
+            if exit_code:
+                sys.exit(exit_code)
+            return
+
+    execute(args)
+
+
+def execute(args):
+    '''
+    Runs the command given by `args` in this process.
+    '''
+    command, args = _with_default_command(args)
+
+    parser = argument_parser(command)
 
     parsed_args = parser.parse_args(args)
 
     if parsed_args.debug:
         _set_debug()
 
-    if not parsed_args.subparser:
-        parsed_args = parser.parse_args(args + ['status'])
-
     try:
         parsed_args.func(parsed_args)
-    except requests.RequestException as e:
-        print("Error communicating with Renault API!")
-        print(e.response.text)
+    except Exception as e:
+        # If requests hasn't been imported, this can't be one of its errors
+        requests = sys.modules.get('requests')
+        if requests and isinstance(e, requests.RequestException):
+            print("Error communicating with Renault API!")
+            print(e.response.text)
+        else:
+            raise
 
 
 def _set_debug():
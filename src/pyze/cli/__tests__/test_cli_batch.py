@@ -0,0 +1,56 @@
+from pyze.cli import batch
+from pyze.cli.__main__ import execute
+
+import json
+import os
+import pytest
+import queue
+import threading
+
+
+def test_batch(tmp_path, capsys):
+    commands = tmp_path / 'commands.txt'
+    commands.write_text(
+        '# Comments and blank lines are skipped\n'
+        '\n'
+        'vehicles --help\n'
+        'bogus\n'
+        'login\n'
+        'set-account --help\n'
+    )
+
+    execute(['batch', '-j', '2', str(commands)])
+
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    assert [(r['line'], r['exit']) for r in results] == [(3, 0), (4, 2), (5, 2), (6, 0)]
+    assert 'List the vehicles on your account.' in results[0]['stdout']
+    assert 'invalid choice' in results[1]['stderr']
+    assert 'account_id' in results[3]['stdout']
+
+
+def test_results_printed_before_input_ends(tmp_path, monkeypatch):
+    emitted = queue.Queue()
+    monkeypatch.setattr(batch, '_emit', emitted.put)
+    fifo = str(tmp_path / 'commands')
+    os.mkfifo(fifo)
+
+    runner = threading.Thread(target=execute, args=(['batch', fifo],))
+    runner.start()
+    with open(fifo, 'w') as commands:
+        commands.write('vehicles --help\n')
+        commands.flush()
+        # Still reading input, but the first result is already out
+        assert emitted.get(timeout=10)['line'] == 1
+        commands.write('bogus\n')
+    runner.join()
+
+    assert emitted.get(timeout=1)['line'] == 2
+
+
+def test_parallel_must_be_positive(capsys):
+    with pytest.raises(SystemExit) as e:
+        execute(['batch', '-j', '0'])
+
+    assert e.value.code == 2
+    assert 'must be at least 1' in capsys.readouterr().err
@@ -0,0 +1,99 @@
+from argparse import Namespace
+from pyze.api.credentials import BasicCredentialStore
+from pyze.cli.common import get_kamereon, get_vehicle, print_records, print_table, resolve_vin, set_response_cache
+
+import pytest
+
+
+VEHICLES = [
+    {'vin': 'VIN1', 'vehicleDetails': {'registrationNumber': 'AB12CDE'}},
+    {'vin': 'VIN2', 'vehicleDetails': {'registrationNumber': 'XY34ZZZ'}}
+]
+
+
+def test_resolve_vin():
+    assert resolve_vin(VEHICLES) == 'VIN1'
+    assert resolve_vin(VEHICLES, vin='VIN2') == 'VIN2'
+    assert resolve_vin(VEHICLES, reg='xy34 zzz') == 'VIN2'
+
+    with pytest.raises(RuntimeError):
+        resolve_vin(VEHICLES, vin='VIN3')
+    with pytest.raises(RuntimeError):
+        resolve_vin(VEHICLES, reg='AA11AAA')
+    with pytest.raises(RuntimeError):
+        resolve_vin([])
+
+
+def test_print_table(capsys):
+    print_table(iter([['2020-01-01 10:00:00', 1.5, 'ok'], ['x', 22, None]]), ['Charge start', 'Power', 'Status'], [19, 0, 0])
+    assert capsys.readouterr().out.splitlines() == [
+        'Charge start         Power  Status',
+        '-------------------  -----  ------',
+        '2020-01-01 10:00:00    1.5  ok',
+        'x                       22'
+    ]
+
+
+def test_print_records(capsys):
+    records = [{'start': 'a', 'status': 'ok', 'extra': 1}, {'start': 'b', 'status': 'error'}]
+    print_records(records, {'start': 'Start', 'status': 'Status'}, {'start': 5})
+    assert capsys.readouterr().out.splitlines() == [
+        'Start  Status  extra',
+        '-----  ------  -----',
+        'a      ok          1',
+        'b      error'
+    ]
+
+    print_records([], {'start': 'Start', 'status': 'Status'}, {'start': 5})
+    assert capsys.readouterr().out.splitlines()[0] == 'Start  Status'
+
+
+class OfflineKamereon(object):
+    _root_url = 'https://kamereon.example'
+
+    def __init__(self, stored):
+        self._stored = stored
+
+    def get_stored_vehicles(self):
+        return self._stored
+
+    def get_vehicles(self):
+        raise AssertionError('Should not make requests offline')
+
+
+def test_get_vehicle_offline(monkeypatch):
+    def offline(vin=None, reg=None):
+        return Namespace(offline=True, vin=vin, reg=reg)
+
+    monkeypatch.setattr('pyze.cli.common.get_kamereon', lambda: OfflineKamereon({'vehicleLinks': VEHICLES}))
+    assert get_vehicle(offline())._vin == 'VIN1'
+    assert get_vehicle(offline(reg='XY34ZZZ'))._vin == 'VIN2'
+    assert get_vehicle(offline(vin='VIN3'))._vin == 'VIN3'
+
+    monkeypatch.setattr('pyze.cli.common.get_kamereon', lambda: OfflineKamereon(None))
+    with pytest.raises(RuntimeError):
+        get_vehicle(offline())
+
+
+def test_kamereon_replaced_after_login_or_account_change(monkeypatch):
+    credentials = BasicCredentialStore()
+    credentials['gigya'] = ('login-token', None)
+
+    class StoredKamereon(object):
+        def __init__(self, cache=None):
+            self._credentials = credentials
+
+    monkeypatch.setattr('pyze.cli.common.Kamereon', StoredKamereon)
+    set_response_cache(None)
+
+    first = get_kamereon()
+    assert get_kamereon() is first
+
+    # e.g. `pyze set-account`, run without the daemon
+    credentials['kamereon-account'] = ('other-account', None)
+    second = get_kamereon()
+    assert second is not first
+
+    credentials['gigya'] = ('new-login-token', None)
+    assert get_kamereon() is not second
+    set_response_cache(None)
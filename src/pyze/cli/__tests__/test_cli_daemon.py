@@ -0,0 +1,68 @@
+from pyze.cli.daemon import DaemonServer, forward
+
+import json
+import pytest
+import socket
+import tempfile
+import threading
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are limited to ~100 characters, which tmp_path can exceed
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield tmp_dir + '/pyze.sock'
+
+
+@pytest.fixture
+def daemon(socket_path):
+    server = DaemonServer(socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_forwarded_command_output(capsys, daemon, socket_path):
+    assert forward(['vehicles', '--help'], socket_path) == 0
+    assert 'List the vehicles on your account.' in capsys.readouterr().out
+
+    assert forward(['bogus'], socket_path) == 2
+    assert 'invalid choice' in capsys.readouterr().err
+
+
+def test_refused_if_environment_differs(daemon, socket_path):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(socket_path)
+    with client, client.makefile('rw') as conn:
+        conn.write(json.dumps({'args': ['status'], 'env': {'KAMEREON_ACCOUNT_ID': 'another-account'}}) + '\n')
+        conn.flush()
+        assert 'refused' in json.loads(conn.readline())
+
+
+def test_not_forwarded_without_daemon(socket_path):
+    assert forward(['status'], socket_path) is None
+
+    # A socket left behind by a daemon that's gone
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    assert forward(['status'], socket_path) is None
+
+
+def test_refuses_to_replace_running_daemon(capsys, daemon, socket_path):
+    with pytest.raises(RuntimeError):
+        DaemonServer(socket_path)
+
+    # The running daemon still has its socket
+    assert forward(['vehicles', '--help'], socket_path) == 0
+
+
+def test_replaces_stale_socket(socket_path):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+
+    server = DaemonServer(socket_path)
+    server.server_close()
@@ -0,0 +1,33 @@
+from pyze.cli.__main__ import COMMANDS, argument_parser, main
+
+import os
+import pytest
+
+
+def test_every_command_registered():
+    cli_dir = os.path.dirname(os.path.dirname(__file__))
+    modules = {
+        f[:-3] for f in os.listdir(cli_dir)
+        if f.endswith('.py') and f not in ('__init__.py', '__main__.py', 'common.py')
+    }
+    assert modules == set(COMMANDS.keys())
+
+
+def test_only_chosen_command_configured():
+    parsed_args = argument_parser('set-account').parse_args(['set-account', 'abc123'])
+    assert parsed_args.account_id == 'abc123'
+    assert parsed_args.func.__module__ == 'pyze.cli.set-account'
+
+    assert not hasattr(argument_parser().parse_args(['set-account']), 'func')
+
+
+def test_bare_help_not_forwarded(capsys, monkeypatch):
+    def forward(args):
+        raise AssertionError('Forwarded to the daemon')
+
+    monkeypatch.setattr('pyze.cli.daemon.forward', forward)
+    with pytest.raises(SystemExit) as e:
+        main(['--help'])
+
+    assert e.value.code == 0
+    assert 'COMMAND' in capsys.readouterr().out
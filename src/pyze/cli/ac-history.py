@@ -1,14 +1,23 @@
-from .common import add_history_args, add_vehicle_args, get_vehicle
+from .common import add_history_args, add_history_store_args, add_vehicle_args, get_history_store, get_vehicle, print_records
+from collections import OrderedDict
 from datetime import datetime
-from tabulate import tabulate
 
 
-help_text = 'Show preconditioning history for your vehicle.'
+HEADERS = OrderedDict([
+    ('hvacSessionRequestDate', 'Request made'),
+    ('hvacSessionStartDate', 'Start time'),
+    ('hvacSessionEndStatus', 'Status')
+])
+WIDTHS = {
+    'hvacSessionRequestDate': 24,
+    'hvacSessionStartDate': 24
+}
 
 
 def configure_parser(parser):
     add_vehicle_args(parser)
     add_history_args(parser)
+    add_history_store_args(parser)
 
 
 def run(parsed_args):
@@ -25,13 +34,11 @@ def run(parsed_args):
     else:
         to_date = now
 
-    print(
-        tabulate(
-            v.hvac_history(from_date, to_date),
-            headers={
-                'hvacSessionRequestDate': 'Request made',
-                'hvacSessionStartDate': 'Start time',
-                'hvacSessionEndStatus': 'Status'
-            }
-        )
-    )
+    store = get_history_store(parsed_args, v, 'hvac-sessions', from_date)
+    if store:
+        records = store.hvac_history(v._vin, from_date, to_date)
+    else:
+        records = v.iter_hvac_history(from_date, to_date)
+
+    # Printed as each month arrives, with whatever fields the server sends
+    print_records(records, HEADERS, WIDTHS)
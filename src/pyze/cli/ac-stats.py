@@ -1,15 +1,14 @@
-from .common import add_history_args, add_vehicle_args, get_vehicle
+from .common import add_history_args, add_history_store_args, add_vehicle_args, get_history_store, get_vehicle
 from datetime import datetime
 from tabulate import tabulate
 
 
-help_text = 'Show preconditioning statistics for your vehicle.'
-
-
 def configure_parser(parser):
     add_vehicle_args(parser)
     add_history_args(parser)
-    parser.add_argument('--period', help='Period over which to aggregate', choices=['day', 'month'], default='month')
+    add_history_store_args(parser)
+    parser.add_argument('--period', help='Period over which to aggregate', choices=['day', 'week', 'month'], default='month')
+    parser.add_argument('--local', action='store_true', help='Total up sessions in the local history store instead of asking the server (implied by --period week)')
 
 
 def run(parsed_args):
@@ -26,11 +25,23 @@ def run(parsed_args):
     else:
         to_date = now
 
+    if parsed_args.local or parsed_args.period == 'week':
+        # The server doesn't do weeks, so we add them up ourselves
+        store = get_history_store(parsed_args, v, 'hvac-sessions', from_date, local=True)
+        records = store.hvac_rollups(v._vin, from_date, to_date, parsed_args.period)
+    else:
+        store = get_history_store(parsed_args, v, 'hvac-history/' + parsed_args.period, from_date)
+        if store:
+            records = store.hvac_statistics(v._vin, from_date, to_date, parsed_args.period)
+        else:
+            records = v.hvac_statistics(from_date, to_date, parsed_args.period)
+
     print(
         tabulate(
-            v.hvac_statistics(from_date, to_date, parsed_args.period),
+            records,
             headers={
                 'day': 'Day',
+                'week': 'Week',
                 'month': 'Month',
                 'totalHvacSessionsNumber': 'Total',
                 'totalHvacSessionsErrors': 'Errors'
@@ -1,10 +1,5 @@
 from pyze.api import Kamereon, Vehicle
-from .common import add_vehicle_args, get_vehicle
-
-import dateparser
-
-
-help_text = 'Activate your vehicle\'s preconditioning, now or in the future.'
+from .common import add_vehicle_args, get_vehicle, parse_date
 
 
 def configure_parser(parser):
@@ -21,7 +16,7 @@ def run(parsed_args):
         v.cancel_ac()
     else:
         if parsed_args.at:
-            parsed_start_time = dateparser.parse(parsed_args.at)
+            parsed_start_time = parse_date(parsed_args.at)
         else:
             parsed_start_time = None
 
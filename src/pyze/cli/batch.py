@@ -0,0 +1,106 @@
+from .common import set_response_cache
+from .daemon import ThreadLocalStream, execute_captured
+from pyze.api import ResponseCache
+
+import argparse
+import concurrent.futures
+import io
+import json
+import queue
+import shlex
+import sys
+import threading
+
+
+DEFAULT_PARALLEL = 4
+# These can't sensibly be run as part of a batch
+UNBATCHABLE_COMMANDS = ['batch', 'daemon', 'login']
+
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('must be at least 1')
+    return number
+
+
+def configure_parser(parser):
+    parser.add_argument('file', nargs='?', type=argparse.FileType('r'), default=sys.stdin, help='File of commands to run, one per line (default standard input)')
+    parser.add_argument('-j', '--parallel', type=_positive_int, default=DEFAULT_PARALLEL, help='Number of commands to run at once (default {})'.format(DEFAULT_PARALLEL))
+
+
+def run(parsed_args):
+    # Commands share one Kamereon, so share its responses too
+    set_response_cache(ResponseCache())
+
+    stdout = ThreadLocalStream(sys.stdout)
+    stderr = ThreadLocalStream(sys.stderr)
+    sys.stdout, sys.stderr = stdout, stderr
+
+    # Results are printed in input order, so only read ahead as far as is
+    # useful to keep every worker busy.
+    pending = queue.Queue(maxsize=2 * parsed_args.parallel)
+    errors = []
+    emitter = threading.Thread(target=_emit_in_order, args=(pending, errors))
+    emitter.start()
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=parsed_args.parallel) as executor:
+            for line_number, line in _commands(parsed_args.file):
+                pending.put(executor.submit(_run_line, line_number, line, stdout, stderr))
+    finally:
+        pending.put(None)
+        emitter.join()
+        sys.stdout, sys.stderr = stdout._original, stderr._original
+        if parsed_args.file is not sys.stdin:
+            parsed_args.file.close()
+
+    if errors:
+        raise errors[0]
+
+
+def _commands(lines):
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line_number, line
+
+
+def _run_line(line_number, line, stdout, stderr):
+    result = {
+        'line': line_number,
+        'command': line
+    }
+
+    try:
+        args = shlex.split(line)
+    except ValueError as e:
+        return dict(result, exit=2, stdout='', stderr='{}\n'.format(e))
+
+    if args and args[0] in UNBATCHABLE_COMMANDS:
+        return dict(result, exit=2, stdout='', stderr='{} can\'t be run in a batch\n'.format(args[0]))
+
+    out = io.StringIO()
+    err = io.StringIO()
+    exit_code = execute_captured(args, stdout, stderr, out.write, err.write)
+    return dict(result, exit=exit_code, stdout=out.getvalue(), stderr=err.getvalue())
+
+
+def _emit_in_order(pending, errors):
+    # Runs in its own thread, so that each result is printed as soon as it
+    # and those before it are ready, without waiting for more input.
+    while True:
+        future = pending.get()
+        if future is None:
+            return
+        try:
+            if not errors:
+                _emit(future.result())
+        except Exception as e:
+            # Keep taking results, so that the reader isn't left blocked
+            errors.append(e)
+
+
+def _emit(result):
+    sys.stdout.write(json.dumps(result) + '\n')
+    sys.stdout.flush()
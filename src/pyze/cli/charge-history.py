@@ -1,19 +1,17 @@
-from .common import add_history_args, add_vehicle_args, format_duration_minutes, get_vehicle
+from .common import add_history_args, add_history_store_args, add_vehicle_args, format_duration_minutes, get_history_store, get_vehicle, print_table
 from datetime import datetime
-from tabulate import tabulate
 
 import dateutil.parser
 import dateutil.tz
 
 
-help_text = 'Show charge history for your vehicle.'
-
 DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 
 
 def configure_parser(parser):
     add_vehicle_args(parser)
     add_history_args(parser)
+    add_history_store_args(parser)
 
 
 def run(parsed_args):
@@ -31,20 +29,26 @@ def run(parsed_args):
     else:
         to_date = now
 
-    print(
-        tabulate(
-            [_format_charge_history(h) for h in v.charge_history(from_date, to_date)],
-            headers=[
-                'Charge start',
-                'Charge end',
-                'Duration',
-                'Power (kW)',
-                'Started at (%)',
-                'Charge gained (%)',
-                'Power level',
-                'Status'
-            ]
-        )
+    store = get_history_store(parsed_args, v, 'charges', from_date)
+    if store:
+        records = store.charge_history(v._vin, from_date, to_date)
+    else:
+        records = v.iter_charge_history(from_date, to_date)
+
+    # Printed as each month arrives, so long ranges start printing at once
+    print_table(
+        (_format_charge_history(h) for h in records),
+        headers=[
+            'Charge start',
+            'Charge end',
+            'Duration',
+            'Power (kW)',
+            'Started at (%)',
+            'Charge gained (%)',
+            'Power level',
+            'Status'
+        ],
+        widths=[19, 19, 8, 0, 0, 0, 0, 0]
     )
 
 
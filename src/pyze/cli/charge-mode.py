@@ -3,8 +3,6 @@ from datetime import datetime
 from pyze.api import ChargeMode
 
 
-help_text = 'Set charge mode for your vehicle.'
-
 DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 
 
@@ -1,7 +1,8 @@
 from datetime import timedelta
 from pyze.api import Kamereon, Vehicle
 
-import dateparser
+import itertools
+import threading
 
 
 def add_vehicle_args(parser):
@@ -14,35 +15,153 @@ def add_history_args(parser):
     parser.add_argument('--to', type=parse_date, help='Date to finish showing history at (cannot be in the future)')
 
 
+def add_history_store_args(parser):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--sync', action='store_true', help='Bring the local history store ($PYZE_HISTORY_STORE) up to date, then show history from it')
+    group.add_argument('--offline', action='store_true', help='Show history from the local history store without contacting the API')
+
+
+def get_history_store(parsed_args, vehicle, dataset, since, local=False):
+    '''
+    Returns the HistoryStore to show `dataset` from, synced first if asked,
+    or None if we should ask the API. If `local`, the store is always used,
+    and synced unless we're offline.
+    '''
+    if not (parsed_args.sync or parsed_args.offline or local):
+        return None
+
+    from pyze.api.historystore import HistoryStore
+    store = HistoryStore()
+    if parsed_args.sync or (local and not parsed_args.offline):
+        store.sync(vehicle, [dataset], since=since)
+    return store
+
+
 def parse_date(raw_date):
+    # dateparser is slow to import, and most commands never need it
+    import dateparser
     return dateparser.parse(raw_date)
 
 
-def get_vehicle(parsed_args):
-    k = Kamereon()
+_kamereon = None
+_kamereon_identity = None
+_kamereon_lock = threading.Lock()
+_response_cache = None
 
-    vehicles = k.get_vehicles().get('vehicleLinks')
-    if parsed_args.vin:
-        possible_vehicles = [v for v in vehicles if v['vin'] == parsed_args.vin]
-        if len(possible_vehicles) == 0:
-            raise RuntimeError('Specified VIN {} not found! Use `pyze vehicles` to list available vehicles.'.format(parsed_args.vin))
 
-        vin = possible_vehicles[0]['vin']
+def set_response_cache(cache):
+    '''
+    Sets a ResponseCache for commands to use, e.g. when several are run by
+    one process.
+    '''
+    global _kamereon, _response_cache
+    with _kamereon_lock:
+        _response_cache = cache
+        _kamereon = None
 
-    elif parsed_args.reg:
-        possible_vehicles = [v for v in vehicles if v['vehicleDetails']['registrationNumber'] == parsed_args.vin.replace(' ', '').upper()][0]
 
-        if len(possible_vehicles) == 0:
-            raise RuntimeError('Specified registration plate {} not found! Use `pyze vehicles` to list available vehicles.'.format(parsed_args.reg))
+def get_kamereon():
+    '''
+    Returns a Kamereon shared by every command run in this process. It's
+    replaced if someone has since logged in or chosen another account
+    (perhaps in another process).
+    '''
+    global _kamereon, _kamereon_identity
+    with _kamereon_lock:
+        if _kamereon is not None and _identity(_kamereon._credentials) == _kamereon_identity:
+            return _kamereon
+        _kamereon = Kamereon(cache=_response_cache)
+        _kamereon_identity = _identity(_kamereon._credentials)
+        return _kamereon
 
-        vin = possible_vehicles[0]['vin']
+
+def _identity(credentials):
+    return credentials.get('gigya'), credentials.get('kamereon-account')
+
+
+def get_vehicle(parsed_args):
+    # The vehicle list is remembered between runs, so with a VIN or
+    # registration we've seen before this needn't make any requests.
+    k = get_kamereon()
+    if getattr(parsed_args, 'offline', False):
+        # Only what we already know: no requests, not even in the background
+        if parsed_args.vin:
+            return Vehicle(parsed_args.vin, k)
+        stored = k.get_stored_vehicles()
+        if stored is None:
+            raise RuntimeError('No vehicles known for this account. Use --vin, or run once without --offline.')
+        return Vehicle(resolve_vin(stored.get('vehicleLinks', []), reg=parsed_args.reg), k)
+    vehicles = k.get_vehicles().get('vehicleLinks', [])
+    return Vehicle(resolve_vin(vehicles, parsed_args.vin, parsed_args.reg), k)
+
+
+def resolve_vin(vehicles, vin=None, reg=None):
+    if vin:
+        possible_vehicles = [v for v in vehicles if v['vin'] == vin]
+        if len(possible_vehicles) == 0:
+            raise RuntimeError('Specified VIN {} not found! Use `pyze vehicles` to list available vehicles.'.format(vin))
+
+    elif reg:
+        normalised_reg = reg.replace(' ', '').upper()
+        possible_vehicles = [
+            v for v in vehicles
+            if v.get('vehicleDetails', {}).get('registrationNumber', '').replace(' ', '').upper() == normalised_reg
+        ]
+        if len(possible_vehicles) == 0:
+            raise RuntimeError('Specified registration plate {} not found! Use `pyze vehicles` to list available vehicles.'.format(reg))
 
     elif len(vehicles) == 0:
         raise RuntimeError('No vehicles found for this account!')
     else:
-        vin = vehicles[0]['vin']
-
-    return Vehicle(vin, k)
+        possible_vehicles = vehicles
+
+    return possible_vehicles[0]['vin']
+
+
+def print_table(rows, headers, widths):
+    '''
+    Prints `rows` as a table, in the style of tabulate's, as they arrive.
+    As we can't look at every row first, each column is `widths` characters
+    wide (or the width of its header, if wider).
+    '''
+    widths = [max(len(header), width) for header, width in zip(headers, widths)]
+    print('  '.join(header.ljust(width) for header, width in zip(headers, widths)).rstrip())
+    print('  '.join('-' * width for width in widths))
+    for row in rows:
+        print(
+            '  '.join(
+                _format_cell(value, width) for value, width in zip(row, widths)
+            ).rstrip(),
+            flush=True
+        )
+
+
+def print_records(records, headers, widths):
+    '''
+    Prints `records` (dicts) with print_table, with a column for each key
+    of the first record, as tabulate would. `headers` and `widths` give
+    the header and width of known keys; any others are headed with the key
+    itself.
+    '''
+    records = iter(records)
+    first = next(records, None)
+    keys = list(first.keys()) if first is not None else list(headers.keys())
+    if first is not None:
+        records = itertools.chain([first], records)
+
+    print_table(
+        ([record.get(key) for key in keys] for record in records),
+        headers=[headers.get(key, key) for key in keys],
+        widths=[widths.get(key, 0) for key in keys]
+    )
+
+
+def _format_cell(value, width):
+    if value is None:
+        return ' ' * width
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value).rjust(width)
+    return str(value).ljust(width)
 
 
 def format_duration_minutes(mins):
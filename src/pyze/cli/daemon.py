@@ -0,0 +1,213 @@
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+
+
+# Environment variables that change what a command does, which must match
+# between client and daemon for the daemon to run the command.
+ENV_PREFIXES = ('PYZE_', 'KAMEREON_', 'GIGYA_')
+_log = logging.getLogger('pyze.cli.daemon')
+
+
+def default_socket_path():
+    return os.environ.get('PYZE_DAEMON_SOCKET', os.path.expanduser('~/.credentials/pyze.sock'))
+
+
+def _relevant_env():
+    return {
+        k: v for k, v in os.environ.items()
+        if k.startswith(ENV_PREFIXES) and k != 'PYZE_DAEMON_SOCKET'
+    }
+
+
+def configure_parser(parser):
+    parser.add_argument('--socket', default=default_socket_path(), help='Path of the socket to listen on (default $PYZE_DAEMON_SOCKET or ~/.credentials/pyze.sock)')
+
+
+def run(parsed_args):
+    from .common import set_response_cache
+    from pyze.api import ResponseCache
+
+    # Shared by every command we run, so repeated requests are served
+    # without going upstream.
+    set_response_cache(ResponseCache())
+
+    server = DaemonServer(parsed_args.socket)
+    # Clean up the socket when asked to stop
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print('Listening on {}'.format(parsed_args.socket))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def forward(args, socket_path=None):
+    '''
+    Runs a command in a running daemon, if there is one, copying its output
+    to ours. Returns the command's exit code, or None if it wasn't run (in
+    which case we should run it ourselves).
+    '''
+    socket_path = socket_path or default_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        # Left behind by a daemon that's no longer running
+        sock.close()
+        return None
+
+    with sock, sock.makefile('rw', encoding='utf-8') as conn:
+        conn.write(json.dumps({'args': args, 'env': _relevant_env()}) + '\n')
+        conn.flush()
+
+        for line in conn:
+            message = json.loads(line)
+            if 'stdout' in message:
+                sys.stdout.write(message['stdout'])
+                sys.stdout.flush()
+            elif 'stderr' in message:
+                sys.stderr.write(message['stderr'])
+                sys.stderr.flush()
+            elif 'refused' in message:
+                _log.debug('Daemon declined to run command: {}'.format(message['refused']))
+                return None
+            elif 'exit' in message:
+                return message['exit']
+
+    # The daemon went away mid-command
+    return 1
+
+
+class ThreadLocalStream(io.TextIOBase):
+    '''
+    Stands in for sys.stdout or sys.stderr, sending output from threads
+    handling a request to that request's client and everything else to the
+    original stream.
+    '''
+
+    def __init__(self, original):
+        self._original = original
+        self._local = threading.local()
+
+    def redirect(self, write):
+        self._local.write = write
+
+    def reset(self):
+        self._local.write = None
+
+    def write(self, text):
+        write = getattr(self._local, 'write', None)
+        if write:
+            write(text)
+        else:
+            self._original.write(text)
+        return len(text)
+
+    def flush(self):
+        if not getattr(self._local, 'write', None):
+            self._original.flush()
+
+
+def execute_captured(args, stdout, stderr, write_stdout, write_stderr):
+    '''
+    Runs a command in this thread, sending whatever it writes to the
+    ThreadLocalStreams `stdout` and `stderr` to the given functions instead.
+    Returns the command's exit code.
+    '''
+    from .__main__ import execute
+
+    stdout.redirect(write_stdout)
+    stderr.redirect(write_stderr)
+    try:
+        execute(args)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception:
+        traceback.print_exc(file=stderr)
+        return 1
+    finally:
+        stdout.reset()
+        stderr.reset()
+    return 0
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # e.g. another daemon checking whether we're running
+            return
+        request = json.loads(line.decode('utf-8'))
+        if request.get('env', {}) != _relevant_env():
+            self._send(refused='environment differs')
+            return
+
+        exit_code = execute_captured(
+            request['args'],
+            self.server.stdout,
+            self.server.stderr,
+            lambda text: self._send(stdout=text),
+            lambda text: self._send(stderr=text)
+        )
+        self._send(exit=exit_code)
+
+    def _send(self, **message):
+        self.wfile.write((json.dumps(message) + '\n').encode('utf-8'))
+
+
+def _remove_stale_socket(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except FileNotFoundError:
+        return
+    except ConnectionRefusedError:
+        # Left behind by a daemon that's no longer running
+        os.unlink(socket_path)
+        return
+    finally:
+        sock.close()
+    raise RuntimeError('A pyze daemon is already listening on {}'.format(socket_path))
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path):
+        dirname = os.path.dirname(socket_path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        _remove_stale_socket(socket_path)
+        self._socket_path = socket_path
+
+        # Our clients act with our credentials, so they must be us.
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+        self.stdout = sys.stdout = ThreadLocalStream(sys.stdout)
+        self.stderr = sys.stderr = ThreadLocalStream(sys.stderr)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+        if sys.stdout is self.stdout:
+            sys.stdout = self.stdout._original
+        if sys.stderr is self.stderr:
+            sys.stderr = self.stderr._original
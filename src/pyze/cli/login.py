@@ -3,9 +3,6 @@ from pyze.api import Gigya, Kamereon
 import getpass
 
 
-help_text = 'Log in to your MY Renault account.'
-
-
 def run(args):
     email = input('Enter your My Renault email address: ')
     password = getpass.getpass('Enter your password: ')
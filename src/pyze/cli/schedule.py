@@ -4,9 +4,6 @@ from pyze.api.schedule import DAYS, ScheduledCharge, timezone_offset, apply_offs
 from tabulate import tabulate
 
 
-help_text = 'Show or edit your vehicle\'s charge schedule.'
-
-
 def configure_parser(parser):
     add_vehicle_args(parser)
 
@@ -1,7 +1,4 @@
-from pyze.api import Kamereon
-
-
-help_text = 'Set the Kamereon account ID to use. Useful if there are multiple accounts to choose from.'
+from .common import get_kamereon
 
 
 def configure_parser(parser):
@@ -9,5 +6,5 @@ def configure_parser(parser):
 
 
 def run(args):
-    k = Kamereon()
+    k = get_kamereon()
     k.set_account_id(args.account_id)
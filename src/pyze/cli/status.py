@@ -3,6 +3,7 @@ from pyze.api import ChargeState, PlugState
 from tabulate import tabulate
 
 import collections
+import concurrent.futures
 import dateutil.parser
 import dateutil.tz
 import requests
@@ -10,8 +11,6 @@ import requests
 
 KM_PER_MILE = 1.609344
 
-help_text = 'Show the current status of your vehicle.'
-
 
 def configure_parser(parser):
     add_vehicle_args(parser)
@@ -19,22 +18,32 @@ def configure_parser(parser):
     parser.add_argument('--kw', help='Interpret charge rate as kilowatt (default is watt)', action='store_const', const=1, default=1000)
 
 
-def wrap_unavailable(obj, method):
+def wrap_unavailable(snapshot, endpoint):
     wrapper = collections.defaultdict(lambda: 'Unavailable')
 
-    try:
-        original_dict = getattr(obj, method)()
-        wrapper.update(original_dict)
-    except requests.RequestException:
+    if endpoint in snapshot.results:
+        wrapper.update(snapshot.results[endpoint])
+    else:
         wrapper['_unavailable'] = True
 
     return wrapper
 
 
+def _raise_unexpected_errors(snapshot):
+    # Endpoints that are unavailable or slow are reported as such; anything
+    # else (e.g. missing credentials) is a genuine error.
+    for error in snapshot.errors.values():
+        if not isinstance(error, (requests.RequestException, concurrent.futures.TimeoutError)):
+            raise error
+
+
 def run(parsed_args):
     v = get_vehicle(parsed_args)
 
-    status = wrap_unavailable(v, 'battery_status')
+    snapshot = v.snapshot()
+    _raise_unexpected_errors(snapshot)
+
+    status = wrap_unavailable(snapshot, 'battery_status')
     # {'lastUpdateTime': '2019-07-12T00:38:01Z', 'chargePower': 2, 'instantaneousPower': 6600, 'plugStatus': 1, 'chargeStatus': 1, 'batteryLevel': 28, 'rangeHvacOff': 64, 'timeRequiredToFullSlow': 295}
     if status.get('_unavailable', False):
         plug_state = PlugState.NOT_AVAILABLE
@@ -59,12 +68,9 @@ def run(parsed_args):
         else:
             range_text = status['batteryAutonomy']  # Fall back to default value
 
-    try:
-        charge_mode = v.charge_mode()
-    except requests.RequestException:
-        charge_mode = 'Unavailable'
+    charge_mode = snapshot.results.get('charge_mode', 'Unavailable')
 
-    mileage = wrap_unavailable(v, 'mileage')
+    mileage = wrap_unavailable(snapshot, 'mileage')
     if mileage.get('_unavailable', False) or 'totalMileage' not in mileage:
         mileage_text = mileage['totalMileage']
     else:
@@ -73,7 +79,7 @@ def run(parsed_args):
         else:
             mileage_text = "{:.1f} mi".format(mileage['totalMileage'] / KM_PER_MILE)
 
-    location = wrap_unavailable(v, 'location')
+    location = wrap_unavailable(snapshot, 'location')
     if location.get('_unavailable', False) or 'gpsLatitude' not in location:
         location_text = location['gpsLatitude']
     else:
@@ -86,7 +92,7 @@ def run(parsed_args):
         )
         location_text = "{:.8f},{:.8f} as of {}".format(location['gpsLatitude'], location['gpsLongitude'], location_date)
 
-    hvac = wrap_unavailable(v, 'hvac_status')
+    hvac = wrap_unavailable(snapshot, 'hvac_status')
     if hvac.get('_unavailable', False):
         hvac_start = hvac['nextHvacStartDate']
         external_temp = hvac['externalTemperature']
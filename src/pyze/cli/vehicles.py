@@ -1,11 +1,8 @@
-from pyze.api import Kamereon
-
-
-help_text = 'List the vehicles on your account.'
+from .common import get_kamereon
 
 
 def run(args):
-    k = Kamereon()
+    k = get_kamereon()
 
     vehicles = k.get_vehicles().get('vehicleLinks')
 